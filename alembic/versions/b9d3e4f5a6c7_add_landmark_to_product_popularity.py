@@ -0,0 +1,32 @@
+"""add landmark to product popularity
+
+Revision ID: b9d3e4f5a6c7
+Revises: a8c2d3e4f5b6
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d3e4f5a6c7'
+down_revision: Union[str, Sequence[str], None] = 'a8c2d3e4f5b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing scores are relative to the original fixed landmark
+    op.add_column(
+        'product_popularity',
+        sa.Column('landmark', sa.DateTime(timezone=True), nullable=False,
+                  server_default=sa.text("'2025-01-01 00:00:00+00'")),
+    )
+    op.alter_column('product_popularity', 'landmark', server_default=None)
+    op.execute("UPDATE product_popularity SET score = 0 WHERE score < 0")
+
+
+def downgrade() -> None:
+    op.drop_column('product_popularity', 'landmark')
@@ -0,0 +1,36 @@
+"""add product popularity rollup
+
+Revision ID: c4e8a1f2b3d5
+Revises: 8d0387ed10d4
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f2b3d5'
+down_revision: Union[str, Sequence[str], None] = '8d0387ed10d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'product_popularity',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('clickouts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('ratings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index(op.f('ix_product_popularity_score'), 'product_popularity', ['score'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_product_popularity_score'), table_name='product_popularity')
+    op.drop_table('product_popularity')
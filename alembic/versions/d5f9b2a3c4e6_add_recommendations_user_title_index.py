@@ -0,0 +1,24 @@
+"""index recommendations by user, title and created_at
+
+Revision ID: d5f9b2a3c4e6
+Revises: c4e8a1f2b3d5
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f9b2a3c4e6'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1f2b3d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_recommendations_user_title_created', 'recommendations', ['user_id', 'title', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recommendations_user_title_created', table_name='recommendations')
@@ -0,0 +1,44 @@
+"""add shades table
+
+Revision ID: e6a0c3b4d5f7
+Revises: d5f9b2a3c4e6
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a0c3b4d5f7'
+down_revision: Union[str, Sequence[str], None] = 'd5f9b2a3c4e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'shades',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('hex_code', sa.String(length=7), nullable=False),
+        sa.Column('rgb_r', sa.Integer(), nullable=False),
+        sa.Column('rgb_g', sa.Integer(), nullable=False),
+        sa.Column('rgb_b', sa.Integer(), nullable=False),
+        sa.Column('undertone', sa.String(), nullable=True),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('brand_id', sa.Integer(), nullable=True),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['brand_id'], ['brands.id'], ),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_shades_id'), 'shades', ['id'], unique=False)
+    op.create_index('ix_shades_category_undertone', 'shades', ['category', 'undertone'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_shades_category_undertone', table_name='shades')
+    op.drop_index(op.f('ix_shades_id'), table_name='shades')
+    op.drop_table('shades')
@@ -0,0 +1,29 @@
+"""add content_hash to files
+
+Revision ID: f7b1c2d3e4a5
+Revises: e6a0c3b4d5f7
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b1c2d3e4a5'
+down_revision: Union[str, Sequence[str], None] = 'e6a0c3b4d5f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_files_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_files_content_hash'))
+        batch_op.drop_column('content_hash')
@@ -5,6 +5,11 @@ from fastapi.security import OAuth2PasswordBearer
 from app.core.db import get_db
 from app import crud, schemas
 from app.core.config import settings
+from app.services.recommendation_cache import recommendation_cache
+from app.services.analysis_executor import analysis_executor
+from app.services.analysis_cache import analysis_cache
+from app.services.skin_analysis import inference_batcher
+from app.services.derivatives import derivative_cache
 
 # OAuth2 bearer token for Swagger Authorize button
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -44,6 +49,22 @@ def get_admin_stats(db: Session = Depends(get_db)):
         "recent_signups": crud.users.get_recent_signups(db, days=7)
     }
 
+@router.get("/cache/recommendations")
+def get_recommendation_cache_stats():
+    return recommendation_cache.stats()
+
+@router.get("/cache/analysis")
+def get_analysis_cache_stats():
+    return analysis_cache.stats()
+
+@router.get("/cache/derivatives")
+def get_derivative_cache_stats():
+    return derivative_cache.stats()
+
+@router.get("/metrics/analysis")
+def get_analysis_metrics():
+    return {**analysis_executor.metrics(), "inference_batching": inference_batcher.stats()}
+
 @router.get("/products")
 def list_all_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return crud.product.get_all(db, skip=skip, limit=limit)
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from sqlalchemy.orm import Session
+from typing import List, Optional
 
 from app.core.db import get_db
+from app.core.config import settings
 from app import crud, schemas
+from app.services.analysis_executor import AnalysisBusyError
 from app.services.skin_analysis import SkinAnalysisService
 from app.services.shade_matcher import ShadeMatcherService
 
 router = APIRouter()
 
+
+def _busy(exc: AnalysisBusyError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "1"})
+
+
 @router.post("/analyze")
 def analyze_user_profile(data: schemas.AnalysisRequest, db: Session = Depends(get_db)):
     skin_service = SkinAnalysisService()
@@ -27,26 +35,64 @@ async def analyze_skin_image(
         raise HTTPException(status_code=400, detail="File must be an image")
     
     skin_service = SkinAnalysisService()
-    analysis_result = await skin_service.analyze_skin_from_image(image)
+    try:
+        entry = await skin_service.analyze_for_user(user_id, await image.read())
+    except AnalysisBusyError as exc:
+        raise _busy(exc)
     
-    # Save analysis
-    analysis_data = schemas.AnalysisRequest(
-        user_id=user_id,
-        skin_type=analysis_result.get('skin_type'),
-        concerns=analysis_result.get('concerns', [])
-    )
-    analysis_record = crud.analysis.create_analysis(db, user_id, analysis_result)
+    # Save a successful analysis unless this image was already analyzed for the user
+    analysis_result, analysis_id = entry["analysis"], entry["analysis_id"]
+    if analysis_id is None and "error" not in analysis_result:
+        analysis_id = crud.analysis.create_analysis(db, user_id, analysis_result).id
+        skin_service.remember(user_id, entry, analysis_id)
     
-    return {"analysis": analysis_result, "analysis_id": analysis_record.id}
+    return {"analysis": analysis_result, "analysis_id": analysis_id, "cached": entry["analysis_id"] is not None}
+
+@router.post("/skin-analysis/batch")
+async def analyze_skin_images(
+    user_id: int,
+    images: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    if len(images) > settings.ANALYSIS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {settings.ANALYSIS_BATCH_MAX} images per batch")
+    if any(not (image.content_type or "").startswith('image/') for image in images):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    skin_service = SkinAnalysisService()
+    try:
+        entries = await skin_service.analyze_images_for_user(user_id, [await image.read() for image in images])
+    except AnalysisBusyError as exc:
+        raise _busy(exc)
+
+    # Save every new successful analysis in one insert; repeats reuse their stored record
+    fresh = [e for e in entries if e["analysis_id"] is None and "error" not in e["analysis"]]
+    for entry, analysis_id in zip(fresh, crud.analysis.create_analyses(db, user_id, [e["analysis"] for e in fresh])):
+        entry["analysis_id"] = analysis_id
+        skin_service.remember(user_id, entry, analysis_id)
+    return {
+        "analyses": [
+            {"filename": image.filename, "analysis": entry["analysis"], "analysis_id": entry["analysis_id"]}
+            for image, entry in zip(images, entries)
+        ]
+    }
 
 @router.post("/shade-match")
 async def match_shade(
     user_id: int,
     image: UploadFile = File(...),
+    category: str = "foundation",
+    undertone: Optional[str] = None,
+    limit: int = Query(5, ge=1, le=50),
     db: Session = Depends(get_db)
 ):
     shade_service = ShadeMatcherService()
-    shade_matches = await shade_service.find_matching_shades(image)
+    try:
+        shade_matches = await shade_service.find_matching_shades(
+            image, db, category=category, undertone=undertone, limit=limit
+        )
+    except AnalysisBusyError as exc:
+        raise _busy(exc)
     
     return {"shade_matches": shade_matches, "user_id": user_id}
 
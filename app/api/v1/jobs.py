@@ -0,0 +1,37 @@
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.db import get_db
+from app import crud
+from app.core.permissions import get_optional_user
+from app.models.user import User
+
+router = APIRouter()
+
+
+@router.get("/{job_id}")
+def get_job_status(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    """Poll a background job queued by an upload"""
+    job = crud.jobs.get_job(db, job_id)
+    # Another user's job is reported as missing rather than forbidden
+    if job is None or (job.user_id is not None and (current_user is None or current_user.id != job.user_id)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "run_at": job.run_at,
+        "finished_at": job.finished_at,
+    }
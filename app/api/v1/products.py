@@ -1,13 +1,15 @@
 print("✅ products.py loaded")
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 from app.schemas.product import ProductUpdate
 from app.schemas.product import ProductCreate
 from app.schemas.product import ProductSchema
+from app.schemas.product import ProductIngredientsUpdate
 from app.core.db import get_db
 from app.crud import product as crud_product
 from app.core.permissions import require_admin, get_optional_user, Permissions, require_permission
+from app.services.recommender import recommendation_service
 
 router = APIRouter()
 
@@ -48,6 +50,33 @@ def get_product(
     return product
 
 
+@router.get("/{product_id}/similar")
+def get_similar_products(
+    product_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_optional_user)  # Optional authentication
+):
+    """Products with the most similar ingredient lists - Public endpoint"""
+    if not crud_product.get_by_id(db, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"product_id": product_id, "similar": recommendation_service.get_similar_products(db, product_id, limit)}
+
+
+@router.put("/{product_id}/ingredients", response_model=ProductSchema)
+def set_product_ingredients(
+    product_id: int,
+    payload: ProductIngredientsUpdate,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(Permissions.MANAGE_PRODUCTS))  # Admin only
+):
+    """Replace a product's ingredient list - Admin only"""
+    product = crud_product.set_ingredients(db, product_id, payload.ingredient_ids)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+
 @router.post("/", response_model=ProductSchema)
 def create_product(
     product: ProductCreate, 
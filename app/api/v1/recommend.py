@@ -1,47 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Optional
 
+from app.core.config import settings
 from app.core.db import get_db
 from app import crud, schemas
 from app.services.recommender import RecommendationService
+from app.services.recommendation_cache import recommendation_cache
 
 router = APIRouter()
 
+
 @router.post("/{user_id}")
 def recommend_products(user_id: int, db: Session = Depends(get_db)):
+    # Serve the batch-precomputed set when it is still fresh
+    precomputed = crud.recommend.get_precomputed(db, user_id)
+    if precomputed is not None and precomputed["recommendations"]:
+        return precomputed
+
     recommendations = crud.recommend.generate_for_user(db, user_id)
     if not recommendations:
         raise HTTPException(status_code=404, detail="No recommendations found")
     # Persist the generated recommendations for history
-    rec_set = crud.recommendations.save_generated(db, user_id, recommendations, title="products")
-    return {"recommendations": recommendations, "saved_id": rec_set.id}
+    saved_id = crud.recommendations.save_generated(
+        db, user_id, recommendations, title="products", defer_items=settings.RECOMMENDATION_DEFER_WRITES
+    )
+    return {"recommendations": recommendations, "saved_id": saved_id}
 
 
 @router.post("/{user_id}/skincare")
 def recommend_skincare(
     user_id: int,
     preferences: schemas.ProfilePreferences,   # contains preferred_brands, budget_range
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
+    cache_key = recommendation_cache.make_key(user_id, "skincare", {**preferences.dict(), "limit": limit})
+    cached = recommendation_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     recommender = RecommendationService()
     recommendations = recommender.recommend_skincare_routine(
         user_id=user_id,
         preferred_brands=preferences.preferred_brands,
         budget_range=preferences.budget_range,
-        db=db
+        db=db,
+        limit=limit
     )
     # Persist set
-    rec_set = crud.recommendations.save_generated(db, user_id, recommendations, title="skincare")
-    return {"skincare_recommendations": recommendations, "saved_id": rec_set.id}
+    saved_id = crud.recommendations.save_generated(
+        db, user_id, recommendations, title="skincare", defer_items=settings.RECOMMENDATION_DEFER_WRITES
+    )
+    response = {"skincare_recommendations": recommendations, "saved_id": saved_id}
+    recommendation_cache.set(cache_key, response)
+    return response
 
 
 @router.post("/{user_id}/makeup")
 def recommend_makeup(
     user_id: int,
     preferences: schemas.MakeupPreferences,
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
+    cache_key = recommendation_cache.make_key(user_id, "makeup", {**preferences.dict(), "limit": limit})
+    cached = recommendation_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     recommender = RecommendationService()
     recommendations = recommender.recommend_makeup_products(
         user_id=user_id,
@@ -49,27 +76,43 @@ def recommend_makeup(
         occasion=preferences.occasion,
         style=preferences.style,
         budget_range=preferences.budget_range,
-        db=db
+        db=db,
+        limit=limit
     )
-    rec_set = crud.recommendations.save_generated(db, user_id, recommendations, title="makeup")
-    return {"makeup_recommendations": recommendations, "saved_id": rec_set.id}
+    saved_id = crud.recommendations.save_generated(
+        db, user_id, recommendations, title="makeup", defer_items=settings.RECOMMENDATION_DEFER_WRITES
+    )
+    response = {"makeup_recommendations": recommendations, "saved_id": saved_id}
+    recommendation_cache.set(cache_key, response)
+    return response
 
 
 @router.post("/{user_id}/personalized")
 def get_personalized_recommendations(
     user_id: int,
     filters: Optional[schemas.RecommendationFilters] = None,
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
-    recommender = RecommendationService()
     filt = filters.dict() if hasattr(filters, "dict") else (filters or None)
+    cache_key = recommendation_cache.make_key(user_id, "personalized", {**(filt or {}), "limit": limit})
+    cached = recommendation_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    recommender = RecommendationService()
     recommendations = recommender.get_personalized_recommendations(
         user_id=user_id,
         filters=filt,
-        db=db
+        db=db,
+        limit=limit
     )
-    rec_set = crud.recommendations.save_generated(db, user_id, recommendations, title="personalized", filters=filt)
-    return {"personalized_recommendations": recommendations, "saved_id": rec_set.id}
+    saved_id = crud.recommendations.save_generated(
+        db, user_id, recommendations, title="personalized", filters=filt, defer_items=settings.RECOMMENDATION_DEFER_WRITES
+    )
+    response = {"personalized_recommendations": recommendations, "saved_id": saved_id}
+    recommendation_cache.set(cache_key, response)
+    return response
 
 
 @router.get("/{user_id}/trending")
@@ -77,3 +120,16 @@ def get_trending_recommendations(user_id: int, db: Session = Depends(get_db)):
     recommender = RecommendationService()
     trending = recommender.get_trending_products_for_user(user_id, db)
     return {"trending_recommendations": trending}
+
+
+@router.post("/{user_id}/clickout")
+def record_clickout(user_id: int, clickout: schemas.ClickoutCreate, db: Session = Depends(get_db)):
+    row = crud.clickout.create(
+        db,
+        user_id=user_id,
+        url=clickout.url,
+        product_id=clickout.product_id,
+        brand_id=clickout.brand_id,
+        source=clickout.source,
+    )
+    return {"clickout_id": row.id}
@@ -19,8 +19,8 @@ def get_saved_recommendations(user_id: int, db: Session = Depends(get_db), since
 
 @router.post("/{user_id}")
 def save_recommendation(user_id: int, rec: schemas.RecommendationCreate, db: Session = Depends(get_db)):
-    saved = crud.recommendations.save(db, user_id, rec)
-    return {"saved_id": saved.id}
+    saved_id = crud.recommendations.save(db, user_id, rec)
+    return {"saved_id": saved_id}
 
 @router.get("/{user_id}/by-category/{category}")
 def get_recommendations_by_category(
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from app.core.config import settings
+from app.core.static_files import file_response
+from app.core.storage import storage
+from app.services.derivatives import FORMATS, PRESETS, derivative_cache
+
+router = APIRouter()
+
+
+@router.api_route("/variants/{preset}/{name}", methods=["GET", "HEAD"])
+async def serve_variant(preset: str, name: str, request: Request):
+    """Serve a resized variant of a stored object, e.g. ``/static/variants/thumb/<sha256>.webp``"""
+    key, _, fmt = name.partition(".")
+    if preset not in PRESETS or fmt not in FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+    source = storage.objects.path_for(key) if len(key) == 64 else None
+    if source is None or not source.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        path = await derivative_cache.get(source, key, preset, fmt)
+    except OSError:
+        raise HTTPException(status_code=415, detail="File is not a supported image")
+    # Variants of an immutable object are immutable too
+    return file_response(request, path, immutable_etag=f"{key}-{preset}.{fmt}")
+
+
+
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"])
+def serve_file(file_path: str, request: Request):
+    """Serve a locally stored upload (the URLs from StorageService.get_file_url)"""
+    root = storage.upload_dir.resolve()
+    path = (root / file_path).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+
+    relative = path.relative_to(root)
+    # Objects are named by the SHA-256 of their bytes and never change
+    immutable_etag = relative.name if relative.parts[0] == "objects" else None
+    accel_redirect = None
+    if settings.STATIC_ACCEL_REDIRECT:
+        accel_redirect = f"{settings.STATIC_ACCEL_REDIRECT.rstrip('/')}/{relative.as_posix()}"
+    return file_response(request, path, immutable_etag=immutable_etag, accel_redirect=accel_redirect)
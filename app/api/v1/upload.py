@@ -1,5 +1,4 @@
 import cloudinary
-import cloudinary.uploader
 import os
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from sqlalchemy.orm import Session
@@ -7,6 +6,8 @@ from app.core.db import get_db
 from app.core.config import CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET
 from fastapi.security import OAuth2PasswordBearer
 from app import crud
+from app.core.storage import FileTooLargeError, cloudinary_client, storage
+from app.services.job_queue import job_queue
 from app.core.permissions import get_current_authenticated_user, require_user_or_admin, get_optional_user
 from app.models.user import User
 from typing import Optional
@@ -21,6 +22,22 @@ cloudinary.config(
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 router = APIRouter()
 
+# Cloudinary transformation for analysis uploads
+ANALYSIS_TRANSFORMATION = [
+    {"width": 800, "height": 800, "crop": "fill"},
+    {"quality": "auto"},
+    {"fetch_format": "auto"}
+]
+
+
+def _file_data(info: dict) -> dict:
+    return {**info, "file_type": info["content_type"], "purpose": "upload"}
+
+
+def _too_large(exc: FileTooLargeError) -> HTTPException:
+    return HTTPException(status_code=413, detail=str(exc))
+
+
 @router.post("/")
 async def upload_image(
     file: UploadFile = File(...),
@@ -35,44 +52,24 @@ async def upload_image(
     user = current_user
     
     try:
-        # Upload to Cloudinary
-        result = cloudinary.uploader.upload(
-            file.file,
-            folder="glow_genius",  # Organize uploads in folders
-            resource_type="image",
-            transformation=[
-                {"width": 1000, "height": 1000, "crop": "limit"},  # Optimize image size
-                {"quality": "auto"},  # Auto optimize quality
-                {"fetch_format": "auto"}  # Auto format (WebP when supported)
-            ]
-        )
+        # Upload to Cloudinary, or the local object store when it is not configured
+        info = await storage.save_file(file, "images")
 
         # Persist to DB
-        file_row = crud.file.create_file(
-            db,
-            user_id=user.id if user else None,
-            data={
-                "filename": result["public_id"],
-                "original_filename": file.filename,
-                "file_path": result["secure_url"],
-                "file_size": result.get("bytes", 0),
-                "file_type": file.content_type,
-                "purpose": "upload",
-                "public_id": result["public_id"],
-                "storage_type": "cloudinary",
-            },
-        )
+        file_row = crud.file.create_file(db, user_id=user.id if user else None, data=_file_data(info))
         
         return {
             "file_id": file_row.id,
             "filename": file_row.filename,
-            "url": result["secure_url"],
-            "public_id": result["public_id"],
-            "width": result.get("width"),
-            "height": result.get("height"),
-            "format": result.get("format"),
-            "resource_type": result.get("resource_type")
+            "url": info["url"],
+            "public_id": info["public_id"],
+            "width": info.get("width"),
+            "height": info.get("height"),
+            "format": info.get("format"),
+            "resource_type": "image"
         }
+    except FileTooLargeError as exc:
+        raise _too_large(exc)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
@@ -89,50 +86,34 @@ async def upload_multiple_images(
     # Use current user from dependency
     user = current_user
 
-    results = []
-    for file in files:
+    results: list = [None] * len(files)
+    pending = []
+    for i, file in enumerate(files):
         if not file.content_type.startswith('image/'):
-            results.append({"filename": file.filename, "error": "Not an image"})
-            continue
-        
-        try:
-            result = cloudinary.uploader.upload(
-                file.file,
-                folder="glow_genius",
-                resource_type="image",
-                transformation=[
-                    {"width": 1000, "height": 1000, "crop": "limit"},
-                    {"quality": "auto"},
-                    {"fetch_format": "auto"}
-                ]
-            )
-
-            file_row = crud.file.create_file(
-                db,
-                user_id=user.id if user else None,
-                data={
-                    "filename": result["public_id"],
-                    "original_filename": file.filename,
-                    "file_path": result["secure_url"],
-                    "file_size": result.get("bytes", 0),
-                    "file_type": file.content_type,
-                    "purpose": "upload",
-                    "public_id": result["public_id"],
-                    "storage_type": "cloudinary",
-                },
-            )
-
-            results.append({
-                "file_id": file_row.id,
-                "filename": file.filename,
-                "url": result["secure_url"],
-                "public_id": result["public_id"]
-            })
-        except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "error": str(e)
-            })
+            results[i] = {"filename": file.filename, "error": "Not an image"}
+        else:
+            pending.append(i)
+
+    # Upload every file concurrently, then save all of their records in one transaction
+    outcomes = await storage.save_files([files[i] for i in pending], "images")
+    uploaded = []
+    for i, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            results[i] = {"filename": files[i].filename, "error": str(outcome)}
+        else:
+            uploaded.append((i, outcome))
+
+    try:
+        file_ids = crud.file.create_files(db, user.id if user else None, [_file_data(info) for _, info in uploaded])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    for (i, info), file_id in zip(uploaded, file_ids):
+        results[i] = {
+            "file_id": file_id,
+            "filename": files[i].filename,
+            "url": info["url"],
+            "public_id": info["public_id"]
+        }
     
     return {"uploaded_files": results}
 
@@ -143,9 +124,15 @@ async def delete_image(
     current_user: Optional[User] = Depends(get_optional_user)  # Optional authentication
 ):
     """Delete uploaded image - Authenticated users only"""
+    rows = crud.file.get_by_public_id(db, public_id)
+    if rows and all(row.storage_type == "local" for row in rows):
+        # Local objects are shared by content; the GC sweep removes the bytes once nothing references them
+        crud.file.delete_by_public_id(db, public_id)
+        return {"detail": "Image deleted successfully"}
+
     try:
         # public_id may include folder segments like "glow_genius/abc123"
-        result = cloudinary.uploader.destroy(public_id)
+        result = await cloudinary_client.destroy(public_id)
         if result.get("result") == "ok":
             # Optionally remove DB records referencing this public_id
             try:
@@ -170,25 +157,31 @@ async def upload_for_analysis(
     
     try:
         # Upload with analysis-specific transformations
-        result = cloudinary.uploader.upload(
-            file.file,
-            folder="glow_genius/analysis",
-            resource_type="image",
-            transformation=[
-                {"width": 800, "height": 800, "crop": "fill"},
-                {"quality": "auto"},
-                {"fetch_format": "auto"}
-            ]
-        )
+        info = await storage.save_file(file, "analysis", ANALYSIS_TRANSFORMATION)
         
-        # Store in database for analysis tracking
+        # Store in database for analysis tracking; committed together with the jobs that fill it in
+        user_id = current_user.id if current_user else None
+        analysis_id = None
         if current_user:
-            crud.analysis.create_analysis_record(db, current_user.id, result["secure_url"])
+            analysis_id = crud.analysis.create_analysis_record(db, current_user.id, info["url"], commit=False).id
+
+        # Analyze (and thumbnail local objects) in the background; clients poll /jobs/{job_id}
+        work = [("analyze_upload", {
+            "url": info["url"], "content_hash": info["content_hash"], "analysis_id": analysis_id, "user_id": user_id,
+        })]
+        if info["content_hash"]:
+            work.append(("render_variants", {"content_hash": info["content_hash"]}))
+        jobs = job_queue.enqueue(db, work, user_id=user_id)
         
         return {
-            "url": result["secure_url"],
-            "public_id": result["public_id"],
-            "analysis_ready": True
+            "url": info["url"],
+            "public_id": info["public_id"],
+            "analysis_ready": False,
+            "analysis_id": analysis_id,
+            "job_id": jobs[0].id,
+            "jobs": {job.kind: job.id for job in jobs}
         }
+    except FileTooLargeError as exc:
+        raise _too_large(exc)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -15,16 +15,65 @@ class Settings(BaseSettings):
 
     # File upload settings
     UPLOAD_DIR: str = "uploads"
+    # "cloudinary" (when credentials are set) or "local" for the content-addressed disk store
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "cloudinary")
+    DERIVATIVE_CACHE_DIR: str = os.getenv("DERIVATIVE_CACHE_DIR", "cache/derivatives")
+    DERIVATIVE_CACHE_MAX_BYTES: int = int(os.getenv("DERIVATIVE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    # Internal nginx location mapped to UPLOAD_DIR; when set, /static responses are X-Accel-Redirects
+    STATIC_ACCEL_REDIRECT: str | None = os.getenv("STATIC_ACCEL_REDIRECT")
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+    # Unreferenced local objects are removed by a periodic sweep once this old
+    OBJECT_GC_GRACE_SECONDS: int = int(os.getenv("OBJECT_GC_GRACE_SECONDS", "3600"))
+    OBJECT_GC_INTERVAL_SECONDS: int = int(os.getenv("OBJECT_GC_INTERVAL_SECONDS", "3600"))
 
     # ML Model settings
     MODEL_PATH: str = "ml_models"
+    MODEL_THREADS: int = int(os.getenv("MODEL_THREADS", "1"))
+
+    # Recommendation settings
+    CATALOG_INDEX_TTL_SECONDS: int = int(os.getenv("CATALOG_INDEX_TTL_SECONDS", "300"))
+    RECOMMENDATION_CACHE_TTL_SECONDS: int = int(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "600"))
+    RECOMMENDATION_CACHE_MAX_ENTRIES: int = int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "10000"))
+    SIMILARITY_NEIGHBORS: int = int(os.getenv("SIMILARITY_NEIGHBORS", "20"))
+    SIMILARITY_REBUILD_SECONDS: int = int(os.getenv("SIMILARITY_REBUILD_SECONDS", "3600"))
+    COLLABORATIVE_FACTORS: int = int(os.getenv("COLLABORATIVE_FACTORS", "32"))
+    COLLABORATIVE_REG: float = float(os.getenv("COLLABORATIVE_REG", "0.1"))
+    COLLABORATIVE_ALPHA: float = float(os.getenv("COLLABORATIVE_ALPHA", "40"))
+    COLLABORATIVE_ITERATIONS: int = int(os.getenv("COLLABORATIVE_ITERATIONS", "15"))
+    COLLABORATIVE_WARM_ITERATIONS: int = int(os.getenv("COLLABORATIVE_WARM_ITERATIONS", "3"))
+    COLLABORATIVE_TRAIN_HOUR: int = int(os.getenv("COLLABORATIVE_TRAIN_HOUR", "2"))
+    SHADE_INDEX_CHECK_SECONDS: int = int(os.getenv("SHADE_INDEX_CHECK_SECONDS", "60"))
+    RECOMMENDATION_DEFER_WRITES: bool = os.getenv("RECOMMENDATION_DEFER_WRITES", "false").lower() == "true"
+    POPULARITY_HALF_LIFE_DAYS: float = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", "7"))
+    POPULARITY_FLUSH_SECONDS: int = int(os.getenv("POPULARITY_FLUSH_SECONDS", "60"))
+    PRECOMPUTE_LIMIT: int = int(os.getenv("PRECOMPUTE_LIMIT", "20"))
+    PRECOMPUTE_CHUNK_SIZE: int = int(os.getenv("PRECOMPUTE_CHUNK_SIZE", "256"))
+    PRECOMPUTE_MAX_AGE_HOURS: int = int(os.getenv("PRECOMPUTE_MAX_AGE_HOURS", "24"))
+    PRECOMPUTE_HOUR: int = int(os.getenv("PRECOMPUTE_HOUR", "3"))
+
+    # Image analysis settings
+    ANALYSIS_WORKERS: int = int(os.getenv("ANALYSIS_WORKERS", "2"))
+    ANALYSIS_MAX_QUEUE: int = int(os.getenv("ANALYSIS_MAX_QUEUE", "8"))
+    ANALYSIS_BATCH_MAX: int = int(os.getenv("ANALYSIS_BATCH_MAX", "8"))
+    ANALYSIS_INFERENCE_BATCH: int = int(os.getenv("ANALYSIS_INFERENCE_BATCH", "16"))
+    ANALYSIS_INFERENCE_WAIT_MS: float = float(os.getenv("ANALYSIS_INFERENCE_WAIT_MS", "10"))
+    ANALYSIS_CACHE_PATH: str = os.getenv("ANALYSIS_CACHE_PATH", "cache/analysis.sqlite3")
+    ANALYSIS_CACHE_MAX_BYTES: int = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Background job settings
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "1"))
+    JOB_VISIBILITY_TIMEOUT_SECONDS: float = float(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", "300"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_BACKOFF_SECONDS: float = float(os.getenv("JOB_BACKOFF_SECONDS", "5"))
 
     # Cloudinary settings
     CLOUDINARY_CLOUD_NAME: str | None = os.getenv("CLOUDINARY_CLOUD_NAME")
     CLOUDINARY_API_KEY: str | None = os.getenv("CLOUDINARY_API_KEY")
     CLOUDINARY_API_SECRET: str | None = os.getenv("CLOUDINARY_API_SECRET")
     CLOUDINARY_URL: str | None = os.getenv("CLOUDINARY_URL")
+    CLOUDINARY_MAX_CONCURRENCY: int = int(os.getenv("CLOUDINARY_MAX_CONCURRENCY", "4"))
 
     # API settings
     API_V1_STR: str = "/api/v1"
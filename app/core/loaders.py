@@ -0,0 +1,33 @@
+"""
+Shared SQLAlchemy loader-option presets.
+
+Each preset names the relationships a use case actually touches so they are
+fetched up front instead of lazily per row (N+1). Many-to-one relationships
+use ``joinedload`` (same SELECT); collections use ``selectinload`` (one extra
+``IN`` query for the whole page, regardless of page size).
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models.product import Product
+from app.models.recommendation import Recommendation, RecommendationItem
+
+# ProductSchema listings: serialize ``images`` only
+PRODUCT_LIST = (selectinload(Product.images),)
+
+# Single product views: brand + images
+PRODUCT_DETAIL = (joinedload(Product.brand), selectinload(Product.images))
+
+# Recommendation cards need the same brand name + images as the detail view
+PRODUCT_CARD = PRODUCT_DETAIL
+
+# Saved recommendation sets with their ranked items
+RECOMMENDATION_WITH_ITEMS = (
+    selectinload(Recommendation.items).joinedload(RecommendationItem.product),
+)
+
+# Precomputed sets served as recommendation cards
+PRECOMPUTED_SET = (
+    selectinload(Recommendation.items).joinedload(RecommendationItem.product).joinedload(Product.brand),
+    selectinload(Recommendation.items).joinedload(RecommendationItem.product).selectinload(Product.images),
+)
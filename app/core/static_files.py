@@ -0,0 +1,183 @@
+"""
+Conditional and byte-range file serving for the local storage backend.
+
+``file_response`` turns a file on disk into the right response for a GET or
+HEAD: 304 when ``If-None-Match`` / ``If-Modified-Since`` say the client's
+copy is current, 206 for a satisfiable single ``Range`` (honouring
+``If-Range``), 416 for an unsatisfiable one, otherwise 200. Content-addressed
+objects are immutable, so they get their key as a strong ETag and a
+one-year ``immutable`` cache lifetime; a browser that has one never asks
+again.
+
+Bytes leave through ``FileRangeResponse``, which hands the file descriptor
+to the server via the ASGI ``http.response.zerocopysend`` extension
+(``sendfile``) when the server offers it, and otherwise streams the range
+in chunks. With ``STATIC_ACCEL_REDIRECT`` set, Python sends no bytes at
+all: nginx receives an ``X-Accel-Redirect`` and serves the file itself.
+"""
+
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from hashlib import md5
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Optional, Tuple
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+DEFAULT_CACHE = "public, max-age=3600"
+
+# Leading bytes of the image formats uploads are stored in; objects have no extension
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+]
+
+
+class FileRangeResponse(FileResponse):
+    """FileResponse for ``length`` bytes starting at ``offset``"""
+
+    def __init__(self, path: Path, offset: int = 0, length: Optional[int] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.offset = offset
+        self.length = length if length is not None else os.stat(path).st_size - offset
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.offset)
+                remaining = self.length
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    remaining = remaining - len(chunk) if chunk else 0
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if self.background is not None:
+            await self.background()
+
+
+def media_type_for(path: Path) -> str:
+    guessed = guess_type(path.name)[0]
+    if guessed:
+        return guessed
+    with open(path, "rb") as f:
+        head = f.read(12)
+    for signature, media_type in _SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """``(start, end)`` inclusive for a single ``bytes=`` range, or None if unsatisfiable.
+
+    Raises ValueError for a header that is malformed or asks for several
+    ranges, which the caller answers with the whole file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix <= 0 or size == 0:
+            return None
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        return None
+    if start > end:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def file_response(request: Request, path: Path, immutable_etag: Optional[str] = None,
+                  accel_redirect: Optional[str] = None) -> Response:
+    """Serve ``path`` for ``request``, honouring conditional and range headers.
+
+    ``immutable_etag`` marks content-addressed files: it becomes the strong
+    ETag and the response is cacheable for a year. ``accel_redirect`` is the
+    internal nginx location to hand the transfer to instead of sending bytes.
+    """
+    stat_result = os.stat(path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+    if immutable_etag:
+        etag, cache_control = f'"{immutable_etag}"', IMMUTABLE_CACHE
+    else:
+        base = f"{stat_result.st_mtime}-{stat_result.st_size}".encode()
+        etag, cache_control = f'"{md5(base, usedforsecurity=False).hexdigest()}"', DEFAULT_CACHE
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+        "x-content-type-options": "nosniff",
+    }
+    if _not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+    media_type = media_type_for(path)
+    if accel_redirect:
+        # nginx serves the bytes, including ranges and sendfile; these headers are passed through
+        return Response(headers={**headers, "x-accel-redirect": accel_redirect}, media_type=media_type)
+
+    size = stat_result.st_size
+    offset, length, status_code = 0, size, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (etag, headers["last-modified"])):
+        try:
+            requested = parse_range(range_header, size)
+        except ValueError:
+            requested = (0, size - 1)  # ignored: the whole file is served
+        if requested is None:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        start, end = requested
+        if (start, end) != (0, size - 1):
+            offset, length, status_code = start, end - start + 1, 206
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(length)
+    return FileRangeResponse(
+        path, offset=offset, length=length, status_code=status_code, headers=headers,
+        media_type=media_type, stat_result=stat_result, method=request.method,
+    )
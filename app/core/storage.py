@@ -1,12 +1,19 @@
+import asyncio
+import hashlib
 import os
+import time
 import uuid
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Set, Tuple, Union
 from fastapi import UploadFile
 import aiofiles
+import aiofiles.os
 from pathlib import Path
+from PIL import Image
 import cloudinary
 import cloudinary.uploader
-from app.core.config import CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET
+from app.core.config import CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET, settings
 
 cloudinary.config(
     cloud_name=CLOUDINARY_CLOUD_NAME,
@@ -15,96 +22,288 @@ cloudinary.config(
     secure=True
 )
 
+class FileTooLargeError(Exception):
+    """Upload exceeds the configured size limit"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"File exceeds the {limit // (1024 * 1024)} MB upload limit")
+        self.limit = limit
+
+
+def upload_size(file: UploadFile) -> Optional[int]:
+    """Size of a spooled upload without reading it, or None if the stream cannot seek"""
+    if file.size is not None:
+        return file.size
+    try:
+        position = file.file.tell()
+        size = file.file.seek(0, os.SEEK_END)
+        file.file.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+
+async def stream_to_file(file: UploadFile, destination: Path, max_size: int = settings.MAX_FILE_SIZE,
+                         chunk_size: int = settings.UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """Copy an upload to ``destination`` in ``chunk_size`` pieces; returns (size, sha256 hex).
+
+    Only one chunk is held in memory at a time. The bytes go to a temporary
+    name that is renamed into place once complete, so a partial file is
+    never visible; if the upload passes ``max_size`` the copy stops there,
+    the temporary file is removed and FileTooLargeError is raised.
+    """
+    size, digest = 0, hashlib.sha256()
+    partial = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.part")
+    try:
+        async with aiofiles.open(partial, "wb") as out:
+            while chunk := await file.read(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(max_size)
+                digest.update(chunk)
+                await out.write(chunk)
+        await aiofiles.os.replace(partial, destination)
+    except BaseException:
+        if partial.exists():
+            partial.unlink()
+        raise
+    return size, digest.hexdigest()
+
+
+class CloudinaryClient:
+    """Async front for the blocking Cloudinary SDK.
+
+    Each call runs on a dedicated pool of ``max_concurrency`` threads, which
+    bounds how many uploads are in flight at once and keeps the network
+    round trips off the event loop (and out of the default threadpool that
+    serves sync endpoints).
+    """
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="cloudinary")
+        return self._executor
+
+    async def _call(self, fn, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), partial(fn, *args, **kwargs))
+
+    async def upload(self, file: BinaryIO, **options) -> Dict[str, Any]:
+        return await self._call(cloudinary.uploader.upload, file, **options)
+
+    async def upload_many(self, files: List[BinaryIO], **options) -> List[Union[Dict[str, Any], Exception]]:
+        """Upload files concurrently; each slot holds the upload result or the exception it raised"""
+        return await asyncio.gather(*(self.upload(f, **options) for f in files), return_exceptions=True)
+
+    async def destroy(self, public_id: str) -> Dict[str, Any]:
+        return await self._call(cloudinary.uploader.destroy, public_id)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Global Cloudinary client instance
+cloudinary_client = CloudinaryClient(settings.CLOUDINARY_MAX_CONCURRENCY)
+
+
+# Default Cloudinary transformation for image uploads
+IMAGE_TRANSFORMATION = [
+    {"width": 1000, "height": 1000, "crop": "limit"},  # Optimize image size
+    {"quality": "auto"},  # Auto optimize quality
+    {"fetch_format": "auto"}  # Auto format (WebP when supported)
+]
+
+
+def _image_info(path: Path) -> dict:
+    """Width, height and format from the image header, without decoding pixels"""
+    try:
+        with Image.open(path) as img:
+            return {"width": img.width, "height": img.height, "format": (img.format or "").lower() or None}
+    except Exception:
+        return {"width": None, "height": None, "format": None}
+
+
+class LocalObjectStore:
+    """Content-addressed object store on local disk.
+
+    An object's key is the SHA-256 of its bytes and it lives at
+    ``objects/<key[:2]>/<key[2:4]>/<key>``; the two-level fan-out keeps each
+    directory to a few hundred entries even at millions of objects.
+    Identical uploads get the same key and share one copy on disk. Objects
+    are immutable; the ``files`` rows whose ``content_hash`` is the key are
+    its references. Nothing unlinks an object in the request path: an upload
+    may have just reused it without committing its row yet. Instead ``put``
+    refreshes the object's mtime and ``sweep`` only removes objects that
+    are both unreferenced and older than a grace period.
+    """
+
+    def __init__(self, root: Path):
+        self.objects = root / "objects"
+        self.tmp = root / "tmp"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.tmp.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        return self.objects / key[:2] / key[2:4] / key
+
+    def exists(self, key: str) -> bool:
+        return self.path_for(key).is_file()
+
+    async def put(self, file: UploadFile, max_size: int = settings.MAX_FILE_SIZE) -> Tuple[str, int, bool]:
+        """Stream an upload into the store; returns (key, size, created).
+
+        The bytes are hashed while streaming to a scratch file, which is then
+        renamed to its content address, or dropped if that object already exists.
+        """
+        scratch = self.tmp / uuid.uuid4().hex
+        size, key = await stream_to_file(file, scratch, max_size)
+        target = self.path_for(key)
+        try:
+            # Reusing an object counts as a fresh write for the sweep's grace period
+            os.utime(target)
+            await aiofiles.os.remove(scratch)
+            return key, size, False
+        except FileNotFoundError:
+            pass
+        await aiofiles.os.makedirs(target.parent, exist_ok=True)
+        await aiofiles.os.replace(scratch, target)
+        return key, size, True
+
+    def sweep(self, referenced: Callable[[List[str]], Set[str]], grace_seconds: float,
+              batch_size: int = 500) -> int:
+        """Delete objects untouched for ``grace_seconds`` that ``referenced`` does not report; returns how many.
+
+        ``referenced(keys)`` returns the subset of ``keys`` still in use. A
+        candidate is first renamed aside, which ``put`` cannot reuse; if its
+        mtime moved in the meantime an upload claimed it and it is put back.
+        """
+        cutoff = time.time() - grace_seconds
+        candidates = []
+        removed = 0
+        for path in self.objects.glob("*/*/*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    candidates.append(path)
+            except FileNotFoundError:
+                continue
+            if len(candidates) >= batch_size:
+                removed += self._collect(candidates, referenced, cutoff)
+                candidates = []
+        if candidates:
+            removed += self._collect(candidates, referenced, cutoff)
+        return removed
+
+    def _collect(self, candidates: List[Path], referenced: Callable[[List[str]], Set[str]], cutoff: float) -> int:
+        in_use = referenced([path.name for path in candidates])
+        removed = 0
+        for path in candidates:
+            if path.name in in_use:
+                continue
+            doomed = self.tmp / f"{path.name}.{uuid.uuid4().hex}.gc"
+            try:
+                os.rename(path, doomed)
+            except FileNotFoundError:
+                continue
+            if doomed.stat().st_mtime >= cutoff:
+                os.replace(doomed, path)
+                continue
+            doomed.unlink()
+            removed += 1
+        return removed
+
+
 class StorageService:
-    def __init__(self, upload_dir: str = "uploads", use_cloudinary: bool = True):
+    def __init__(self, upload_dir: str = "uploads", use_cloudinary: bool = True,
+                 max_file_size: int = settings.MAX_FILE_SIZE):
         self.upload_dir = Path(upload_dir)
+        self.max_file_size = max_file_size
         self.upload_dir.mkdir(exist_ok=True)
         self.use_cloudinary = use_cloudinary and all([CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET])
         
-        # Create subdirectories for local storage
-        (self.upload_dir / "images").mkdir(exist_ok=True)
-        (self.upload_dir / "profiles").mkdir(exist_ok=True)
-        (self.upload_dir / "products").mkdir(exist_ok=True)
-        (self.upload_dir / "brands").mkdir(exist_ok=True)
-
-    async def save_file(self, file: UploadFile, subfolder: str = "images") -> dict:
-        """Save uploaded file and return file info"""
+        # Content-addressed local backend, used when Cloudinary is off or fails
+        self.objects = LocalObjectStore(self.upload_dir)
+
+    async def save_file(self, file: UploadFile, subfolder: str = "images", transformation: Optional[list] = None) -> dict:
+        """Save uploaded file and return file info; raises FileTooLargeError over the size limit.
+
+        ``transformation`` is applied by Cloudinary; the local backend stores the original bytes.
+        """
+        self.check_size(file)
         if self.use_cloudinary:
-            return await self._save_to_cloudinary(file, subfolder)
+            return await self._save_to_cloudinary(file, subfolder, transformation or IMAGE_TRANSFORMATION)
         else:
-            return await self._save_locally(file, subfolder)
+            return await self._save_locally(file)
+
+    async def save_files(self, files: List[UploadFile], subfolder: str = "images",
+                         transformation: Optional[list] = None) -> List[Union[dict, Exception]]:
+        """Save files concurrently; each slot holds the file info or the exception it raised"""
+        return await asyncio.gather(
+            *(self.save_file(f, subfolder, transformation) for f in files), return_exceptions=True
+        )
     
-    async def _save_to_cloudinary(self, file: UploadFile, subfolder: str) -> dict:
+    async def _save_to_cloudinary(self, file: UploadFile, subfolder: str, transformation: list) -> dict:
         """Save file to Cloudinary"""
         try:
-            result = cloudinary.uploader.upload(
+            result = await cloudinary_client.upload(
                 file.file,
                 folder=f"glow_genius/{subfolder}",
                 resource_type="auto",
-                transformation=[
-                    {"width": 1000, "height": 1000, "crop": "limit"},
-                    {"quality": "auto"},
-                    {"fetch_format": "auto"}
-                ]
+                transformation=transformation
             )
             
             return {
                 "filename": result["public_id"],
                 "original_filename": file.filename,
                 "file_path": result["secure_url"],
+                "url": result["secure_url"],
                 "file_size": result.get("bytes", 0),
                 "content_type": file.content_type,
+                "content_hash": None,
                 "public_id": result["public_id"],
                 "width": result.get("width"),
                 "height": result.get("height"),
                 "format": result.get("format"),
                 "storage_type": "cloudinary"
             }
+        except FileTooLargeError:
+            raise
         except Exception as e:
             # Fallback to local storage if Cloudinary fails
-            return await self._save_locally(file, subfolder)
+            return await self._save_locally(file)
     
-    async def _save_locally(self, file: UploadFile, subfolder: str) -> dict:
-        """Save file locally (fallback method)"""
-        # Generate unique filename
-        file_extension = file.filename.split(".")[-1] if "." in file.filename else ""
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        
-        # Create file path
-        file_path = self.upload_dir / subfolder / unique_filename
-        
-        # Save file
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+    def check_size(self, file: UploadFile) -> None:
+        """Reject an upload whose size is already known to exceed the limit, before any copying"""
+        size = upload_size(file)
+        if size is not None and size > self.max_file_size:
+            raise FileTooLargeError(self.max_file_size)
+
+    async def _save_locally(self, file: UploadFile) -> dict:
+        """Save file in the content-addressed local store"""
+        # Stream to disk in chunks, enforcing the size limit as bytes arrive
+        await file.seek(0)
+        key, file_size, _ = await self.objects.put(file, self.max_file_size)
+        file_path = self.objects.path_for(key)
         
         return {
-            "filename": unique_filename,
+            "filename": key,
             "original_filename": file.filename,
             "file_path": str(file_path),
-            "file_size": len(content),
+            "url": self.get_file_url(str(file_path)),
+            "file_size": file_size,
             "content_type": file.content_type,
+            "content_hash": key,
+            # Unique per upload, so deleting one upload never touches another's record
+            "public_id": f"local/{uuid.uuid4().hex}",
+            **_image_info(file_path),
             "storage_type": "local"
         }
 
-    def delete_file(self, file_path: str, public_id: str = None) -> bool:
-        """Delete file from storage"""
-        if self.use_cloudinary and public_id:
-            try:
-                cloudinary.uploader.destroy(public_id)
-                return True
-            except Exception:
-                pass
-        
-        # Local file deletion
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
-        except Exception:
-            pass
-        return False
-
     def get_file_url(self, file_path: str) -> str:
         """Get URL for accessing file"""
         if file_path.startswith("http"):
@@ -112,4 +311,4 @@ class StorageService:
         return f"/static/{file_path.replace(str(self.upload_dir) + '/', '')}"
 
 # Global storage instance
-storage = StorageService()
+storage = StorageService(settings.UPLOAD_DIR, use_cloudinary=settings.STORAGE_BACKEND == "cloudinary")
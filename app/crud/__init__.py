@@ -8,3 +8,6 @@ from . import analysis as analysis
 from . import recommend as recommend
 from . import recommendations as recommendations
 from . import reminders as reminders
+from . import clickout as clickout
+from . import shade as shade
+from . import jobs as jobs
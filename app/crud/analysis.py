@@ -1,3 +1,4 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from typing import Any, Dict, List, Optional
 from datetime import datetime
@@ -6,8 +7,13 @@ import json
 from app.models.analysis import Analysis
 
 
-def create_analysis_record(db: Session, user_id: int, image_url: str, analysis_type: str = "image_upload") -> Analysis:
-    """Create a minimal analysis record to track an uploaded image for analysis."""
+def create_analysis_record(db: Session, user_id: int, image_url: str, analysis_type: str = "image_upload",
+                           commit: bool = True) -> Analysis:
+    """Create a minimal analysis record to track an uploaded image for analysis.
+
+    With ``commit=False`` the record is only flushed (so it has an id) and
+    is committed with whatever the caller writes next.
+    """
     record = Analysis(
         user_id=user_id,
         image_url=image_url,
@@ -18,27 +24,59 @@ def create_analysis_record(db: Session, user_id: int, image_url: str, analysis_t
         recommendations=None,
     )
     db.add(record)
+    if not commit:
+        db.flush()
+        return record
     db.commit()
     db.refresh(record)
     return record
 
 
-def create_analysis(db: Session, user_id: int, results: Dict[str, Any], analysis_type: str = "skin") -> Analysis:
-    """Create a full analysis record with computed results."""
-    record = Analysis(
+def _analysis_row(user_id: int, results: Dict[str, Any], analysis_type: str, analysis_date: datetime) -> Dict[str, Any]:
+    return dict(
         user_id=user_id,
         analysis_type=analysis_type,
         results=json.dumps(results),
-        analysis_date=datetime.utcnow(),
+        analysis_date=analysis_date,
         confidence_score=results.get("confidence_score") if isinstance(results, dict) else None,
         recommendations=json.dumps(results.get("recommendations")) if isinstance(results, dict) and results.get("recommendations") is not None else None,
     )
+
+
+def set_analysis_results(db: Session, analysis_id: int, results: Dict[str, Any]) -> Optional[Analysis]:
+    """Fill in the results of a record made by create_analysis_record."""
+    record = db.get(Analysis, analysis_id)
+    if record is None:
+        return None
+    row = _analysis_row(record.user_id, results, record.analysis_type, record.analysis_date)
+    for field in ("results", "confidence_score", "recommendations"):
+        setattr(record, field, row[field])
+    db.commit()
+    return record
+
+
+def create_analysis(db: Session, user_id: int, results: Dict[str, Any], analysis_type: str = "skin") -> Analysis:
+    """Create a full analysis record with computed results."""
+    record = Analysis(**_analysis_row(user_id, results, analysis_type, datetime.utcnow()))
     db.add(record)
     db.commit()
     db.refresh(record)
     return record
 
 
+def create_analyses(db: Session, user_id: int, results: List[Dict[str, Any]], analysis_type: str = "skin") -> List[int]:
+    """Insert one analysis per result in a single statement; returns the new ids in input order."""
+    if not results:
+        return []
+    now = datetime.utcnow()
+    ids = db.scalars(
+        insert(Analysis).returning(Analysis.id, sort_by_parameter_order=True),
+        [_analysis_row(user_id, r, analysis_type, now) for r in results],
+    ).all()
+    db.commit()
+    return list(ids)
+
+
 def get_user_analyses(db: Session, user_id: int) -> List[Analysis]:
     """Return analyses for a user ordered by newest first."""
     return (
@@ -2,6 +2,9 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.models.brand import Brand, BrandImage
 from app.schemas.brand import BrandCreate, BrandUpdate, BrandImageCreate
+from app.services.catalog_index import catalog_index
+from app.services.recommendation_cache import recommendation_cache
+from app.services.shade_index import shade_index
 
 # Canonical CRUD functions
 
@@ -30,6 +33,9 @@ def update_brand(db: Session, brand_id: int, brand: BrandUpdate) -> Optional[Bra
             setattr(db_brand, key, value)
         db.commit()
         db.refresh(db_brand)
+        catalog_index.invalidate()
+        shade_index.invalidate()
+        recommendation_cache.invalidate_all()
     return db_brand
 
 def delete_brand(db: Session, brand_id: int) -> bool:
@@ -37,6 +43,9 @@ def delete_brand(db: Session, brand_id: int) -> bool:
     if db_brand:
         db.delete(db_brand)
         db.commit()
+        catalog_index.invalidate()
+        shade_index.invalidate()
+        recommendation_cache.invalidate_all()
         return True
     return False
 
@@ -0,0 +1,22 @@
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.models.clickout import Clickout
+from app.services.popularity import popularity_tracker
+
+
+def create(
+    db: Session,
+    user_id: int,
+    url: str,
+    product_id: Optional[int] = None,
+    brand_id: Optional[int] = None,
+    source: Optional[str] = None,
+) -> Clickout:
+    """Record an outbound click and feed it to the popularity counters."""
+    row = Clickout(user_id=user_id, product_id=product_id, brand_id=brand_id, url=url, source=source)
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    popularity_tracker.record_clickout(product_id, row.created_at)
+    return row
@@ -1,29 +1,54 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from app.models.file import File
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Set
+
+FILE_FIELDS = (
+    "filename", "original_filename", "file_path", "file_size",
+    "file_type", "purpose", "public_id", "storage_type", "content_hash",
+)
+
+
+def _file_row(user_id: int, data: Dict) -> Dict:
+    return {"user_id": user_id, **{field: data.get(field) for field in FILE_FIELDS}}
+
 
 def create_file(db: Session, user_id: int, data: Dict) -> File:
     """Create a File DB record from upload data.
     Expected keys in data: filename, original_filename, file_path, file_size,
-    file_type, purpose, public_id, storage_type
+    file_type, purpose, public_id, storage_type, content_hash
     """
-    file_row = File(
-        user_id=user_id,
-        filename=data.get("filename"),
-        original_filename=data.get("original_filename"),
-        file_path=data.get("file_path"),
-        file_size=data.get("file_size"),
-        file_type=data.get("file_type"),
-        purpose=data.get("purpose"),
-        public_id=data.get("public_id"),
-        storage_type=data.get("storage_type"),
-    )
+    file_row = File(**_file_row(user_id, data))
     db.add(file_row)
     db.commit()
     db.refresh(file_row)
     return file_row
 
 
+def create_files(db: Session, user_id: int, items: List[Dict]) -> List[int]:
+    """Insert one File record per upload in a single statement and transaction; returns ids in input order."""
+    if not items:
+        return []
+    ids = db.scalars(
+        insert(File).returning(File.id, sort_by_parameter_order=True),
+        [_file_row(user_id, data) for data in items],
+    ).all()
+    db.commit()
+    return list(ids)
+
+
+def get_by_public_id(db: Session, public_id: str) -> List[File]:
+    return db.query(File).filter(File.public_id == public_id).all()
+
+
+def referenced_content_hashes(db: Session, content_hashes: List[str]) -> Set[str]:
+    """The subset of ``content_hashes`` that some record still references."""
+    if not content_hashes:
+        return set()
+    rows = db.query(File.content_hash).filter(File.content_hash.in_(content_hashes)).distinct()
+    return {content_hash for (content_hash,) in rows}
+
+
 def delete_by_public_id(db: Session, public_id: str) -> int:
     """Delete file records by Cloudinary public_id. Returns number deleted."""
     q = db.query(File).filter(File.public_id == public_id)
@@ -0,0 +1,8 @@
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.models.job import Job
+
+
+def get_job(db: Session, job_id: int) -> Optional[Job]:
+    return db.get(Job, job_id)
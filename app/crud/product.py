@@ -1,19 +1,25 @@
-from typing import Optional
+from typing import List, Optional
 from sqlalchemy.orm import Session
+from app.core.loaders import PRODUCT_DETAIL, PRODUCT_LIST
+from app.models.ingredient import Ingredient
 from app.models.product import Product
 from app.schemas.product import ProductCreate, ProductUpdate
+from app.services.catalog_index import catalog_index
+from app.services.recommendation_cache import recommendation_cache
+from app.services.shade_index import shade_index
+from app.services.similarity import ingredient_similarity
 
 
 def get_all(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Product).offset(skip).limit(limit).all()
+    return db.query(Product).options(*PRODUCT_LIST).order_by(Product.id).offset(skip).limit(limit).all()
 
 
 def get_by_id(db: Session, product_id: int):
-    return db.query(Product).filter(Product.id == product_id).first()
+    return db.query(Product).options(*PRODUCT_DETAIL).filter(Product.id == product_id).first()
 
 
 def get_by_brand(db: Session, brand_id: int):
-    return db.query(Product).filter(Product.brand_id == brand_id).all()
+    return db.query(Product).options(*PRODUCT_LIST).filter(Product.brand_id == brand_id).all()
 
 
 def create(db: Session, product: ProductCreate) -> Product:
@@ -25,6 +31,8 @@ def create(db: Session, product: ProductCreate) -> Product:
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    catalog_index.invalidate()
+    recommendation_cache.invalidate_all()
     return db_product
 
 
@@ -37,6 +45,9 @@ def update(db: Session, product_id: int, product: ProductUpdate) -> Optional[Pro
         setattr(db_product, key, value)
     db.commit()
     db.refresh(db_product)
+    catalog_index.invalidate()
+    shade_index.invalidate()
+    recommendation_cache.invalidate_all()
     return db_product
 
 
@@ -46,9 +57,25 @@ def delete(db: Session, product_id: int) -> bool:
         return False
     db.delete(db_product)
     db.commit()
+    catalog_index.invalidate()
+    ingredient_similarity.remove_product(product_id)
+    shade_index.invalidate()
+    recommendation_cache.invalidate_all()
     return True
 
 
+def set_ingredients(db: Session, product_id: int, ingredient_ids: List[int]) -> Optional[Product]:
+    """Replace a product's ingredient list and refresh its similarity neighbours."""
+    db_product = db.query(Product).filter(Product.id == product_id).first()
+    if not db_product:
+        return None
+    db_product.ingredients = db.query(Ingredient).filter(Ingredient.id.in_(ingredient_ids)).all()
+    db.commit()
+    ingredient_similarity.update_product(product_id, [i.id for i in db_product.ingredients])
+    recommendation_cache.invalidate_all()
+    return db_product
+
+
 def search_products(
     db: Session,
     q: Optional[str] = None,
@@ -57,7 +84,7 @@ def search_products(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
 ):
-    qs = db.query(Product)
+    qs = db.query(Product).options(*PRODUCT_LIST)
     if q:
         like = f"%{q}%"
         qs = qs.filter((Product.name.ilike(like)) | (Product.description.ilike(like)))
@@ -5,6 +5,7 @@ import json
 
 from app.models.profile import Profile
 from app.models.user import User
+from app.services.recommendation_cache import recommendation_cache
 
 
 def _dump_list(value: Any) -> Optional[str]:
@@ -60,6 +61,7 @@ def create(db: Session, profile_data) -> Profile:
 
     db.commit()
     db.refresh(profile)
+    recommendation_cache.invalidate_user(profile.user_id)
     return profile
 
 
@@ -101,6 +103,7 @@ def update_user(db: Session, user_id: int, profile_update) -> Optional[Profile]:
 
     db.commit()
     db.refresh(profile)
+    recommendation_cache.invalidate_user(user_id)
     return profile
 
 
@@ -124,6 +127,7 @@ def update_preferences(db: Session, user_id: int, preferences) -> Optional[Profi
 
     db.commit()
     db.refresh(profile)
+    recommendation_cache.invalidate_user(user_id)
     return profile
 
 
@@ -133,4 +137,5 @@ def delete_by_user_id(db: Session, user_id: int) -> bool:
         return False
     db.delete(profile)
     db.commit()
+    recommendation_cache.invalidate_user(user_id)
     return True
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.services.recommender import RecommendationService
+from app.services.batch_recommender import batch_recommender
 
 
 def generate_for_user(db: Session, user_id: int) -> List[Dict[str, Any]]:
@@ -10,3 +11,8 @@ def generate_for_user(db: Session, user_id: int) -> List[Dict[str, Any]]:
     service = RecommendationService()
     # Fallback: use trending as a baseline
     return service.get_trending_products_for_user(user_id, db)
+
+
+def get_precomputed(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+    """Return the user's fresh precomputed set ({"recommendations", "saved_id"}) or None."""
+    return batch_recommender.serve(db, user_id)
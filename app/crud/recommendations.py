@@ -1,3 +1,4 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from datetime import datetime
@@ -5,68 +6,76 @@ import json
 
 from app.models.recommendation import Recommendation, RecommendationItem
 from app.models.product import Product
+from app.core.loaders import RECOMMENDATION_WITH_ITEMS
+from app.services.job_queue import job_queue
+from app.services.popularity import popularity_tracker
 
 
-def save(db: Session, user_id: int, rec_payload) -> Recommendation:
-    """Save a recommendation set provided by the client.
+def _create_set(db: Session, **values) -> int:
+    """Insert the recommendation header row and return its id in the same round trip."""
+    return db.execute(insert(Recommendation).values(**values).returning(Recommendation.id)).scalar_one()
+
+
+def insert_items(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Insert all items of a set with one executemany statement."""
+    if rows:
+        db.execute(insert(RecommendationItem), rows)
+
+
+def _persist_items(db: Session, user_id: int, rows: List[Dict[str, Any]], defer_items: bool) -> None:
+    if not defer_items:
+        insert_items(db, rows)
+        db.commit()
+    else:
+        # The header and a durable job for its items commit together, so saved_id is valid now
+        # and the items are written (with retries) by the job queue after the response
+        job_queue.enqueue(db, [("save_recommendation_items", {"rows": rows})], user_id=user_id)
+
+
+def save(db: Session, user_id: int, rec_payload) -> int:
+    """Save a recommendation set provided by the client and return its id.
     rec_payload may be a Pydantic model with product_ids and reason fields.
     """
     data = rec_payload.dict() if hasattr(rec_payload, "dict") else dict(rec_payload)
-    reason = data.get("reason")
     product_ids: List[int] = data.get("product_ids") or []
 
-    rec = Recommendation(user_id=user_id, reason=reason, created_at=datetime.utcnow())
-    db.add(rec)
-    db.flush()  # get rec.id
-
-    rank = 1
-    for pid in product_ids:
-        item = RecommendationItem(
-            recommendation_id=rec.id,
-            product_id=pid,
-            score=None,
-            reason=None,
-            rank=rank,
-        )
-        db.add(item)
-        rank += 1
+    rec_id = _create_set(db, user_id=user_id, reason=data.get("reason"), created_at=datetime.utcnow())
+    rows = [
+        {"recommendation_id": rec_id, "product_id": pid, "score": None, "reason": None, "rank": rank}
+        for rank, pid in enumerate(product_ids, start=1)
+    ]
+    _persist_items(db, user_id, rows, defer_items=False)
+    return rec_id
 
-    db.commit()
-    db.refresh(rec)
-    return rec
 
-
-def save_generated(db: Session, user_id: int, generated_items: List[Dict[str, Any]], title: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> Recommendation:
-    """Persist items returned by a recommender run."""
-    rec = Recommendation(
+def save_generated(db: Session, user_id: int, generated_items: List[Dict[str, Any]], title: Optional[str] = None, filters: Optional[Dict[str, Any]] = None, defer_items: bool = False) -> int:
+    """Persist items returned by a recommender run and return the set id.
+    With defer_items the items are written by a background job after the response is sent.
+    """
+    rec_id = _create_set(
+        db,
         user_id=user_id,
         title=title or "auto",
         reason="auto-generated",
         filters=json.dumps(filters) if filters else None,
         created_at=datetime.utcnow(),
     )
-    db.add(rec)
-    db.flush()
-
-    for idx, it in enumerate(generated_items, start=1):
-        product_id = it.get("id") or it.get("product_id")
+    rows = []
+    for rank, it in enumerate(generated_items, start=1):
         reasons = it.get("reasons")
-        item = RecommendationItem(
-            recommendation_id=rec.id,
-            product_id=product_id,
-            score=it.get("score"),
-            reason=", ".join(reasons) if isinstance(reasons, list) else (reasons or None),
-            rank=idx,
-        )
-        db.add(item)
-
-    db.commit()
-    db.refresh(rec)
-    return rec
+        rows.append({
+            "recommendation_id": rec_id,
+            "product_id": it.get("id") or it.get("product_id"),
+            "score": it.get("score"),
+            "reason": ", ".join(reasons) if isinstance(reasons, list) else (reasons or None),
+            "rank": rank,
+        })
+    _persist_items(db, user_id, rows, defer_items)
+    return rec_id
 
 
 def get_for_user(db: Session, user_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Recommendation]:
-    q = db.query(Recommendation).filter(Recommendation.user_id == user_id)
+    q = db.query(Recommendation).options(*RECOMMENDATION_WITH_ITEMS).filter(Recommendation.user_id == user_id)
     if since:
         q = q.filter(Recommendation.created_at >= since)
     if until:
@@ -78,6 +87,7 @@ def get_by_category(db: Session, user_id: int, category: str) -> List[Recommenda
     # Return recommendation sets that contain at least one item with a product in the given category
     return (
         db.query(Recommendation)
+        .options(*RECOMMENDATION_WITH_ITEMS)
         .join(Recommendation.items)
         .join(RecommendationItem.product)
         .filter(Recommendation.user_id == user_id, Product.category == category)
@@ -98,8 +108,14 @@ def update_rating(db: Session, user_id: int, recommendation_id: int, rating: int
     rec = db.query(Recommendation).filter(Recommendation.id == recommendation_id, Recommendation.user_id == user_id).first()
     if not rec:
         return None
+    previous = rec.rating
     rec.rating = rating
     db.add(rec)
     db.commit()
     db.refresh(rec)
+    popularity_tracker.record_rating(
+        [item.product_id for item in rec.items],
+        rating - (previous if previous is not None else 3),
+        new_rating=previous is None,
+    )
     return rec
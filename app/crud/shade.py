@@ -0,0 +1,68 @@
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.models.shade import Shade
+from app.schemas.shade import ShadeCreate
+from app.services.shade_index import shade_index
+
+
+def _rgb(hex_code: str):
+    value = hex_code.lstrip("#")
+    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+
+
+def get(db: Session, shade_id: int) -> Optional[Shade]:
+    return db.query(Shade).filter(Shade.id == shade_id).first()
+
+
+def get_by_category(db: Session, category: str, undertone: Optional[str] = None) -> List[Shade]:
+    q = db.query(Shade).filter(Shade.category == category)
+    if undertone:
+        q = q.filter(Shade.undertone == undertone)
+    return q.order_by(Shade.id).all()
+
+
+def create(db: Session, shade: ShadeCreate) -> Shade:
+    """Create a shade; the RGB columns are derived from hex_code."""
+    r, g, b = _rgb(shade.hex_code)
+    db_shade = Shade(**shade.dict(), rgb_r=r, rgb_g=g, rgb_b=b)
+    db.add(db_shade)
+    db.commit()
+    db.refresh(db_shade)
+    shade_index.invalidate()
+    return db_shade
+
+
+def create_many(db: Session, shades: List[ShadeCreate]) -> int:
+    """Bulk-load a shade catalog with one executemany INSERT."""
+    rows = []
+    for shade in shades:
+        r, g, b = _rgb(shade.hex_code)
+        rows.append({**shade.dict(), "rgb_r": r, "rgb_g": g, "rgb_b": b})
+    if rows:
+        db.bulk_insert_mappings(Shade, rows)
+        db.commit()
+        shade_index.invalidate()
+    return len(rows)
+
+
+def update(db: Session, shade_id: int, shade: ShadeCreate) -> Optional[Shade]:
+    db_shade = get(db, shade_id)
+    if not db_shade:
+        return None
+    for key, value in shade.dict().items():
+        setattr(db_shade, key, value)
+    db_shade.rgb_r, db_shade.rgb_g, db_shade.rgb_b = _rgb(shade.hex_code)
+    db.commit()
+    db.refresh(db_shade)
+    shade_index.invalidate()
+    return db_shade
+
+
+def delete(db: Session, shade_id: int) -> bool:
+    db_shade = get(db, shade_id)
+    if not db_shade:
+        return False
+    db.delete(db_shade)
+    db.commit()
+    shade_index.invalidate()
+    return True
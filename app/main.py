@@ -4,7 +4,17 @@ from apscheduler.schedulers.background import BackgroundScheduler
 
 from app.core.db import engine
 from app.models import Base
+from app.core.config import settings
 from app.services.notifications_service import send_morning_reminder, send_evening_reminder
+from app.services.popularity import flush_popularity
+from app.services.batch_recommender import precompute_recommendations
+from app.services.collaborative import train_collaborative
+from app.services.analysis_executor import analysis_executor
+from app.ml_models.runtime import model_runtime
+from app.core.storage import cloudinary_client
+from app.services.job_queue import job_queue
+from app.services.upload_jobs import collect_unreferenced_objects  # also registers the upload job handlers
+from app.services import recommendation_jobs  # noqa: F401  registers the deferred recommendation writes
 
 # ✅ Import routers individually
 from app.api.v1 import (
@@ -19,7 +29,9 @@ from app.api.v1 import (
     recommendations,
     reminders,
     analysis,
-    admin
+    admin,
+    static,
+    jobs
 )
 
 app = FastAPI(
@@ -37,13 +49,30 @@ async def startup_event():
     # Schedule daily reminders
     scheduler.add_job(send_morning_reminder, 'cron', hour=8, minute=0, id='morning_reminder')
     scheduler.add_job(send_evening_reminder, 'cron', hour=20, minute=0, id='evening_reminder')
+
+    # Flush in-process engagement counters into the popularity rollup
+    scheduler.add_job(flush_popularity, 'interval', seconds=settings.POPULARITY_FLUSH_SECONDS, id='flush_popularity')
+    scheduler.add_job(train_collaborative, 'cron', hour=settings.COLLABORATIVE_TRAIN_HOUR, minute=0, id='train_collaborative')
+    scheduler.add_job(precompute_recommendations, 'cron', hour=settings.PRECOMPUTE_HOUR, minute=0, id='precompute_recommendations')
+    scheduler.add_job(collect_unreferenced_objects, 'interval', seconds=settings.OBJECT_GC_INTERVAL_SECONDS, id='collect_unreferenced_objects')
     
     scheduler.start()
     print("Scheduler started and jobs added.")
 
+    # Start analysis workers now so model loading and warm-up happen before traffic
+    if model_runtime.available():
+        analysis_executor.start()
+
+    # Resume any jobs left queued or in flight by a previous process
+    job_queue.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     scheduler.shutdown()
+    flush_popularity(rebase=False)
+    analysis_executor.shutdown()
+    job_queue.stop()
+    cloudinary_client.shutdown()
     print("Scheduler shut down.")
 
 # ✅ Enable CORS for frontend integration
@@ -73,3 +102,5 @@ app.include_router(recommendations.router, prefix="/api/v1/recommendations", tag
 app.include_router(reminders.router, prefix="/api/v1/reminders", tags=["Reminders"])
 app.include_router(analysis.router, prefix="/api/v1/analysis", tags=["Analysis"])
 app.include_router(admin.router, prefix="/api/v1/admin", tags=["Admin"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["Jobs"])
+app.include_router(static.router, prefix="/static", tags=["Static"])
@@ -0,0 +1,203 @@
+"""
+Image preprocessing shared by the skin-analysis and shade-matching services.
+
+Everything works on NumPy ``uint8`` arrays of shape ``(H, W, 3)``; images are
+downscaled before any statistics so cost does not grow with camera
+resolution. The pipeline is decode (``load_rgb``) -> face-based skin region
+(``skin_region``) -> YCrCb skin mask (``skin_mask``) -> masked colour
+statistics (``masked_mean``).
+"""
+
+import io
+import os
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+# Longest side images are reduced to before colour statistics
+ANALYSIS_SIZE = 256
+# Longest side of the shared working image used by the skin-analysis detectors
+WORKING_SIZE = 512
+# Side of the square face-region crop the detectors run on, so crops can be stacked
+CROP_SIZE = 256
+
+# Face detection runs on a grayscale copy at most this large, looking only for
+# faces at least FACE_MIN_SHARE of its shorter side (analysis photos are selfies)
+DETECT_SIZE = 192
+FACE_MIN_SHARE = 0.2
+FACE_CASCADE = "haarcascade_frontalface_default.xml"
+# Share of the detected face box dropped on each side (left, top, right, bottom):
+# hairline and ears at the sides and top, the jaw edge at the bottom
+FACE_INSET = (0.18, 0.12, 0.18, 0.05)
+
+# Columns of skin_features, in order; feature-input models are trained against this list
+FEATURE_NAMES = [
+    "mean_r", "mean_g", "mean_b", "std_r", "std_g", "std_b",
+    "roughness", "shine", "redness", "skin_fraction",
+]
+
+# Skin chrominance box in YCrCb (Chai & Ngan, 1999)
+SKIN_CR = (133, 173)
+SKIN_CB = (77, 127)
+# Below this share of skin pixels the mask is ignored and the whole frame is used
+MIN_SKIN_FRACTION = 0.02
+
+
+def load_rgb(data: bytes, max_side: int = ANALYSIS_SIZE) -> Optional[np.ndarray]:
+    """Decode image bytes to an upright RGB array no larger than ``max_side``.
+
+    JPEGs are decoded in draft mode, letting libjpeg scale by 1/2, 1/4 or 1/8
+    during the IDCT, so a 12 MP photo is never materialised at full size.
+    EXIF orientation is applied before the final resize. Returns None if the
+    bytes are not a decodable image.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.format == "JPEG":
+            img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGB")
+        img.thumbnail((max_side, max_side))
+    except Exception:
+        return None
+    return np.asarray(img, dtype=np.uint8)
+
+
+def _resize_square(region: np.ndarray, size: int) -> np.ndarray:
+    return cv2.resize(np.ascontiguousarray(region), (size, size), interpolation=cv2.INTER_AREA)
+
+
+def center_crop(rgb: np.ndarray, size: int = CROP_SIZE, fraction: float = 0.5) -> np.ndarray:
+    """Middle ``fraction`` of the frame, resized to a ``size`` x ``size`` square"""
+    h, w = rgb.shape[:2]
+    dh, dw = max(1, int(h * fraction)), max(1, int(w * fraction))
+    top, left = (h - dh) // 2, (w - dw) // 2
+    return _resize_square(rgb[top:top + dh, left:left + dw], size)
+
+
+_cascade: Optional[cv2.CascadeClassifier] = None
+
+
+def _face_cascade() -> cv2.CascadeClassifier:
+    """OpenCV's bundled frontal-face Haar cascade, loaded once per process"""
+    global _cascade
+    if _cascade is None:
+        _cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, FACE_CASCADE))
+    return _cascade
+
+
+def detect_face(rgb: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """Largest frontal face as ``(x, y, w, h)`` in ``rgb`` coordinates, or None"""
+    h, w = rgb.shape[:2]
+    scale = min(1.0, DETECT_SIZE / max(h, w))
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    side = max(24, int(min(gray.shape) * FACE_MIN_SHARE))
+    faces = _face_cascade().detectMultiScale(
+        cv2.equalizeHist(gray), scaleFactor=1.2, minNeighbors=5, minSize=(side, side)
+    )
+    if len(faces) == 0:
+        return None
+    x, y, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+    return tuple(int(round(v / scale)) for v in (x, y, fw, fh))
+
+
+def skin_region(rgb: np.ndarray, size: int = CROP_SIZE) -> np.ndarray:
+    """Square crop of the face's skin area, or of the frame centre when no face is found"""
+    face = detect_face(rgb)
+    if face is None:
+        return center_crop(rgb, size)
+    x, y, fw, fh = face
+    left, top, right, bottom = FACE_INSET
+    region = rgb[y + int(fh * top):y + fh - int(fh * bottom), x + int(fw * left):x + fw - int(fw * right)]
+    return _resize_square(region, size) if region.size else center_crop(rgb, size)
+
+
+def skin_mask(rgb: np.ndarray) -> np.ndarray:
+    """Boolean mask of pixels whose chrominance falls in the skin range (any leading shape)"""
+    pixels = rgb.astype(np.float32)
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    y = 0.299 * r + 0.587 * g + 0.114 * b
+    cr = (r - y) * 0.713 + 128
+    cb = (b - y) * 0.564 + 128
+    return (cr >= SKIN_CR[0]) & (cr <= SKIN_CR[1]) & (cb >= SKIN_CB[0]) & (cb <= SKIN_CB[1])
+
+
+def masked_mean(pixels: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean colour of the masked pixels of each image in a batch, and the masked fraction.
+
+    ``pixels`` is ``(N, H, W, 3)`` and ``mask`` ``(N, H, W)``. Images with less
+    than MIN_SKIN_FRACTION of their pixels masked fall back to the mean of
+    every pixel.
+    """
+    n = len(pixels)
+    flat = pixels.reshape(n, -1, 3).astype(np.float32)
+    weights = mask.reshape(n, -1).astype(np.float32)
+    fractions = weights.sum(axis=1) / max(weights.shape[1], 1)
+    # Images below the threshold weight every pixel equally instead
+    weights[fractions < MIN_SKIN_FRACTION] = 1.0
+    # (N, 1, P) @ (N, P, 3): a BLAS product per image instead of a strided reduction
+    sums = (weights[:, None, :] @ flat)[:, 0]
+    means = sums / np.maximum(weights.sum(axis=1), 1.0)[:, None]
+    return means, fractions
+
+
+def skin_features(crops: np.ndarray, masks: Optional[np.ndarray] = None) -> np.ndarray:
+    """Per-crop feature rows (see FEATURE_NAMES) for an ``(N, H, W, 3)`` uint8 batch.
+
+    Colour statistics are in 0-1, ``roughness`` is the mean absolute
+    luminance gradient in 0-255 units, ``shine`` the share of bright,
+    desaturated (specular) pixels and ``redness`` the mean of R - G in 0-1.
+    ``masks`` are the crops' skin masks, computed here if not given.
+    """
+    if masks is None:
+        masks = skin_mask(crops)
+    pixels = crops.astype(np.float32) / 255.0
+    means = pixels.mean(axis=(1, 2))
+    stds = pixels.std(axis=(1, 2))
+    luma = crops.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    roughness = (np.abs(np.diff(luma, axis=1)).mean(axis=(1, 2))
+                 + np.abs(np.diff(luma, axis=2)).mean(axis=(1, 2)))
+    high = crops.max(axis=3).astype(np.int16)
+    low = crops.min(axis=3).astype(np.int16)
+    shine = ((high >= 220) & (high - low <= 40)).mean(axis=(1, 2))
+    redness = (pixels[..., 0] - pixels[..., 1]).mean(axis=(1, 2))
+    skin = masks.reshape(len(crops), -1).mean(axis=1) if len(crops) else np.zeros(0)
+    return np.column_stack([means, stds, roughness, shine, redness, skin]).astype(np.float32)
+
+
+def mean_color(rgb: np.ndarray, mask: Optional[np.ndarray] = None) -> Tuple[int, int, int]:
+    """Average colour of the (masked) pixels"""
+    pixels = rgb.reshape(-1, 3) if mask is None else rgb[mask]
+    r, g, b = pixels.mean(axis=0, dtype=np.float64)
+    return int(round(r)), int(round(g)), int(round(b))
+
+
+def skin_color(rgb: np.ndarray) -> Tuple[Tuple[int, int, int], float]:
+    """Average skin colour and the fraction of pixels classified as skin.
+
+    Falls back to the whole frame when too little skin is detected.
+    """
+    means, fractions = masked_mean(rgb[None], skin_mask(rgb)[None])
+    r, g, b = (int(round(c)) for c in means[0])
+    return (r, g, b), float(fractions[0])
+
+
+def dhash(rgb: np.ndarray) -> int:
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail.
+
+    Survives re-encoding, resizing and small crops, so near-identical uploads
+    hash within a few bits of each other.
+    """
+    gray = Image.fromarray(rgb).convert("L").resize((9, 8), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = np.packbits((pixels[:, 1:] > pixels[:, :-1]).ravel())
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def fingerprint(rgb: np.ndarray) -> Tuple[int, Tuple[int, int, int]]:
+    """Near-duplicate key: the luminance dHash plus the mean colour it cannot see"""
+    return dhash(rgb), mean_color(rgb)
@@ -0,0 +1,183 @@
+"""
+CPU inference runtime for the skin-analysis detectors.
+
+Each model lives in its own directory under ``MODEL_PATH`` with a
+``model.json`` spec::
+
+    {"format": "numpy", "input": "features", "output": "softmax",
+     "labels": ["oily", "dry", ...],
+     "layers": [{"weight": "w0.npy", "bias": "b0.npy", "activation": "relu"}, ...]}
+
+``format`` is ``numpy`` (a dense network whose ``.npy`` weights are
+memory-mapped, so every worker process shares the same page-cache copy) or
+``onnx`` (``"file": "model.onnx"``, needs the optional ``onnxruntime``
+package). ``input`` is ``features`` (``preprocess.skin_features``) or
+``pixels`` (the ``(N, 3, H, W)`` float crop batch scaled to 0-1). Every
+model takes a batch and returns one output row per item, so callers can
+coalesce concurrent requests into a single forward pass.
+
+Models load lazily, once per process; ``warm_up`` loads everything present
+and runs one dummy batch so the first real request does not pay for it.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml_models.preprocess import CROP_SIZE, FEATURE_NAMES
+
+try:
+    import onnxruntime
+except ImportError:  # optional dependency
+    onnxruntime = None
+
+SPEC_FILE = "model.json"
+
+_ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "linear": lambda x: x,
+}
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    shifted = np.exp(x - x.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+_OUTPUTS = {"softmax": _softmax, "sigmoid": _sigmoid, "linear": lambda x: x}
+
+
+class Model:
+    """A loaded model: batched ``predict`` plus the metadata from its spec"""
+
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.spec = spec
+        self.input = spec.get("input", "features")
+        self.labels: List[str] = list(spec.get("labels", []))
+        self._output = _OUTPUTS[spec.get("output", "linear")]
+        if self.input == "features" and spec.get("features", FEATURE_NAMES) != FEATURE_NAMES:
+            raise ValueError(f"Model {name} was trained on different features")
+
+    def predict(self, inputs: np.ndarray) -> np.ndarray:
+        return self._output(self._forward(np.asarray(inputs, dtype=np.float32)))
+
+    def _forward(self, x: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def dummy_input(self, batch: int = 1) -> np.ndarray:
+        if self.input == "pixels":
+            return np.zeros((batch, 3, CROP_SIZE, CROP_SIZE), dtype=np.float32)
+        return np.zeros((batch, len(FEATURE_NAMES)), dtype=np.float32)
+
+
+class NumpyModel(Model):
+    """Dense network evaluated with NumPy on memory-mapped weights"""
+
+    def __init__(self, name: str, spec: Dict[str, Any], directory: str):
+        super().__init__(name, spec)
+        self.layers = [
+            (
+                np.load(os.path.join(directory, layer["weight"]), mmap_mode="r"),
+                np.load(os.path.join(directory, layer["bias"]), mmap_mode="r"),
+                _ACTIVATIONS[layer.get("activation", "linear")],
+            )
+            for layer in spec["layers"]
+        ]
+
+    def _forward(self, x: np.ndarray) -> np.ndarray:
+        x = x.reshape(len(x), -1)
+        for weight, bias, activation in self.layers:
+            x = activation(x @ weight + bias)
+        return x
+
+
+class OnnxModel(Model):
+    """ONNX graph run by onnxruntime on the CPU provider"""
+
+    def __init__(self, name: str, spec: Dict[str, Any], directory: str, threads: int = 1):
+        super().__init__(name, spec)
+        if onnxruntime is None:
+            raise RuntimeError(f"Model {name} needs onnxruntime, which is not installed")
+        options = onnxruntime.SessionOptions()
+        # One inference thread per worker process; parallelism comes from the process pool
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, spec.get("file", "model.onnx")),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _forward(self, x: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: x})[0]
+
+
+class ModelRuntime:
+    """Per-process registry of models under ``path``; missing models resolve to None"""
+
+    def __init__(self, path: str, threads: int = 1):
+        self.path = path
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._models: Dict[str, Optional[Model]] = {}
+
+    def available(self) -> List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            name for name in os.listdir(self.path)
+            if os.path.isfile(os.path.join(self.path, name, SPEC_FILE))
+        )
+
+    def get(self, name: str) -> Optional[Model]:
+        if name in self._models:
+            return self._models[name]
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = self._load(name)
+            return self._models[name]
+
+    def _load(self, name: str) -> Optional[Model]:
+        directory = os.path.join(self.path, name)
+        spec_path = os.path.join(directory, SPEC_FILE)
+        if not os.path.isfile(spec_path):
+            return None
+        with open(spec_path) as f:
+            spec = json.load(f)
+        if spec.get("format", "numpy") == "onnx":
+            return OnnxModel(name, spec, directory, self.threads)
+        return NumpyModel(name, spec, directory)
+
+    def warm_up(self) -> List[str]:
+        """Load every model present and push one dummy batch through each"""
+        loaded = []
+        for name in self.available():
+            model = self.get(name)
+            if model is not None:
+                model.predict(model.dummy_input())
+                loaded.append(name)
+        return loaded
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+# Global model runtime instance
+model_runtime = ModelRuntime(os.path.join(settings.MODEL_PATH, "skin"), threads=settings.MODEL_THREADS)
+
+
+def warm_up_worker() -> None:
+    """Process-pool initializer: load and warm every model once per worker"""
+    model_runtime.warm_up()
@@ -12,3 +12,6 @@ from .chatbot_log import ChatbotLog
 from .clickout import Clickout
 from .product_ingredient import product_ingredients
 from .recommendation import Recommendation, RecommendationItem
+from .popularity import ProductPopularity
+from .shade import Shade
+from .job import Job
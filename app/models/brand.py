@@ -22,6 +22,7 @@ class Brand(Base):
     user = relationship("User", back_populates="brands")
     images = relationship("BrandImage", back_populates="brand", cascade="all, delete-orphan")
     products = relationship("Product", back_populates="brand", cascade="all, delete-orphan")
+    shades = relationship("Shade", back_populates="brand", cascade="all, delete-orphan")
 
 
 class BrandImage(Base):
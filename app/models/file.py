@@ -16,6 +16,8 @@ class File(Base):
     # Cloudinary metadata
     public_id = Column(String(255))
     storage_type = Column(String(50))  # e.g., 'cloudinary' or 'local'
+    # SHA-256 key of the local object; rows sharing it reference the same bytes
+    content_hash = Column(String(64), index=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
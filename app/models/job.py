@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, func
+from app.core.db import Base
+
+
+class Job(Base):
+    """A unit of background work, claimed and run by app/services/job_queue.py.
+
+    ``status`` moves queued -> running -> succeeded, or back to queued with
+    a later ``run_at`` after a failed attempt, until ``max_attempts`` is
+    spent and it ends as failed. A running job whose ``locked_until`` has
+    passed belongs to a worker that died and can be claimed again.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON string
+    status = Column(String(20), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime(timezone=True), nullable=False)
+    locked_until = Column(DateTime(timezone=True))
+    locked_by = Column(String(100))
+    result = Column(Text)  # JSON string
+    error = Column(Text)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, func
+from sqlalchemy.orm import relationship
+from app.core.db import Base
+
+
+class ProductPopularity(Base):
+    """Rollup of engagement signals per product.
+
+    ``score`` is a forward-decayed sum relative to ``landmark`` (see
+    app/services/popularity.py). All rows share one landmark outside of a
+    rebase, so ordering by ``score`` is the same as ordering by the
+    time-decayed popularity and trending lists are a plain index scan.
+    """
+    __tablename__ = "product_popularity"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False, default=0.0, index=True)
+    landmark = Column(DateTime(timezone=True), nullable=False)
+    clickouts = Column(Integer, nullable=False, default=0)
+    ratings = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    product = relationship("Product", back_populates="popularity")
@@ -25,6 +25,8 @@ class Product(Base):
     reminders = relationship("Reminder", back_populates="product", cascade="all, delete-orphan")
     analyses = relationship("Analysis", back_populates="product", cascade="all, delete-orphan")
     recommendation_items = relationship("RecommendationItem", back_populates="product", cascade="all, delete-orphan")
+    popularity = relationship("ProductPopularity", back_populates="product", uselist=False, cascade="all, delete-orphan")
+    shades = relationship("Shade", back_populates="product", cascade="all, delete-orphan")
 
 class ProductImage(Base):
     __tablename__ = "product_images"
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from app.core.db import Base
 
 
 class Recommendation(Base):
     __tablename__ = "recommendations"
+    __table_args__ = (
+        # Latest set of a given kind per user (precomputed lookups, history)
+        Index("ix_recommendations_user_title_created", "user_id", "title", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
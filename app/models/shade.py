@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
-from backend.app.core.db import Base
+from app.core.db import Base
 
 class Shade(Base):
     __tablename__ = "shades"
-    
+    __table_args__ = (
+        Index("ix_shades_category_undertone", "category", "undertone"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     hex_code = Column(String(7), nullable=False)  # #RRGGBB format
@@ -16,10 +16,12 @@ from .analysis import (
     ProductRecommendation
 )
 from .user import UserCreate, UserUpdate, UserResponse
-from .product import ProductSchema, ProductCreate, ProductUpdate
+from .product import ProductSchema, ProductCreate, ProductUpdate, ProductIngredientsUpdate
 from .brand import BrandCreate,BrandResponse,BrandUpdate,BrandImageCreate
 from .common import *
 
 from .profile import Profile, ProfileCreate, ProfileUpdate, ProfilePreferences
 
-from .recommendation import MakeupPreferences, RecommendationFilters
+from .recommendation import MakeupPreferences, RecommendationFilters, ClickoutCreate
+
+from .shade import ShadeCreate, ShadeResponse
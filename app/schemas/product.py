@@ -30,6 +30,9 @@ class ProductUpdate(BaseModel):
     product_url: Optional[str] = None
     brand_id: Optional[int] = None
 
+class ProductIngredientsUpdate(BaseModel):
+    ingredient_ids: List[int]
+
 class ProductSchema(BaseModel):  # This is imported as ProductSchema in your API
     id: int
     name: str
@@ -20,3 +20,9 @@ class RecommendationFilters(BaseModel):
     min_price: Optional[float] = None
     max_price: Optional[float] = None
     brands: Optional[List[str]] = None
+
+class ClickoutCreate(BaseModel):
+    url: str
+    product_id: Optional[int] = None
+    brand_id: Optional[int] = None
+    source: Optional[str] = "recommendation"
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ShadeBase(BaseModel):
+    name: str
+    hex_code: str = Field(..., pattern=r"^#[0-9a-fA-F]{6}$")  # #RRGGBB
+    undertone: Optional[str] = None  # warm, cool, neutral
+    category: str  # foundation, lipstick, eyeshadow, etc.
+    brand_id: Optional[int] = None
+    product_id: Optional[int] = None
+
+class ShadeCreate(ShadeBase):
+    pass
+
+class ShadeResponse(ShadeBase):
+    id: int
+    rgb_r: int
+    rgb_g: int
+    rgb_b: int
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,102 @@
+"""Benchmark skin-colour extraction on large phone photos.
+
+Run with ``python -m app.scripts.bench_color_extraction``. Compares the old
+per-pixel ``getdata`` loop with the NumPy path in app.ml_models.preprocess
+(downscale, YCrCb skin mask, masked mean). Each variant runs in its own
+subprocess so the reported peak RSS is not shared between them.
+"""
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.ml_models.preprocess import load_rgb, skin_color
+
+SIZES = ((4000, 3000), (8000, 6000))
+REPEATS = 3
+
+
+def legacy(data: bytes):
+    """The original extraction: full-resolution decode and three Python passes"""
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    pixels = list(img.getdata())
+    n = len(pixels)
+    r = sum(p[0] for p in pixels) // n
+    g = sum(p[1] for p in pixels) // n
+    b = sum(p[2] for p in pixels) // n
+    return r, g, b
+
+
+def vectorized(data: bytes):
+    color, _ = skin_color(load_rgb(data))
+    return color
+
+
+def _peak_rss_kib() -> int:
+    """High-water RSS of this process (VmHWM, which unlike ru_maxrss resets on exec)"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _photo(width: int, height: int) -> bytes:
+    """Skin-toned face on a textured background, saved as a phone-quality JPEG"""
+    rng = np.random.default_rng(12)
+    yy, xx = np.ogrid[:height, :width]
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    for c, (base, slope) in enumerate(((40, 120), (90, 60), (160, -80))):
+        channel = base + slope * (xx / width) + 20 * np.sin(yy / 37.0) + rng.normal(0, 8, (height, width))
+        img[..., c] = channel.clip(0, 255)
+    face = ((xx - width / 2) / (width / 4)) ** 2 + ((yy - height / 2) / (height / 3)) ** 2 <= 1
+    img[face] = (np.array([214, 160, 130]) + rng.normal(0, 6, (int(face.sum()), 3))).clip(0, 255)
+    out = io.BytesIO()
+    Image.fromarray(img).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def _run(method: str, path: str) -> None:
+    """Child process: time one method and print latency and peak RSS"""
+    with open(path, "rb") as f:
+        data = f.read()
+    fn = legacy if method == "legacy" else vectorized
+    baseline = _peak_rss_kib()
+    timings = []
+    for _ in range(REPEATS if method != "legacy" else 1):
+        started = time.perf_counter()
+        color = fn(data)
+        timings.append(time.perf_counter() - started)
+    peak = _peak_rss_kib()
+    print(f"{min(timings) * 1000:.0f} {baseline / 1024:.0f} {peak / 1024:.0f} {color}")
+
+
+def main():
+    for width, height in SIZES:
+        data = _photo(width, height)
+        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+            f.write(data)
+        try:
+            print(f"{width}x{height} ({width * height / 1e6:.0f} MP, {len(data) / 1e6:.1f} MB JPEG)")
+            for method in ("legacy", "vectorized"):
+                out = subprocess.run(
+                    [sys.executable, "-m", "app.scripts.bench_color_extraction", method, f.name],
+                    capture_output=True, text=True, check=True,
+                ).stdout.split(maxsplit=3)
+                ms, base, peak, color = out
+                print(f"  {method:<10} {int(ms):>7,} ms  peak RSS {int(peak):>5,} MiB "
+                      f"(startup {int(base):,} MiB)  colour {color.strip()}")
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        _run(sys.argv[1], sys.argv[2])
+    else:
+        main()
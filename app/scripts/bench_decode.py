@@ -0,0 +1,71 @@
+"""Benchmark the skin-analysis decode stage on phone-sized JPEGs.
+
+Run with ``python -m app.scripts.bench_decode``. Compares a full-resolution
+decode plus RGB->BGR conversion (the previous behaviour) with the draft-mode,
+EXIF-aware ``load_rgb`` at the analysis working size. Each variant runs in
+its own subprocess so peak RSS is measured independently.
+"""
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.ml_models.preprocess import WORKING_SIZE, load_rgb
+from app.scripts.bench_color_extraction import _peak_rss_kib, _photo
+
+SIZES = ((4000, 3000), (8000, 6000))
+REPEATS = 5
+
+
+def full(data: bytes) -> np.ndarray:
+    image = Image.open(io.BytesIO(data))
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def draft(data: bytes) -> np.ndarray:
+    return cv2.cvtColor(load_rgb(data, WORKING_SIZE), cv2.COLOR_RGB2BGR)
+
+
+def _run(method: str, path: str) -> None:
+    with open(path, "rb") as f:
+        data = f.read()
+    fn = full if method == "full" else draft
+    baseline = _peak_rss_kib()
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        shape = fn(data).shape
+        timings.append(time.perf_counter() - started)
+    peak = _peak_rss_kib()
+    print(f"{min(timings) * 1000:.1f} {baseline / 1024:.0f} {peak / 1024:.0f} {shape[1]}x{shape[0]}")
+
+
+def main():
+    for width, height in SIZES:
+        data = _photo(width, height)
+        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+            f.write(data)
+        try:
+            print(f"{width}x{height} ({width * height / 1e6:.0f} MP, {len(data) / 1e6:.1f} MB JPEG)")
+            for method in ("full", "draft"):
+                ms, base, peak, shape = subprocess.run(
+                    [sys.executable, "-m", "app.scripts.bench_decode", method, f.name],
+                    capture_output=True, text=True, check=True,
+                ).stdout.split()
+                print(f"  {method:<6} {float(ms):>8.1f} ms  peak RSS {int(peak):>5,} MiB "
+                      f"(startup {int(base):,} MiB)  -> {shape}")
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        _run(sys.argv[1], sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,46 @@
+"""Benchmark nearest-shade lookups against a synthetic 100k-shade catalog.
+
+Run with ``python -m app.scripts.bench_shades``. Compares the partitioned
+KD-tree + CIEDE2000 re-rank used by ShadeIndex with an exhaustive CIEDE2000
+scan, and reports how often the two agree on the best match.
+"""
+import time
+
+import numpy as np
+
+from app.services.shade_index import ShadeIndex, ciede2000, rgb_to_lab
+
+SHADES = 100_000
+QUERIES = 2_000
+UNDERTONES = ("warm", "cool", "neutral")
+
+
+def main():
+    rng = np.random.default_rng(11)
+    rgb = rng.integers(0, 256, size=(SHADES, 3))
+    rows = [
+        (i, f"Shade {i}", "#%02x%02x%02x" % tuple(c), *map(int, c), UNDERTONES[i % 3], "foundation", "Brand", "Product")
+        for i, c in enumerate(rgb)
+    ]
+    index = ShadeIndex()
+    started = time.perf_counter()
+    index._load(rows)
+    print(f"build {SHADES:,} shades: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    queries = rng.integers(0, 256, size=(QUERIES, 3))
+    started = time.perf_counter()
+    best = [index.query(q, "foundation", limit=5)[0]["shade_id"] for q in queries]
+    per_query = (time.perf_counter() - started) / QUERIES * 1000
+    print(f"indexed query:   {per_query:.3f} ms")
+
+    lab = rgb_to_lab(rgb)
+    started = time.perf_counter()
+    exact = [int(np.argmin(ciede2000(rgb_to_lab(q), lab))) for q in queries[:200]]
+    per_scan = (time.perf_counter() - started) / 200 * 1000
+    print(f"exhaustive scan: {per_scan:.3f} ms")
+    agree = np.mean([b == e for b, e in zip(best[:200], exact)])
+    print(f"best-match agreement with exhaustive CIEDE2000: {agree:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Benchmark the skin-region preprocessing stages on a working-size image.
+
+Run with ``python -m app.scripts.bench_skin_region``. Times face detection,
+the skin-region crop, the YCrCb mask and the masked colour statistics on the
+512 px image the analysis workers use.
+"""
+import time
+
+import numpy as np
+
+from app.ml_models.preprocess import (
+    WORKING_SIZE, detect_face, load_rgb, masked_mean, skin_mask, skin_region,
+)
+from app.scripts.bench_color_extraction import _photo
+
+REPEATS = 200
+
+
+def _time(fn, *args) -> float:
+    fn(*args)  # warm-up (loads the cascade)
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(*args)
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+def main():
+    rgb = load_rgb(_photo(4000, 3000), WORKING_SIZE)
+    crop = skin_region(rgb)
+    mask = skin_mask(crop)
+    print(f"working image {rgb.shape[1]}x{rgb.shape[0]}, crop {crop.shape[1]}x{crop.shape[0]}")
+    print(f"detect_face   {_time(detect_face, rgb):6.2f} ms")
+    print(f"skin_region   {_time(skin_region, rgb):6.2f} ms")
+    print(f"skin_mask     {_time(skin_mask, crop):6.2f} ms")
+    print(f"masked_mean   {_time(masked_mean, crop[None], mask[None]):6.2f} ms")
+    batch = np.repeat(crop[None], 16, axis=0)
+    masks = skin_mask(batch)
+    print(f"masked_mean x16 batch {_time(masked_mean, batch, masks):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
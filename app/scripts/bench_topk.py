@@ -0,0 +1,59 @@
+"""Micro-benchmark: full sort vs. partial-partition top-k selection.
+
+Run with ``python -m app.scripts.bench_topk``. Scores are synthetic; each
+candidate is a dict like the ones RecommendationService used to build for
+every product before sorting.
+"""
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.services.ranking import top_k_indices
+
+SIZES = (10_000, 100_000)
+LIMIT = 20
+REPEATS = 5
+
+
+def _full_sort(scores):
+    items = [{"id": i, "score": s} for i, s in enumerate(scores)]
+    items.sort(key=lambda x: x["score"], reverse=True)
+    return items[:LIMIT]
+
+
+def _partition(scores):
+    return top_k_indices(np.asarray(scores), LIMIT)
+
+
+def _measure(fn, arg):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / 1024
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'n':>8} {'method':<14} {'best ms':>10} {'peak KiB':>10}")
+    for n in SIZES:
+        scores = [rng.random() for _ in range(n)]
+        array = np.asarray(scores)
+        assert list(_partition(array)) == [x["id"] for x in _full_sort(scores)]
+        for name, fn, arg in (
+            ("full sort", _full_sort, scores),
+            ("partition", _partition, array),
+        ):
+            ms, kib = _measure(fn, arg)
+            print(f"{n:>8} {name:<14} {ms:>10.2f} {kib:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Precompute recommendation sets for every user with a profile.
+
+Run with ``python -m app.scripts.precompute_recommendations``. The same job
+runs nightly from the scheduler in ``app/main.py`` (``PRECOMPUTE_HOUR``).
+"""
+import argparse
+
+from app.core.db import SessionLocal
+from app.services.batch_recommender import batch_recommender
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=batch_recommender.limit, help="items per user")
+    parser.add_argument("--chunk-size", type=int, default=batch_recommender.chunk_size, help="users scored per batch")
+    args = parser.parse_args()
+
+    batch_recommender.limit = args.limit
+    batch_recommender.chunk_size = args.chunk_size
+    db = SessionLocal()
+    try:
+        count = batch_recommender.run(db)
+    finally:
+        db.close()
+    print(f"Precomputed recommendations for {count} users.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Train the collaborative-filtering model from clickouts and ratings.
+
+Run with ``python -m app.scripts.train_collaborative``. By default the
+previous factors (if any) seed the new run, so a few iterations are enough;
+``--cold`` trains from scratch. The same job runs nightly from the scheduler
+in ``app/main.py`` (``COLLABORATIVE_TRAIN_HOUR``).
+"""
+import argparse
+import time
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.services.collaborative import collaborative_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=None, help="ALS sweeps (default depends on warm/cold)")
+    parser.add_argument("--cold", action="store_true", help="ignore the previous model")
+    args = parser.parse_args()
+
+    warm = not args.cold and collaborative_model.ensure_loaded()
+    iterations = args.iterations or (
+        settings.COLLABORATIVE_WARM_ITERATIONS if warm else settings.COLLABORATIVE_ITERATIONS
+    )
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        stats = collaborative_model.train(db, iterations=iterations, warm_start=warm)
+    finally:
+        db.close()
+    print(f"Trained {'warm' if warm else 'cold'} in {time.perf_counter() - started:.1f}s: {stats}")
+
+
+if __name__ == "__main__":
+    main()
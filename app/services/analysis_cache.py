@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# 64-bit fingerprints are split into this many 16-bit bands for near-duplicate lookup
+BANDS = 4
+BAND_BITS = 64 // BANDS
+
+# (dHash, mean RGB) of a decoded image, see app.ml_models.preprocess.fingerprint
+Fingerprint = Tuple[int, Sequence[int]]
+
+
+def content_digest(data: bytes) -> str:
+    """Exact content key of an upload"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _signed(fingerprint: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def _bands(fingerprint: int):
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (BAND_BITS * i)) & mask for i in range(BANDS)]
+
+
+class AnalysisCache:
+    """On-disk cache of image-analysis results keyed by image content.
+
+    Lookups first try the SHA-256 of the upload, which skips decoding
+    entirely for byte-identical re-uploads. Near-identical images
+    (re-encoded, resized, slightly cropped) are matched by a 64-bit dHash
+    within ``max_distance`` bits and a mean colour within ``color_tolerance``
+    per channel; dHash only sees luminance structure, so the colour check
+    keeps two differently-toned faces in the same pose apart. The hash is
+    stored as four 16-bit bands with an index each: two hashes that differ
+    in fewer than four bits must agree on at least one band, so candidates
+    come from an indexed lookup and only they are compared bit by bit.
+
+    Entries live in a SQLite file shared by every worker process. When the
+    stored values exceed ``max_bytes`` the least recently used are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, max_distance: int = 3,
+                 color_tolerance: int = 6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_distance = min(max_distance, BANDS - 1)
+        self.color_tolerance = color_tolerance
+        self._lock = threading.Lock()
+        self._ready = False
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS entries ("
+                        " namespace TEXT NOT NULL, digest TEXT NOT NULL, fingerprint INTEGER,"
+                        " band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER,"
+                        " red INTEGER, green INTEGER, blue INTEGER,"
+                        " value TEXT NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL,"
+                        " PRIMARY KEY (namespace, digest))"
+                    )
+                    for i in range(BANDS):
+                        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_entries_band{i} ON entries (namespace, band{i})")
+                    conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed_at)")
+                    conn.commit()
+                    self._ready = True
+        return conn
+
+    def peek(self, namespace: str, digest: str) -> Optional[Any]:
+        """Stored value for byte-identical content; a miss is not counted, since a fingerprint lookup follows"""
+        return self._lookup(namespace, digest, None, count_miss=False)
+
+    def get(self, namespace: str, digest: str, fingerprint: Optional[Fingerprint] = None) -> Optional[Any]:
+        """Stored value for identical content, or for a near-identical image when ``fingerprint`` is given"""
+        return self._lookup(namespace, digest, fingerprint, count_miss=True)
+
+    def _lookup(self, namespace: str, digest: str, fingerprint: Optional[Fingerprint],
+                count_miss: bool) -> Optional[Any]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT digest, value FROM entries WHERE namespace = ? AND digest = ?", (namespace, digest)
+            ).fetchone()
+            kind = "exact"
+            if row is None and fingerprint is not None:
+                row = self._nearest(conn, namespace, fingerprint)
+                kind = "near"
+            if row is None:
+                if count_miss:
+                    with self._lock:
+                        self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND digest = ?",
+                (time.time(), namespace, row[0]),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            if kind == "exact":
+                self.exact_hits += 1
+            else:
+                self.near_hits += 1
+        return json.loads(row[1])
+
+    def _nearest(self, conn: sqlite3.Connection, namespace: str, fingerprint: Fingerprint):
+        hashed, color = fingerprint
+        where = " OR ".join(f"band{i} = ?" for i in range(BANDS))
+        candidates = conn.execute(
+            f"SELECT digest, value, fingerprint, red, green, blue FROM entries WHERE namespace = ? AND ({where})",
+            (namespace, *_bands(hashed)),
+        ).fetchall()
+        best, best_distance = None, self.max_distance + 1
+        for digest, value, stored, *stored_color in candidates:
+            if max(abs(a - b) for a, b in zip(stored_color, color)) > self.color_tolerance:
+                continue
+            distance = bin((stored & ((1 << 64) - 1)) ^ hashed).count("1")
+            if distance < best_distance:
+                best, best_distance = (digest, value), distance
+        return best
+
+    def put(self, namespace: str, digest: str, fingerprint: Optional[Fingerprint], value: Any) -> None:
+        payload = json.dumps(value, default=str)
+        if fingerprint is not None:
+            hashed, color = fingerprint
+            keys = [_signed(hashed), *_bands(hashed), *(int(c) for c in color)]
+        else:
+            keys = [None] * (1 + BANDS + 3)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (namespace, digest, *keys, payload, len(payload), time.time()),
+            )
+            self._evict(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed, victims = 0, []
+        for namespace, digest, size in conn.execute(
+            "SELECT namespace, digest, size FROM entries ORDER BY accessed_at"
+        ):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((namespace, digest))
+            freed += size
+        conn.executemany("DELETE FROM entries WHERE namespace = ? AND digest = ?", victims)
+        with self._lock:
+            self.evictions += len(victims)
+
+    def clear(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        finally:
+            conn.close()
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            lookups = hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Global analysis cache instance
+analysis_cache = AnalysisCache(settings.ANALYSIS_CACHE_PATH, max_bytes=settings.ANALYSIS_CACHE_MAX_BYTES)
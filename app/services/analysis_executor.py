@@ -0,0 +1,171 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.ml_models.runtime import warm_up_worker
+
+# Stage timings of the task currently running in this (worker) process
+_stages: Dict[str, float] = {}
+
+
+class AnalysisBusyError(Exception):
+    """Raised when the executor already holds as many tasks as it will accept"""
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block of work inside an analysis task under ``name``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stages[name] = _stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def _run_timed(fn: Callable[..., Any], args: Tuple[Any, ...], submitted_at: float) -> Tuple[Any, Dict[str, float]]:
+    """Worker-side wrapper: run ``fn`` and return its result with the stage timings"""
+    waited = max(0.0, time.time() - submitted_at)
+    _stages.clear()
+    result = fn(*args)
+    return result, {"queue": waited, **_stages}
+
+
+class AnalysisExecutor:
+    """Runs CPU-bound image analysis in a pool of worker processes.
+
+    Decoding and NumPy/OpenCV work hold the GIL for long stretches, so doing
+    them on the event loop (or in its thread pool) stalls every other request
+    on the worker. Tasks go to a ``ProcessPoolExecutor`` instead; at most
+    ``workers + max_queue`` are accepted at once and ``submit`` raises
+    ``AnalysisBusyError`` beyond that, which the API turns into a 429.
+
+    The pool uses the ``spawn`` method so workers never inherit the parent's
+    threads, DB connections or scheduler. ``initializer`` runs once in each
+    worker, which is where inference models are loaded and warmed up.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 8, initializer: Optional[Callable[[], None]] = None):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.initializer = initializer
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._rejected = 0
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer,
+                )
+            return self._pool
+
+    def start(self) -> None:
+        """Spawn every worker now (running ``initializer``) instead of on the first requests"""
+        pool = self._get_pool()
+        for _ in range(self.workers):
+            pool.submit(os.getpid)
+
+    def _reserve(self, slots: int) -> None:
+        with self._lock:
+            if self._pending + slots > self.capacity:
+                self._rejected += 1
+                raise AnalysisBusyError("Image analysis is at capacity, try again shortly")
+            self._pending += slots
+
+    def _release(self, slots: int) -> None:
+        with self._lock:
+            self._pending -= slots
+
+    async def _run(self, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        started = time.perf_counter()
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        try:
+            result, stages = await loop.run_in_executor(pool, _run_timed, fn, args, time.time())
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge image); start a fresh pool next time
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False)
+            raise
+        stages["total"] = time.perf_counter() - started
+        self._record(getattr(fn, "__name__", "task"), stages)
+        return result
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` in a worker; ``fn`` must be a picklable module-level function"""
+        self._reserve(1)
+        try:
+            return await self._run(fn, args)
+        finally:
+            self._release(1)
+
+    async def map(self, fn: Callable[[Any], Any], items: Sequence[Any]) -> List[Any]:
+        """Run ``fn`` over ``items`` in parallel workers, results in input order.
+
+        Slots for the whole batch are reserved up front, so a batch is either
+        accepted in full or rejected with ``AnalysisBusyError``.
+        """
+        if not items:
+            return []
+        self._reserve(len(items))
+        try:
+            return list(await asyncio.gather(*(self._run(fn, (item,)) for item in items)))
+        finally:
+            self._release(len(items))
+
+    def _record(self, task: str, stages: Dict[str, float]) -> None:
+        with self._lock:
+            for name, seconds in stages.items():
+                entry = self._stats.setdefault(f"{task}.{name}", {"count": 0, "total": 0.0, "max": 0.0})
+                entry["count"] += 1
+                entry["total"] += seconds
+                entry["max"] = max(entry["max"], seconds)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue state and per-stage timings (mean/max in milliseconds)"""
+        with self._lock:
+            stages = {
+                name: {
+                    "count": int(entry["count"]),
+                    "mean_ms": round(entry["total"] / entry["count"] * 1000, 2),
+                    "max_ms": round(entry["max"] * 1000, 2),
+                }
+                for name, entry in sorted(self._stats.items())
+            }
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "stages": stages,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# Global analysis executor instance
+analysis_executor = AnalysisExecutor(
+    workers=settings.ANALYSIS_WORKERS, max_queue=settings.ANALYSIS_MAX_QUEUE, initializer=warm_up_worker
+)
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.loaders import PRECOMPUTED_SET
+from app.models.profile import Profile
+from app.models.recommendation import Recommendation, RecommendationItem
+from app.models.user import User
+from app.services.catalog_index import catalog_index
+from app.services.collaborative import collaborative_model
+from app.services.ranking import top_k_indices
+from app.services.recommender import RecommendationService
+from app.services.similarity import ingredient_similarity
+
+PRECOMPUTED_TITLE = "precomputed"
+
+# Upper bound on the (users x products) score block held in memory at once
+MAX_SCORE_ELEMENTS = 16_000_000
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class BatchRecommender:
+    """Offline scoring of every user with a profile against the catalog index.
+
+    Users are processed in chunks: their profile vectors are stacked into a
+    matrix and the chunk is scored with one matrix product, then each row
+    goes through the same top-k selection as the online path. Results are
+    stored as ``precomputed`` recommendation sets that request handlers
+    serve while they are fresh.
+    """
+
+    def __init__(self, limit: int = 20, chunk_size: int = 256, max_age_hours: int = 24):
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.max_age = timedelta(hours=max_age_hours)
+        self.service = RecommendationService()
+
+    def run(self, db: Session) -> int:
+        """Precompute sets for all users with a profile; returns users written"""
+        index = catalog_index.ensure_fresh(db)
+        if len(index) == 0:
+            return 0
+        chunk_size = max(1, min(self.chunk_size, MAX_SCORE_ELEMENTS // len(index)))
+        ingredient_similarity.ensure_fresh(db)
+
+        users = (
+            db.query(User)
+            .join(Profile, Profile.user_id == User.id)
+            .options(joinedload(User.profile))
+            .order_by(User.id)
+        )
+        written = 0
+        last_id = 0
+        while True:
+            chunk = users.filter(User.id > last_id).limit(chunk_size).all()
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            self._drop_stale(db, [user.id for user in chunk])
+
+            encoded = [self.service._profile_vector(index, user) for user in chunk]
+            vectors = np.stack([vector for vector, _ in encoded])
+            biases = np.array([bias for _, bias in encoded], dtype=np.float32)
+            scores = np.minimum(vectors @ index.features.T + biases[:, None], 1.0)
+            user_ids = [user.id for user in chunk]
+            engaged = self.service._engaged_products(db, user_ids)
+            collaborative = collaborative_model.scores(index, user_ids, seeds=engaged)
+            if collaborative is not None:
+                weight = self.service.recommendation_weights["collaborative"]
+                scores = np.minimum(scores + weight * collaborative, 1.0)
+
+            for i, (user, (vector, _), user_scores) in enumerate(zip(chunk, encoded, scores)):
+                boost = self.service._similarity_boost(index, engaged[user.id])
+                if boost is not None:
+                    user_scores = np.minimum(user_scores + boost, 1.0)
+                rows = top_k_indices(user_scores, self.limit)
+                items = [
+                    (
+                        int(index.product_ids[row]),
+                        float(user_scores[row]),
+                        ", ".join(self.service._get_recommendation_reasons(
+                            index, int(row), vector,
+                            similar=boost is not None and boost[row] > 0,
+                            collaborative=collaborative is not None and collaborative[i, row] >= 0.5,
+                        )),
+                    )
+                    for row in rows
+                ]
+                self._store(db, user.id, items)
+                written += 1
+            db.commit()
+        return written
+
+    def _drop_stale(self, db: Session, user_ids: List[int]) -> None:
+        """Delete the previous unrated precomputed sets of a chunk of users.
+
+        Rated sets stay: their ratings feed popularity and collaborative training.
+        """
+        stale_ids = [
+            rid for (rid,) in db.query(Recommendation.id).filter(
+                Recommendation.user_id.in_(user_ids),
+                Recommendation.title == PRECOMPUTED_TITLE,
+                Recommendation.rating.is_(None),
+            )
+        ]
+        if stale_ids:
+            db.query(RecommendationItem).filter(
+                RecommendationItem.recommendation_id.in_(stale_ids)
+            ).delete(synchronize_session=False)
+            db.query(Recommendation).filter(Recommendation.id.in_(stale_ids)).delete(synchronize_session=False)
+
+    def _store(self, db: Session, user_id: int, items: List[tuple]) -> None:
+        rec = Recommendation(
+            user_id=user_id,
+            title=PRECOMPUTED_TITLE,
+            reason="auto-generated",
+            created_at=datetime.utcnow(),
+        )
+        rec.items = [
+            RecommendationItem(product_id=pid, score=score, reason=reason or None, rank=rank)
+            for rank, (pid, score, reason) in enumerate(items, start=1)
+        ]
+        db.add(rec)
+
+    def get_fresh(self, db: Session, user_id: int) -> Optional[Recommendation]:
+        """Latest precomputed set if it is within the max age and newer than the user's profile"""
+        rec = (
+            db.query(Recommendation)
+            .options(*PRECOMPUTED_SET)
+            .filter(Recommendation.user_id == user_id, Recommendation.title == PRECOMPUTED_TITLE)
+            .order_by(Recommendation.created_at.desc())
+            .first()
+        )
+        if rec is None or rec.created_at is None:
+            return None
+        created = _naive_utc(rec.created_at)
+        if created < datetime.utcnow() - self.max_age:
+            return None
+        changed = (
+            db.query(Profile.updated_at, User.updated_at)
+            .join(User, User.id == Profile.user_id)
+            .filter(Profile.user_id == user_id)
+            .first()
+        )
+        if changed is None:
+            return None
+        if any(ts is not None and _naive_utc(ts) > created for ts in changed):
+            return None
+        return rec
+
+    def serve(self, db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+        """Fresh precomputed set shaped like the online response, or None"""
+        rec = self.get_fresh(db, user_id)
+        if rec is None:
+            return None
+        items = sorted(rec.items, key=lambda item: item.rank or 0)
+        recommendations = [
+            self.service._shape(item.product, item.score, item.reason.split(", ") if item.reason else [])
+            for item in items
+            if item.product is not None
+        ]
+        return {"recommendations": recommendations, "saved_id": rec.id}
+
+
+def precompute_recommendations() -> None:
+    """Scheduler / CLI entry point: precompute recommendation sets for all users"""
+    db = SessionLocal()
+    try:
+        count = batch_recommender.run(db)
+        print(f"Precomputed recommendations for {count} users.")
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to precompute recommendations: {e}")
+    finally:
+        db.close()
+
+
+# Global batch recommender instance
+batch_recommender = BatchRecommender(
+    limit=settings.PRECOMPUTE_LIMIT,
+    chunk_size=settings.PRECOMPUTE_CHUNK_SIZE,
+    max_age_hours=settings.PRECOMPUTE_MAX_AGE_HOURS,
+)
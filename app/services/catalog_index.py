@@ -0,0 +1,193 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.brand import Brand
+from app.models.product import Product
+from app.services.ranking import top_k_indices
+
+
+def _as_list(value: Any) -> List[str]:
+    """Normalize a list-ish column (list, JSON string or CSV) to lowercase tokens"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+            value = parsed if isinstance(parsed, list) else [parsed]
+        except Exception:
+            value = value.strip("[]").split(",")
+    out = []
+    for v in value:
+        s = str(v).strip().strip("'\"").lower()
+        if s:
+            out.append(s)
+    return out
+
+
+class CatalogIndex:
+    """In-memory NumPy feature matrix over the product catalog.
+
+    Each product is one row of ``features`` with one-hot skin-type, concern,
+    category and brand blocks. A user profile is encoded into a weight vector
+    over the same columns, so scoring the whole catalog is a single
+    matrix-vector product.
+    """
+
+    def __init__(self, ttl_seconds: int = 300):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._stale = True
+        self._built_at = 0.0
+        self.version = 0
+        self._load([], {})
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def invalidate(self) -> None:
+        """Mark the index stale; it is rebuilt on next use"""
+        self._stale = True
+
+    def ensure_fresh(self, db: Session) -> "CatalogIndex":
+        """Rebuild from the database if stale or older than the TTL"""
+        expired = time.monotonic() - self._built_at > self.ttl_seconds
+        if self._stale or expired:
+            with self._lock:
+                expired = time.monotonic() - self._built_at > self.ttl_seconds
+                if self._stale or expired:
+                    self.rebuild(db)
+        return self
+
+    def rebuild(self, db: Session) -> None:
+        """Load product feature columns (no ORM objects) and rebuild the matrix"""
+        columns = [Product.id, Product.category, Product.brand_id, Product.price]
+        has_skin_types = hasattr(Product, "suitable_skin_types")
+        has_concerns = hasattr(Product, "targets_concerns")
+        if has_skin_types:
+            columns.append(Product.suitable_skin_types)
+        if has_concerns:
+            columns.append(Product.targets_concerns)
+
+        records = []
+        for row in db.query(*columns).all():
+            mapping = row._mapping
+            records.append({
+                "id": mapping["id"],
+                "category": mapping["category"],
+                "brand_id": mapping["brand_id"],
+                "price": mapping["price"],
+                "skin_types": _as_list(mapping["suitable_skin_types"]) if has_skin_types else [],
+                "concerns": _as_list(mapping["targets_concerns"]) if has_concerns else [],
+            })
+        brand_names = {bid: (name or "") for bid, name in db.query(Brand.id, Brand.name).all()}
+
+        self._load(records, brand_names)
+        self._stale = False
+        self._built_at = time.monotonic()
+        self.version += 1
+
+    def _load(self, records: List[Dict[str, Any]], brand_names: Dict[int, str]) -> None:
+        """Encode product records into the feature matrix"""
+        skin_types = sorted({t for r in records for t in r["skin_types"]})
+        concerns = sorted({c for r in records for c in r["concerns"]})
+        categories = sorted({r["category"] for r in records if r["category"] is not None})
+        brand_ids = sorted({r["brand_id"] for r in records if r["brand_id"] is not None})
+
+        self.skin_type_cols = {t: i for i, t in enumerate(skin_types)}
+        offset = len(skin_types)
+        self.concern_cols = {c: offset + i for i, c in enumerate(concerns)}
+        offset += len(concerns)
+        self.category_cols = {c: offset + i for i, c in enumerate(categories)}
+        offset += len(categories)
+        self.brand_cols = {b: offset + i for i, b in enumerate(brand_ids)}
+        offset += len(brand_ids)
+        self.n_features = offset
+
+        n = len(records)
+        features = np.zeros((n, self.n_features), dtype=np.float32)
+        for i, r in enumerate(records):
+            for t in r["skin_types"]:
+                features[i, self.skin_type_cols[t]] = 1.0
+            for c in r["concerns"]:
+                features[i, self.concern_cols[c]] = 1.0
+            if r["category"] in self.category_cols:
+                features[i, self.category_cols[r["category"]]] = 1.0
+            if r["brand_id"] in self.brand_cols:
+                features[i, self.brand_cols[r["brand_id"]]] = 1.0
+
+        self.features = features
+        self.product_ids = np.fromiter((r["id"] for r in records), dtype=np.int64, count=n)
+        self.prices = np.fromiter(
+            (r["price"] if r["price"] is not None else np.nan for r in records), dtype=np.float64, count=n
+        )
+        self.brand_names = {bid: name.lower() for bid, name in brand_names.items()}
+        self._row_of = {int(pid): i for i, pid in enumerate(self.product_ids)}
+
+    def __len__(self) -> int:
+        return int(self.product_ids.shape[0])
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def profile_vector(
+        self,
+        weights: Dict[str, float],
+        skin_type: Optional[str] = None,
+        concerns: Optional[Iterable[str]] = None,
+        preferred_brands: Optional[Iterable[str]] = None,
+    ) -> np.ndarray:
+        """Encode a user profile as a weight vector over the feature columns"""
+        vec = np.zeros(self.n_features, dtype=np.float32)
+        if skin_type:
+            col = self.skin_type_cols.get(str(skin_type).strip().lower())
+            if col is not None:
+                vec[col] = weights["skin_type"]
+        concerns = _as_list(concerns)
+        if concerns:
+            share = weights["concerns"] / len(concerns)
+            for c in concerns:
+                col = self.concern_cols.get(c)
+                if col is not None:
+                    vec[col] = share
+        prefs = _as_list(preferred_brands)
+        if prefs:
+            for bid, col in self.brand_cols.items():
+                name = self.brand_names.get(bid, "")
+                if any(p in name for p in prefs):
+                    vec[col] = weights["preferences"]
+        return vec
+
+    def score(self, vector: np.ndarray, bias: float = 0.0) -> np.ndarray:
+        """Score every product for one profile vector"""
+        return np.minimum(self.features @ vector + bias, 1.0)
+
+    def category_mask(self, category: Optional[str]) -> Optional[np.ndarray]:
+        """Boolean row mask for a category, or None when unfiltered"""
+        if not category:
+            return None
+        col = self.category_cols.get(category)
+        if col is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.features[:, col] > 0
+
+    def top_k(self, scores: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Row indices of the k best scores (descending) via partial partition"""
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        return top_k_indices(scores, k, candidates)
+
+    def row_of(self, product_id: int) -> Optional[int]:
+        return self._row_of.get(int(product_id))
+
+    def matched_terms(self, row: int, vector: np.ndarray, block: Dict[str, int]) -> List[str]:
+        """Terms from a one-hot block that are set on both the product and the profile"""
+        return [term for term, col in block.items() if self.features[row, col] > 0 and vector[col] > 0]
+
+
+# Global catalog index instance
+catalog_index = CatalogIndex(ttl_seconds=settings.CATALOG_INDEX_TTL_SECONDS)
@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.ml_models import als
+from app.models.clickout import Clickout
+from app.models.recommendation import Recommendation, RecommendationItem
+from app.services.catalog_index import CatalogIndex
+
+# Interaction strength per signal
+CLICKOUT_WEIGHT = 1.0
+POSITIVE_RATING = 4  # sets rated 4 or 5 count (rating - 3) for each of their products
+
+ARRAYS = ("user_ids", "item_ids", "user_factors", "item_factors")
+
+
+class CollaborativeModel:
+    """Implicit ALS factors trained offline and memory-mapped at serve time.
+
+    Factors live as ``.npy`` files under ``MODEL_PATH/collaborative`` and are
+    opened with ``mmap_mode="r"``, so every worker process shares the same
+    page cache instead of holding its own copy. Users missing from the model
+    are folded in from their recent engagement at request time.
+    """
+
+    def __init__(self, path: str, factors: int = 32, reg: float = 0.1, alpha: float = 40.0,
+                 check_seconds: int = 60):
+        self.path = path
+        self.factors = factors
+        self.reg = reg
+        self.alpha = alpha
+        self.check_seconds = check_seconds
+        self.version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._aligned: Optional[Tuple[int, str, np.ndarray]] = None
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def ensure_loaded(self) -> bool:
+        """Open (or re-open after retraining) the factor files; False if there is no model"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_seconds:
+            return self.version is not None
+        with self._lock:
+            self._checked_at = now
+            try:
+                with open(self._meta_path()) as fh:
+                    meta = json.load(fh)
+            except (OSError, ValueError):
+                return self.version is not None
+            if meta.get("version") != self.version:
+                self._open(meta)
+        return self.version is not None
+
+    def _open(self, meta: Dict) -> None:
+        directory = os.path.join(self.path, meta["version"])
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in ARRAYS
+        }
+        self.user_ids = np.asarray(arrays["user_ids"])
+        self.item_ids = np.asarray(arrays["item_ids"])
+        self.user_factors = arrays["user_factors"]
+        self.item_factors = arrays["item_factors"]
+        self.gram = np.asarray(self.item_factors, dtype=np.float64).T @ np.asarray(self.item_factors, dtype=np.float64)
+        self._aligned = None
+        self.version = meta["version"]
+
+    def reload(self) -> bool:
+        self._checked_at = float("-inf")
+        return self.ensure_loaded()
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def _item_matrix(self, index: CatalogIndex) -> np.ndarray:
+        """Item factors gathered in catalog-row order (zeros for products the model has not seen)"""
+        cached = self._aligned
+        if cached is not None and cached[0] == index.version and cached[1] == self.version:
+            return cached[2]
+        pos = np.searchsorted(self.item_ids, index.product_ids)
+        pos = np.minimum(pos, max(len(self.item_ids) - 1, 0))
+        known = (self.item_ids[pos] == index.product_ids) if len(self.item_ids) else np.zeros(len(index), bool)
+        aligned = np.zeros((len(index), self.item_factors.shape[1]), dtype=np.float32)
+        aligned[known] = self.item_factors[pos[known]]
+        self._aligned = (index.version, self.version, aligned)
+        return aligned
+
+    def _user_row(self, user_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.user_ids, user_id))
+        if pos < len(self.user_ids) and self.user_ids[pos] == user_id:
+            return pos
+        return None
+
+    def _fold_in(self, product_ids: Iterable[int]) -> Optional[np.ndarray]:
+        ids = np.unique(np.fromiter(product_ids, dtype=np.int64))
+        pos = np.minimum(np.searchsorted(self.item_ids, ids), max(len(self.item_ids) - 1, 0))
+        cols = pos[self.item_ids[pos] == ids] if len(self.item_ids) else pos[:0]
+        if cols.size == 0:
+            return None
+        return als.fold_in(self.item_factors, self.gram, cols, np.full(cols.size, CLICKOUT_WEIGHT),
+                           reg=self.reg, alpha=self.alpha)
+
+    def scores(self, index: CatalogIndex, user_ids: List[int],
+               seeds: Optional[Dict[int, List[int]]] = None) -> Optional[np.ndarray]:
+        """Predicted preference in [0, 1] per (user, catalog row); None when nothing is known"""
+        if len(index) == 0 or not self.ensure_loaded():
+            return None
+        vectors = np.zeros((len(user_ids), self.item_factors.shape[1]), dtype=np.float32)
+        found = False
+        for i, uid in enumerate(user_ids):
+            row = self._user_row(uid)
+            if row is not None:
+                vectors[i] = self.user_factors[row]
+                found = True
+            elif seeds and seeds.get(uid):
+                folded = self._fold_in(seeds[uid])
+                if folded is not None:
+                    vectors[i] = folded
+                    found = True
+        if not found:
+            return None
+        return np.clip(vectors @ self._item_matrix(index).T, 0.0, 1.0)
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+    def load_interactions(self, db: Session) -> Tuple[np.ndarray, np.ndarray, sparse.csr_matrix]:
+        """Aggregate clickouts and positively rated sets into a user x product matrix"""
+        weights: Dict[Tuple[int, int], float] = {}
+        clicks = (
+            db.query(Clickout.user_id, Clickout.product_id, func.count())
+            .filter(Clickout.user_id.isnot(None), Clickout.product_id.isnot(None))
+            .group_by(Clickout.user_id, Clickout.product_id)
+        )
+        for uid, pid, count in clicks:
+            weights[(uid, pid)] = weights.get((uid, pid), 0.0) + CLICKOUT_WEIGHT * count
+        rated = (
+            db.query(Recommendation.user_id, RecommendationItem.product_id, func.sum(Recommendation.rating - 3))
+            .join(RecommendationItem, RecommendationItem.recommendation_id == Recommendation.id)
+            .filter(Recommendation.rating >= POSITIVE_RATING)
+            .group_by(Recommendation.user_id, RecommendationItem.product_id)
+        )
+        for uid, pid, strength in rated:
+            weights[(uid, pid)] = weights.get((uid, pid), 0.0) + float(strength)
+
+        if not weights:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64), sparse.csr_matrix((0, 0))
+        pairs = np.array(list(weights.keys()), dtype=np.int64)
+        user_ids, user_rows = np.unique(pairs[:, 0], return_inverse=True)
+        item_ids, item_rows = np.unique(pairs[:, 1], return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.fromiter(weights.values(), dtype=np.float64), (user_rows, item_rows)),
+            shape=(len(user_ids), len(item_ids)),
+        )
+        return user_ids, item_ids, matrix
+
+    def _warm_start(self, ids: np.ndarray, previous_ids: np.ndarray, previous: np.ndarray,
+                    rng: np.random.Generator) -> np.ndarray:
+        init = rng.normal(0, 0.01, (len(ids), self.factors))
+        if previous.shape[1:] == (self.factors,) and len(previous_ids):
+            pos = np.minimum(np.searchsorted(previous_ids, ids), len(previous_ids) - 1)
+            known = previous_ids[pos] == ids
+            init[known] = previous[pos[known]]
+        return init
+
+    def train(self, db: Session, iterations: int = 15, warm_start: bool = True) -> Dict[str, int]:
+        """Fit factors on current interactions and publish them for serving"""
+        user_ids, item_ids, matrix = self.load_interactions(db)
+        if matrix.nnz == 0:
+            return {"users": 0, "items": 0, "interactions": 0}
+        user_init = item_init = None
+        if warm_start and self.ensure_loaded():
+            rng = np.random.default_rng(0)
+            user_init = self._warm_start(user_ids, self.user_ids, self.user_factors, rng)
+            item_init = self._warm_start(item_ids, self.item_ids, self.item_factors, rng)
+        users, items = als.train(matrix, factors=self.factors, reg=self.reg, alpha=self.alpha,
+                                 iterations=iterations, user_init=user_init, item_init=item_init)
+        self.save(user_ids, item_ids, users, items)
+        self.reload()
+        return {"users": len(user_ids), "items": len(item_ids), "interactions": int(matrix.nnz)}
+
+    def save(self, user_ids: np.ndarray, item_ids: np.ndarray, users: np.ndarray, items: np.ndarray) -> None:
+        """Write a new version directory, then point meta.json at it with an atomic rename.
+
+        Processes still mapping the previous version keep reading it; versions
+        older than that are removed.
+        """
+        version = str(time.time_ns())
+        directory = os.path.join(self.path, version)
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"user_ids": user_ids, "item_ids": item_ids, "user_factors": users, "item_factors": items}
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+        tmp = self._meta_path() + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"version": version, "factors": int(users.shape[1])}, fh)
+        os.replace(tmp, self._meta_path())
+
+        versions = sorted(name for name in os.listdir(self.path) if name.isdigit())
+        for old in versions[:-2]:
+            shutil.rmtree(os.path.join(self.path, old), ignore_errors=True)
+
+
+def train_collaborative() -> None:
+    """Scheduler entry point: warm-start retrain of the collaborative model"""
+    db = SessionLocal()
+    try:
+        warm = collaborative_model.ensure_loaded()
+        iterations = settings.COLLABORATIVE_WARM_ITERATIONS if warm else settings.COLLABORATIVE_ITERATIONS
+        stats = collaborative_model.train(db, iterations=iterations, warm_start=warm)
+        print(f"Trained collaborative model: {stats}")
+    except Exception as e:
+        print(f"Failed to train collaborative model: {e}")
+    finally:
+        db.close()
+
+
+# Global collaborative model instance
+collaborative_model = CollaborativeModel(
+    path=os.path.join(settings.MODEL_PATH, "collaborative"),
+    factors=settings.COLLABORATIVE_FACTORS,
+    reg=settings.COLLABORATIVE_REG,
+    alpha=settings.COLLABORATIVE_ALPHA,
+)
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+# name -> (width, height, crop); "limit" fits inside the box keeping the aspect
+# ratio and never upscales, "fill" scales and centre-crops to exactly the box.
+# These mirror the Cloudinary transformations used by the upload endpoints.
+PRESETS: Dict[str, Tuple[int, int, str]] = {
+    "thumb": (200, 200, "fill"),
+    "medium": (600, 600, "limit"),
+    "analysis": (800, 800, "fill"),
+    "large": (1000, 1000, "limit"),
+}
+
+# extension -> (Pillow format, save options)
+FORMATS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+def render(source: Path, destination: Path, preset: str, fmt: str) -> None:
+    """Write the ``preset`` variant of the image at ``source`` to ``destination`` as ``fmt``"""
+    width, height, crop = PRESETS[preset]
+    pil_format, options = FORMATS[fmt]
+    with Image.open(source) as img:
+        if img.format == "JPEG":
+            # Let libjpeg downscale during decode; the result is still at least the box size
+            img.draft("RGB", (width, height))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        if crop == "fill":
+            img = ImageOps.fit(img, (width, height), Image.LANCZOS)
+        else:
+            img.thumbnail((width, height), Image.LANCZOS)
+        partial = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.part")
+        try:
+            img.save(partial, pil_format, **options)
+        except BaseException:
+            # Dotfiles are invisible to the size accounting, so a leftover would never be evicted
+            partial.unlink(missing_ok=True)
+            raise
+    os.replace(partial, destination)
+
+
+class DerivativeCache:
+    """Disk cache of resized/re-encoded image variants.
+
+    A variant is keyed by the source object's content hash, the preset and
+    the format, and stored under the same two-level fan-out as the object
+    store. Since sources are immutable, a cached variant never goes stale;
+    the cache is only bounded by ``max_bytes``, evicting least recently
+    served files (by mtime, refreshed on every hit) down to ``low_water``
+    of the cap. Concurrent requests for a variant that is being generated
+    wait for that one render instead of starting their own.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 256 * 1024 * 1024, low_water: float = 0.9):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def path_for(self, key: str, preset: str, fmt: str) -> Path:
+        return self.root / key[:2] / key[2:4] / f"{key}-{preset}.{fmt}"
+
+    async def get(self, source: Path, key: str, preset: str, fmt: str) -> Path:
+        """Path of the variant, rendering it from ``source`` first if it is not cached"""
+        path = self.path_for(key, preset, fmt)
+        try:
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return path
+        except FileNotFoundError:
+            pass
+
+        loop = asyncio.get_running_loop()
+        pending = self._inflight.get(path.name)
+        if pending is not None and pending.get_loop() is loop:
+            with self._lock:
+                self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            # The leader was cancelled, not us: look again and render it ourselves if need be
+            return await self.get(source, key, preset, fmt)
+
+        future = loop.create_future()
+        self._inflight[path.name] = future
+        try:
+            await asyncio.to_thread(self._render, source, path, preset, fmt)
+            future.set_result(path)
+        except asyncio.CancelledError:
+            # The leader's request went away; wake the waiters so one of them takes over
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark retrieved so a render nobody else waited on does not log "never retrieved"
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(path.name) is future:
+                del self._inflight[path.name]
+        return path
+
+    def _render(self, source: Path, path: Path, preset: str, fmt: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        render(source, path, preset, fmt)
+        size = path.stat().st_size
+        with self._lock:
+            self.misses += 1
+            if self._bytes is None:
+                self._bytes = self._scan_size()
+            else:
+                self._bytes += size
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _files(self):
+        return (p for p in self.root.glob("*/*/*") if p.is_file() and not p.name.startswith("."))
+
+    def _scan_size(self) -> int:
+        return sum(p.stat().st_size for p in self._files())
+
+    def _evict(self) -> None:
+        """Delete least recently served variants until the cache is under the low-water mark"""
+        entries = []
+        for p in self._files():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * self.low_water)
+        evicted = 0
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._bytes = total
+            self.evictions += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Global derivative cache instance
+derivative_cache = DerivativeCache(settings.DERIVATIVE_CACHE_DIR, max_bytes=settings.DERIVATIVE_CACHE_MAX_BYTES)
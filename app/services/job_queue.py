@@ -0,0 +1,214 @@
+import json
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.models.job import Job
+
+# handler(db, payload) -> JSON-serialisable result or None
+Handler = Callable[[Session, Dict[str, Any]], Optional[Dict[str, Any]]]
+
+MAX_BACKOFF_SECONDS = 3600
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a failure that retrying cannot fix; the job fails at once"""
+
+
+class JobQueue:
+    """Durable in-process job queue on the ``jobs`` table.
+
+    ``enqueue`` writes rows in the caller's transaction, so a job exists
+    exactly when the request that created it committed. Worker threads
+    claim the oldest due job by flipping it to ``running`` with a
+    conditional UPDATE (plus ``FOR UPDATE SKIP LOCKED`` where the database
+    supports it), so each job has one owner even with several app
+    processes polling the same table. A claim holds the job for
+    ``visibility_timeout`` seconds; if the worker dies, the job becomes
+    claimable again once that passes. A failed attempt is retried after
+    ``backoff * 2 ** (attempt - 1)`` seconds (with jitter) until
+    ``max_attempts`` is spent, unless the handler raised ``PermanentJobError``.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, workers: int = 2,
+                 poll_interval: float = 1.0, visibility_timeout: float = 300.0, max_attempts: int = 5,
+                 backoff: float = 5.0):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._handlers: Dict[str, Handler] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def handler(self, kind: str) -> Callable[[Handler], Handler]:
+        """Decorator registering the function that runs jobs of ``kind``"""
+        def register(fn: Handler) -> Handler:
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    def enqueue(self, db: Session, jobs: List[Tuple[str, Dict[str, Any]]], user_id: Optional[int] = None,
+                max_attempts: Optional[int] = None) -> List[Job]:
+        """Add ``(kind, payload)`` jobs in one commit and wake the workers"""
+        now = datetime.utcnow()
+        rows = [
+            Job(kind=kind, payload=json.dumps(payload), status="queued", attempts=0,
+                max_attempts=max_attempts or self.max_attempts, run_at=now, user_id=user_id)
+            for kind, payload in jobs
+        ]
+        db.add_all(rows)
+        db.commit()
+        self._wake.set()
+        return rows
+
+    def _due(self, now: datetime):
+        return or_(
+            and_(Job.status == "queued", Job.run_at <= now),
+            and_(Job.status == "running", Job.locked_until < now),
+        )
+
+    def claim(self, db: Session, worker: str) -> Optional[Job]:
+        """Take ownership of the oldest due job, or return None if there is none"""
+        while True:
+            now = datetime.utcnow()
+            self._expire_exhausted(db, now)
+            job_id = (
+                db.query(Job.id).filter(self._due(now)).order_by(Job.run_at, Job.id).limit(1)
+                .with_for_update(skip_locked=True).scalar()
+            )
+            if job_id is None:
+                db.commit()
+                return None
+            claimed = db.execute(
+                update(Job)
+                .where(Job.id == job_id, self._due(now))
+                .values(status="running", attempts=Job.attempts + 1, locked_by=worker,
+                        locked_until=now + timedelta(seconds=self.visibility_timeout))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if claimed:
+                return db.get(Job, job_id)
+            # Another worker won the race for this job; look again
+
+    def _expire_exhausted(self, db: Session, now: datetime) -> None:
+        """Fail jobs whose worker died on their last allowed attempt"""
+        db.execute(
+            update(Job)
+            .where(Job.status == "running", Job.locked_until < now, Job.attempts >= Job.max_attempts)
+            .values(status="failed", error="Worker did not finish within the visibility timeout",
+                    locked_until=None, finished_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    def complete(self, db: Session, job: Job, worker: str, result: Optional[Dict[str, Any]]) -> bool:
+        """Record success; False if the claim had expired and the job moved on"""
+        now = datetime.utcnow()
+        done = db.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == "running", Job.locked_by == worker)
+            .values(status="succeeded", result=json.dumps(result, default=str), error=None,
+                    locked_until=None, finished_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return bool(done)
+
+    def fail(self, db: Session, job: Job, worker: str, error: str, retry: bool = True) -> bool:
+        """Schedule a retry with exponential backoff, or fail the job for good"""
+        now = datetime.utcnow()
+        if not retry or job.attempts >= job.max_attempts:
+            values = dict(status="failed", finished_at=now)
+        else:
+            delay = min(self.backoff * 2 ** (job.attempts - 1), MAX_BACKOFF_SECONDS)
+            values = dict(status="queued", run_at=now + timedelta(seconds=delay * random.uniform(1.0, 1.25)))
+        done = db.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == "running", Job.locked_by == worker)
+            .values(error=error, locked_until=None, **values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return bool(done)
+
+    def run_once(self, worker: str = "inline") -> bool:
+        """Claim and run one due job; False when nothing was due"""
+        db = self.session_factory()
+        try:
+            job = self.claim(db, worker)
+            if job is None:
+                return False
+            handler = self._handlers.get(job.kind)
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler registered for job kind {job.kind!r}")
+                result = handler(db, json.loads(job.payload))
+            except Exception as exc:
+                db.rollback()
+                self.fail(db, job, worker, f"{type(exc).__name__}: {exc}", retry=not isinstance(exc, PermanentJobError))
+            else:
+                self.complete(db, job, worker, result)
+            return True
+        finally:
+            db.close()
+
+    def run_pending(self, worker: str = "inline") -> int:
+        """Run due jobs in the calling thread until none are left; returns how many ran"""
+        ran = 0
+        while self.run_once(worker):
+            ran += 1
+        return ran
+
+    def _work(self, worker: str) -> None:
+        failing = False
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once(worker)
+                failing = False
+            except Exception:
+                if not failing:
+                    print(f"Job worker {worker} error:\n{traceback.format_exc()}")
+                failing, ran = True, False
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start(self) -> None:
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(f"{prefix}:{i}",), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+# Global job queue instance
+job_queue = JobQueue(
+    workers=settings.JOB_WORKERS,
+    poll_interval=settings.JOB_POLL_SECONDS,
+    visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    backoff=settings.JOB_BACKOFF_SECONDS,
+)
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+def _bucket(n: int) -> str:
+    """Power-of-two histogram bucket label for ``n`` (1, 2, 3-4, 5-8, ...)"""
+    if n <= 2:
+        return str(n)
+    upper = 1 << (n - 1).bit_length()
+    return f"{upper // 2 + 1}-{upper}"
+
+
+def _sorted_histogram(counts: Counter) -> Dict[str, int]:
+    return {label: counts[label] for label in sorted(counts, key=lambda label: int(label.split("-")[0]))}
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item calls into batched calls.
+
+    ``submit(item)`` queues the item and waits. The queue is flushed into one
+    ``handler(items)`` call as soon as it holds ``max_batch`` items, or
+    ``max_wait_ms`` after the first item arrived, whichever comes first; the
+    handler returns one result per item and each waiter gets its own. A slot
+    holding an exception instance fails only that waiter; the handler raising,
+    or returning the wrong number of results, fails the whole batch.
+
+    Everything runs on the event loop, so no locking is needed around the
+    queue. State is rebound if the batcher is used from a new loop.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch: int = 8, max_wait_ms: float = 10.0):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._queue_depths: Counter = Counter()
+        self._batches = 0
+        self._items = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._pending, self._timer = loop, [], None
+        future = loop.create_future()
+        self._pending.append((item, future))
+        with self._stats_lock:
+            self._queue_depths[_bucket(len(self._pending))] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._timer = self._loop.call_later(self.max_wait, self._flush)
+        if batch:
+            self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        with self._stats_lock:
+            self._batch_sizes[_bucket(len(batch))] += 1
+            self._batches += 1
+            self._items += len(batch)
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} items")
+        except BaseException as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc if isinstance(exc, Exception) else RuntimeError("Batch was cancelled"))
+            if not isinstance(exc, Exception):
+                raise
+            return
+        for (_, future), result in zip(batch, results):
+            # A waiter may have been cancelled (client went away) while the batch ran
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_size_histogram": _sorted_histogram(self._batch_sizes),
+                "queue_depth_histogram": _sorted_histogram(self._queue_depths),
+            }
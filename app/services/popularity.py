@@ -0,0 +1,237 @@
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import distinct
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.models.clickout import Clickout
+from app.models.popularity import ProductPopularity
+from app.models.product import Product
+from app.models.recommendation import Recommendation, RecommendationItem
+
+# Signal weights
+CLICKOUT_WEIGHT = 1.0
+RATING_WEIGHT = 2.0  # per rating point away from neutral (3), split across the set
+
+# Forward decay. Every event is stored as w * exp(lambda * (t - landmark));
+# dividing by exp(lambda * (now - landmark)) gives the decayed value, so ranking
+# by the stored score never needs rewriting old rows. The landmark moves
+# forward in steps of REBASE_HALF_LIVES half-lives from LANDMARK, keeping the
+# multiplier below 2 ** REBASE_HALF_LIVES however long the app runs; ``rebase``
+# rescales rows still relative to an older landmark.
+LANDMARK = datetime(2025, 1, 1, tzinfo=timezone.utc)
+REBASE_HALF_LIVES = 64
+
+
+def _as_utc(ts: Optional[datetime]) -> datetime:
+    if ts is None:
+        return datetime.now(timezone.utc)
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+class PopularityTracker:
+    """In-process engagement counter flushed periodically into ``product_popularity``.
+
+    Request handlers only touch a dict under a lock; the scheduler calls
+    ``flush`` to apply the accumulated deltas with one read and one write
+    per batch. Pending deltas are relative to ``self.landmark``; stored rows
+    carry the landmark their score is relative to, and ``flush`` converts
+    between the two, so processes may advance their landmark independently.
+    """
+
+    def __init__(self, half_life_days: float = 7.0, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self.decay_rate = math.log(2) / (half_life_days * 86400.0)
+        self.rebase_step = timedelta(seconds=max(1, round(REBASE_HALF_LIVES * half_life_days * 86400.0)))
+        self.landmark = self.landmark_for(datetime.now(timezone.utc))
+        self._lock = threading.Lock()
+        self._pending: Dict[int, List[float]] = defaultdict(lambda: [0.0, 0, 0])
+
+    def landmark_for(self, at: Optional[datetime] = None) -> datetime:
+        """Latest rebase point not after ``at``"""
+        steps = max(0, (_as_utc(at) - LANDMARK) // self.rebase_step)
+        return LANDMARK + steps * self.rebase_step
+
+    def _shift(self, old: datetime, new: datetime) -> float:
+        """Factor converting a score relative to ``old`` into one relative to ``new``"""
+        return math.exp(-self.decay_rate * (_as_utc(new) - _as_utc(old)).total_seconds())
+
+    def _advance(self, at: Optional[datetime] = None) -> None:
+        """Move the landmark forward to ``at``'s rebase point, rescaling pending deltas"""
+        landmark = self.landmark_for(at)
+        with self._lock:
+            if landmark <= self.landmark:
+                return
+            factor = self._shift(self.landmark, landmark)
+            for entry in self._pending.values():
+                entry[0] *= factor
+            self.landmark = landmark
+
+    def weight(self, amount: float, at: Optional[datetime] = None) -> float:
+        """Forward-decayed weight of an event of size ``amount`` at time ``at``"""
+        age = (_as_utc(at) - self.landmark).total_seconds()
+        return amount * math.exp(self.decay_rate * age)
+
+    def decayed(self, score: float, now: Optional[datetime] = None) -> float:
+        """Current value of a score relative to the current landmark"""
+        return score * self._shift(self.landmark, _as_utc(now))
+
+    def record_clickout(self, product_id: Optional[int], at: Optional[datetime] = None) -> None:
+        if product_id is None:
+            return
+        self._advance(at)
+        with self._lock:
+            entry = self._pending[product_id]
+            entry[0] += self.weight(CLICKOUT_WEIGHT, at)
+            entry[1] += 1
+
+    def record_rating(self, product_ids: Iterable[int], rating_delta: float, new_rating: bool = True,
+                      at: Optional[datetime] = None) -> None:
+        """Spread a recommendation rating change over the products in the set"""
+        ids = [pid for pid in product_ids if pid is not None]
+        if not ids or not rating_delta:
+            return
+        self._advance(at)
+        with self._lock:
+            w = self.weight(RATING_WEIGHT * rating_delta / len(ids), at)
+            for pid in ids:
+                entry = self._pending[pid]
+                entry[0] += w
+                entry[2] += 1 if new_rating else 0
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, db: Session) -> int:
+        """Apply pending deltas to the rollup table; returns products touched.
+
+        Scores are clamped at zero: negative ratings can take a product's
+        popularity away but not rank it below products nobody engaged with.
+        """
+        self._advance()
+        with self._lock:
+            batch, self._pending = self._pending, defaultdict(lambda: [0.0, 0, 0])
+            landmark = self.landmark
+        if not batch:
+            return 0
+        try:
+            # Drop deltas for products deleted since the event was recorded
+            live = {pid for (pid,) in db.query(Product.id).filter(Product.id.in_(batch.keys()))}
+            batch = {pid: delta for pid, delta in batch.items() if pid in live}
+            rows = {
+                row.product_id: row
+                for row in db.query(ProductPopularity).filter(ProductPopularity.product_id.in_(batch.keys()))
+            }
+            for pid, (score, clickouts, ratings) in batch.items():
+                row = rows.get(pid)
+                if row is None:
+                    db.add(ProductPopularity(product_id=pid, score=max(score, 0.0), landmark=landmark,
+                                             clickouts=clickouts, ratings=ratings))
+                else:
+                    # Another process may already have moved the row to a later landmark
+                    target = max(_as_utc(row.landmark), landmark)
+                    row.score = max(row.score * self._shift(row.landmark, target) + score * self._shift(landmark, target), 0.0)
+                    row.landmark = target
+                    row.clickouts += clickouts
+                    row.ratings += ratings
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the batch back so the next flush retries it
+            with self._lock:
+                factor = self._shift(landmark, self.landmark)
+                for pid, (score, clickouts, ratings) in batch.items():
+                    entry = self._pending[pid]
+                    entry[0] += score * factor
+                    entry[1] += clickouts
+                    entry[2] += ratings
+            raise
+        return len(batch)
+
+    def rebase(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Rescale rows relative to an older landmark onto the current one; returns rows moved"""
+        self._advance(now)
+        landmark = self.landmark
+        stale = [
+            old for (old,) in
+            db.query(distinct(ProductPopularity.landmark)).filter(ProductPopularity.landmark < landmark)
+        ]
+        moved = 0
+        for old in stale:
+            moved += (
+                db.query(ProductPopularity)
+                .filter(ProductPopularity.landmark == old)
+                .update({
+                    ProductPopularity.score: ProductPopularity.score * self._shift(old, landmark),
+                    ProductPopularity.landmark: landmark,
+                }, synchronize_session=False)
+            )
+        db.commit()
+        return moved
+
+    def rebuild(self, db: Session) -> int:
+        """Recompute the rollup from raw clickouts and ratings"""
+        self._advance()
+        landmark = self.landmark
+        totals: Dict[int, List[float]] = defaultdict(lambda: [0.0, 0, 0])
+        clicks = db.query(Clickout.product_id, Clickout.created_at).filter(Clickout.product_id.isnot(None))
+        for pid, created_at in clicks.yield_per(1000):
+            entry = totals[pid]
+            entry[0] += self.weight(CLICKOUT_WEIGHT, created_at)
+            entry[1] += 1
+
+        rated = (
+            db.query(Recommendation.id, Recommendation.rating, Recommendation.updated_at,
+                     Recommendation.created_at, RecommendationItem.product_id)
+            .join(RecommendationItem, RecommendationItem.recommendation_id == Recommendation.id)
+            .filter(Recommendation.rating.isnot(None))
+        )
+        sets: Dict[int, List] = {}
+        for rec_id, rating, updated_at, created_at, pid in rated.yield_per(1000):
+            sets.setdefault(rec_id, [rating, updated_at or created_at, []])[2].append(pid)
+        for rating, at, pids in sets.values():
+            w = self.weight(RATING_WEIGHT * (rating - 3) / len(pids), at)
+            for pid in pids:
+                entry = totals[pid]
+                entry[0] += w
+                entry[2] += 1
+
+        db.query(ProductPopularity).delete(synchronize_session=False)
+        db.add_all(
+            ProductPopularity(product_id=pid, score=max(score, 0.0), landmark=landmark,
+                              clickouts=clickouts, ratings=ratings)
+            for pid, (score, clickouts, ratings) in totals.items()
+        )
+        db.commit()
+        return len(totals)
+
+
+def flush_popularity(rebase: bool = True) -> None:
+    """Scheduler entry point: flush pending engagement counters.
+
+    With ``rebase=False`` (shutdown) nothing touches the database unless
+    there are counters to save.
+    """
+    if not rebase and popularity_tracker.pending() == 0:
+        return
+    db = popularity_tracker.session_factory()
+    try:
+        popularity_tracker.flush(db)
+        if rebase:
+            popularity_tracker.rebase(db)
+    except Exception as e:
+        print(f"Failed to flush popularity counters: {e}")
+    finally:
+        db.close()
+
+
+# Global popularity tracker instance
+popularity_tracker = PopularityTracker(half_life_days=settings.POPULARITY_HALF_LIFE_DAYS)
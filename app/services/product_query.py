@@ -0,0 +1,48 @@
+from typing import Iterable, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Query, Session, contains_eager, selectinload
+
+from app.models.brand import Brand
+from app.models.product import Product
+
+
+def filtered_products(
+    db: Session,
+    *,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    brand_names: Optional[Iterable[str]] = None,
+    limit: Optional[int] = None,
+) -> Query:
+    """Compile recommendation filters into a single product query.
+
+    Products are inner-joined to ``brands`` so the brand filter runs in SQL
+    and ``product.brand`` is populated from the same row (no lazy load).
+    Brand names match case-insensitively as substrings, like the old
+    Python-side check. Images are fetched with one ``selectin`` query.
+    Rows are ordered by id so LIMIT is deterministic.
+    """
+    q = (
+        db.query(Product)
+        .join(Brand, Product.brand_id == Brand.id)
+        .options(contains_eager(Product.brand), selectinload(Product.images))
+    )
+    if category:
+        q = q.filter(Product.category == category)
+    if min_price is not None:
+        q = q.filter(Product.price >= min_price)
+    if max_price is not None:
+        q = q.filter(Product.price <= max_price)
+    names = [n.strip().lower() for n in (brand_names or []) if n and n.strip()]
+    if names:
+        q = q.filter(or_(*[Brand.name.ilike(f"%{_escape_like(n)}%", escape="\\") for n in names]))
+    q = q.order_by(Product.id)
+    if limit is not None:
+        q = q.limit(limit)
+    return q
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
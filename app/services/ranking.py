@@ -0,0 +1,24 @@
+from typing import Optional
+
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, k: int, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+    """Indices of the k best entries of a score array, best first.
+
+    Uses a partial partition (O(n)) to find the k-th score and only sorts
+    the k winners. Ties are broken by position, so results are stable with
+    respect to input order.
+    """
+    if candidates is not None:
+        scores = scores[candidates]
+    k = min(int(k), scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    kth = -np.partition(-scores, k - 1)[k - 1]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[: k - above.size]
+    part = np.concatenate((above, ties))
+    rows = part[np.lexsort((part, -scores[part]))]
+    return candidates[rows] if candidates is not None else rows
+
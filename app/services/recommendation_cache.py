@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+
+
+def _normalize(value: Any) -> Any:
+    """Canonical form of a filter value so equivalent requests share a key"""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items()) if v is not None and v != []}
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        if all(isinstance(v, str) for v in items):
+            items = sorted({v.strip().lower() for v in items if v.strip()})
+        return items
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+class RecommendationCache:
+    """TTL + LRU cache of recommendation responses keyed by user, endpoint and filters.
+
+    Keys embed a per-user profile version and a global catalog version, so
+    invalidation is O(1): bumping a version makes every older key unreachable.
+    Unreachable entries for a user are dropped eagerly; the rest age out
+    through LRU eviction.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._user_versions: Dict[int, int] = {}
+        self._catalog_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, user_id: int, endpoint: str, filters: Optional[Dict[str, Any]] = None) -> Tuple:
+        normalized = json.dumps(_normalize(filters or {}), sort_keys=True, default=str)
+        with self._lock:
+            return (
+                user_id,
+                endpoint,
+                normalized,
+                self._user_versions.get(user_id, 0),
+                self._catalog_version,
+            )
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            # Drop writes computed against a profile/catalog version that has since changed
+            if key[3] != self._user_versions.get(key[0], 0) or key[4] != self._catalog_version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forget cached results after a profile or preference change"""
+        with self._lock:
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+    def invalidate_all(self) -> None:
+        """Forget every cached result after a catalog change"""
+        with self._lock:
+            self._catalog_version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Global recommendation cache instance
+recommendation_cache = RecommendationCache(
+    ttl_seconds=settings.RECOMMENDATION_CACHE_TTL_SECONDS,
+    max_entries=settings.RECOMMENDATION_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,36 @@
+"""
+Deferred recommendation writes, run by the job queue.
+
+With ``RECOMMENDATION_DEFER_WRITES`` the request commits the set header
+together with a ``save_recommendation_items`` job and returns; the job
+inserts the items and marks itself done in one transaction, so a failed
+write is retried instead of leaving the set empty. A set rated before its
+items landed has that rating spread over them here.
+"""
+
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.models.recommendation import Recommendation, RecommendationItem
+from app.services.job_queue import job_queue
+from app.services.popularity import popularity_tracker
+
+
+@job_queue.handler("save_recommendation_items")
+def save_recommendation_items(db: Session, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    rows = payload["rows"]
+    if not rows:
+        return {"items": 0}
+    rec_id = rows[0]["recommendation_id"]
+    rec = db.query(Recommendation).filter(Recommendation.id == rec_id).first()
+    if rec is None:
+        # The set was deleted before its items were written
+        return {"recommendation_id": rec_id, "items": 0}
+    if db.query(RecommendationItem.id).filter(RecommendationItem.recommendation_id == rec_id).first() is None:
+        # Committed by the queue together with the job's completion
+        crud.recommendations.insert_items(db, rows)
+        if rec.rating is not None:
+            popularity_tracker.record_rating([row["product_id"] for row in rows], rec.rating - 3)
+    return {"recommendation_id": rec_id, "items": len(rows)}
@@ -1,8 +1,19 @@
 from typing import List, Dict, Any, Optional
+import numpy as np
 from sqlalchemy.orm import Session
 from app.models.user import User
 from app.models.product import Product
 from app.models.brand import Brand
+from app.models.clickout import Clickout
+from app.models.popularity import ProductPopularity
+from app.models.recommendation import Recommendation, RecommendationItem
+from app.core.loaders import PRODUCT_CARD
+from app.services.catalog_index import CatalogIndex, catalog_index
+from app.services.collaborative import collaborative_model
+from app.services.product_query import filtered_products
+from app.services.similarity import ingredient_similarity
+
+DEFAULT_LIMIT = 20
 
 class RecommendationService:
     def __init__(self):
@@ -10,7 +21,9 @@ class RecommendationService:
             "skin_type": 0.4,
             "skin_tone": 0.3,
             "concerns": 0.2,
-            "preferences": 0.1
+            "preferences": 0.1,
+            "similarity": 0.2,
+            "collaborative": 0.3
         }
 
     def _parse_budget(self, budget_range: Optional[str]) -> Optional[float]:
@@ -29,85 +42,101 @@ class RecommendationService:
         except Exception:
             return None
 
-    def _filter_and_shape(self, products: List[Product], preferred_brands: Optional[List[str]] = None, max_price: Optional[float] = None) -> List[Dict[str, Any]]:
+    def _shape(self, p: Product, score: float, reasons: List[str]) -> Dict[str, Any]:
+        return {
+            "id": p.id,
+            "name": p.name,
+            "brand": p.brand.name if p.brand else None,
+            "category": p.category,
+            "price": p.price,
+            "score": score,
+            "reasons": reasons,
+            "image_url": p.images[0].image_url if getattr(p, "images", None) else None,
+        }
+
+    def _filter_and_shape(
+        self,
+        db: Session,
+        *,
+        category: Optional[str] = None,
+        preferred_brands: Optional[List[str]] = None,
+        max_price: Optional[float] = None,
+        min_price: Optional[float] = None,
+        limit: int = DEFAULT_LIMIT,
+    ) -> List[Dict[str, Any]]:
+        """Fetch only the products that can appear in the response and shape them"""
         pb = [b.lower() for b in (preferred_brands or [])]
-        out: List[Dict[str, Any]] = []
-        for p in products:
-            if max_price is not None and p.price is not None and p.price > max_price:
-                continue
-            if pb:
-                brand_name = p.brand.name.lower() if p.brand and p.brand.name else ""
-                if not any(b in brand_name for b in pb):
-                    continue
-            out.append({
-                "id": p.id,
-                "name": p.name,
-                "brand": p.brand.name if p.brand else None,
-                "category": p.category,
-                "price": p.price,
-                "score": 0.6,  # simple static score for now
-                "reasons": ["Matches your preferences"] if pb or max_price else ["Popular choice"],
-                "image_url": p.images[0].image_url if getattr(p, "images", None) else None,
-            })
+        products = filtered_products(
+            db,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            brand_names=pb,
+            limit=limit,
+        ).all()
+        reasons = ["Matches your preferences"] if pb or max_price else ["Popular choice"]
+        out = [self._shape(p, 0.6, reasons) for p in products]  # simple static score for now
         # fallback: if nothing matched, return first few products
         if not out:
-            for p in products[:10]:
-                out.append({
-                    "id": p.id,
-                    "name": p.name,
-                    "brand": p.brand.name if p.brand else None,
-                    "category": p.category,
-                    "price": p.price,
-                    "score": 0.5,
-                    "reasons": ["Popular choice"],
-                    "image_url": p.images[0].image_url if getattr(p, "images", None) else None,
-                })
+            fallback = filtered_products(db, category=category, limit=min(limit, 10)).all()
+            out = [self._shape(p, 0.5, ["Popular choice"]) for p in fallback]
         return out
 
     def get_trending_products_for_user(self, user_id: int, db: Session, limit: int = 10) -> List[Dict[str, Any]]:
         """Simple synchronous helper used by some endpoints.
-        Returns a basic list of products as "trending" for the user.
+        Returns the most engaged-with products (time-decayed clickouts and
+        ratings) as "trending" for the user.
         """
-        products = db.query(Product).limit(limit).all()
-        results: List[Dict[str, Any]] = []
-        for product in products:
-            results.append({
-                "id": product.id,
-                "name": product.name,
-                "brand": product.brand.name if product.brand else None,
-                "category": product.category,
-                "price": product.price,
-                "score": 0.5,
-                "reasons": ["Popular choice"],
-                "image_url": product.images[0].image_url if getattr(product, "images", None) else None,
-            })
+        return self._popular(db, None, limit, ["Trending now"])
+
+    def _popular(self, db: Session, category: Optional[str], limit: int, reasons: List[str]) -> List[Dict[str, Any]]:
+        """Top products by the popularity rollup, padded with catalog order"""
+        query = (
+            db.query(Product)
+            .options(*PRODUCT_CARD)
+            .join(ProductPopularity, ProductPopularity.product_id == Product.id)
+            .filter(ProductPopularity.score > 0)
+        )
+        if category:
+            query = query.filter(Product.category == category)
+        products = query.order_by(ProductPopularity.score.desc()).limit(limit).all()
+        results = [self._shape(product, 0.5, reasons) for product in products]
+
+        if len(results) < limit:
+            # Not enough engagement data yet: fill up with other products
+            seen = [p.id for p in products]
+            filler = db.query(Product).options(*PRODUCT_CARD)
+            if category:
+                filler = filler.filter(Product.category == category)
+            if seen:
+                filler = filler.filter(Product.id.notin_(seen))
+            for product in filler.order_by(Product.id).limit(limit - len(results)).all():
+                results.append(self._shape(product, 0.5, ["Popular choice"]))
         return results
 
-    def recommend_skincare_routine(self, *, user_id: int, preferred_brands: Optional[List[str]] = None, budget_range: Optional[str] = None, db: Session) -> List[Dict[str, Any]]:
+    def recommend_skincare_routine(self, *, user_id: int, preferred_brands: Optional[List[str]] = None, budget_range: Optional[str] = None, db: Session, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
         max_price = self._parse_budget(budget_range)
-        products = db.query(Product).filter(Product.category == "skincare").all()
-        return self._filter_and_shape(products, preferred_brands, max_price)
+        return self._filter_and_shape(db, category="skincare", preferred_brands=preferred_brands, max_price=max_price, limit=limit)
 
-    def recommend_makeup_products(self, *, user_id: int, skin_tone: Optional[str] = None, occasion: Optional[str] = None, style: Optional[str] = None, budget_range: Optional[str] = None, db: Session) -> List[Dict[str, Any]]:
+    def recommend_makeup_products(self, *, user_id: int, skin_tone: Optional[str] = None, occasion: Optional[str] = None, style: Optional[str] = None, budget_range: Optional[str] = None, db: Session, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
         max_price = self._parse_budget(budget_range)
-        products = db.query(Product).filter(Product.category == "makeup").all()
         # For now ignore skin_tone/occasion/style; could be used to score later
-        return self._filter_and_shape(products, None, max_price)
+        return self._filter_and_shape(db, category="makeup", max_price=max_price, limit=limit)
 
-    def get_personalized_recommendations(self, *, user_id: int, filters: Optional[Dict[str, Any]], db: Session) -> List[Dict[str, Any]]:
+    def get_personalized_recommendations(self, *, user_id: int, filters: Optional[Dict[str, Any]], db: Session, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
         category = (filters or {}).get("category") if isinstance(filters, dict) else None
         min_price = (filters or {}).get("min_price") if isinstance(filters, dict) else None
         max_price = (filters or {}).get("max_price") if isinstance(filters, dict) else None
         brands = (filters or {}).get("brands") if isinstance(filters, dict) else None
 
-        q = db.query(Product)
-        if category:
-            q = q.filter(Product.category == category)
-        products = q.all()
-        shaped = self._filter_and_shape(products, brands, max_price)
-        if min_price is not None:
-            shaped = [p for p in shaped if p.get("price") is None or p.get("price") >= float(min_price)]
-        return shaped
+        return self._filter_and_shape(
+            db,
+            category=category,
+            preferred_brands=brands,
+            max_price=float(max_price) if max_price is not None else None,
+            min_price=float(min_price) if min_price is not None else None,
+            limit=limit,
+        )
 
     async def get_product_recommendations(
         self, 
@@ -123,110 +152,143 @@ class RecommendationService:
         if not user or not user.profile:
             return await self._get_popular_products(db, category, limit)
         
-        # Get user preferences from profile
-        user_profile = user.profile
-        
-        # Get all products
-        query = db.query(Product)
-        if category:
-            query = query.filter(Product.category == category)
-        
-        products = query.all()
-        
-        # Score products based on user profile
-        scored_products = []
-        for product in products:
-            score = self._calculate_product_score(product, user_profile)
-            scored_products.append({
-                "product": product,
-                "score": score,
-                "reasons": self._get_recommendation_reasons(product, user_profile)
-            })
-        
-        # Sort by score and return top recommendations
-        scored_products.sort(key=lambda x: x["score"], reverse=True)
-        
-        return [
-            {
-                "id": item["product"].id,
-                "name": item["product"].name,
-                "brand": item["product"].brand.name if item["product"].brand else None,
-                "category": item["product"].category,
-                "price": item["product"].price,
-                "score": item["score"],
-                "reasons": item["reasons"],
-                "image_url": item["product"].images[0].image_url if item["product"].images else None
-            }
-            for item in scored_products[:limit]
-        ]
+        # Score the whole catalog in one pass over the feature matrix
+        index = catalog_index.ensure_fresh(db)
+        vector, bias = self._profile_vector(index, user)
+        engaged = self._engaged_products(db, [user_id])
+        collaborative = collaborative_model.scores(index, [user_id], seeds=engaged)
+        scores = self._calculate_product_scores(
+            index, vector, bias, collaborative=collaborative[0] if collaborative is not None else None
+        )
+        ingredient_similarity.ensure_fresh(db)
+        boost = self._similarity_boost(index, engaged[user_id])
+        if boost is not None:
+            scores = np.minimum(scores + boost, 1.0)
+        rows = index.top_k(scores, limit, mask=index.category_mask(category))
+        if rows.size == 0:
+            return []
 
-    def _calculate_product_score(self, product: Product, user_profile) -> float:
-        """Calculate recommendation score for a product"""
-        score = 0.0
+        # Only the top-k products are loaded as ORM objects
+        ids = [int(pid) for pid in index.product_ids[rows]]
+        by_id = {p.id: p for p in db.query(Product).options(*PRODUCT_CARD).filter(Product.id.in_(ids)).all()}
         
-        # Skin type matching
-        if hasattr(user_profile, 'skin_type') and user_profile.skin_type:
-            if product.suitable_skin_types and user_profile.skin_type in product.suitable_skin_types:
-                score += self.recommendation_weights["skin_type"]
-        
-        # Skin tone matching
-        if hasattr(user_profile, 'skin_tone') and user_profile.skin_tone:
+        results = []
+        for row, pid in zip(rows, ids):
+            product = by_id.get(pid)
+            if product is None:
+                continue
+            similar = boost is not None and boost[row] > 0
+            liked_by_similar = collaborative is not None and collaborative[0, row] >= 0.5
+            reasons = self._get_recommendation_reasons(
+                index, int(row), vector, similar=similar, collaborative=liked_by_similar
+            )
+            results.append(self._shape(product, float(scores[row]), reasons))
+        return results
+
+    def _engaged_products(self, db: Session, user_ids: List[int], per_user: int = 20) -> Dict[int, List[int]]:
+        """Products each user clicked out to or rated highly, most recent first"""
+        engaged: Dict[int, List[int]] = {uid: [] for uid in user_ids}
+        clicks = (
+            db.query(Clickout.user_id, Clickout.product_id)
+            .filter(Clickout.user_id.in_(user_ids), Clickout.product_id.isnot(None))
+            .order_by(Clickout.created_at.desc())
+        )
+        liked = (
+            db.query(Recommendation.user_id, RecommendationItem.product_id)
+            .join(RecommendationItem, RecommendationItem.recommendation_id == Recommendation.id)
+            .filter(Recommendation.user_id.in_(user_ids), Recommendation.rating >= 4)
+            .order_by(Recommendation.created_at.desc())
+        )
+        for uid, pid in list(clicks) + list(liked):
+            seeds = engaged[uid]
+            if pid not in seeds and len(seeds) < per_user:
+                seeds.append(pid)
+        return engaged
+
+    def _similarity_boost(self, index: CatalogIndex, seeds: List[int]) -> Optional[np.ndarray]:
+        """Per-row bonus for products whose ingredients resemble the seed products"""
+        if not seeds:
+            return None
+        boost = np.zeros(len(index), dtype=np.float32)
+        for seed in seeds:
+            for pid, sim in ingredient_similarity.neighbors(seed):
+                row = index.row_of(pid)
+                if row is not None:
+                    boost[row] = max(boost[row], self.recommendation_weights["similarity"] * sim)
+        return boost if boost.any() else None
+
+    def _profile_vector(self, index: CatalogIndex, user: User):
+        """Encode a user's profile against the catalog index.
+
+        Returns the weight vector and the constant part of the score
+        (skin tone placeholder and base popularity).
+        """
+        profile = user.profile
+        skin_type = getattr(profile, "skin_type", None) or user.skin_type
+        skin_tone = getattr(profile, "skin_tone", None) or user.skin_color
+        vector = index.profile_vector(
+            self.recommendation_weights,
+            skin_type=skin_type,
+            concerns=getattr(profile, "skin_concerns", None),
+            preferred_brands=getattr(profile, "preferred_brands", None),
+        )
+        bias = 0.1  # base popularity score
+        if skin_tone:
             # This would need more sophisticated matching logic
-            score += self.recommendation_weights["skin_tone"] * 0.5
-        
-        # Concerns matching
-        if hasattr(user_profile, 'skin_concerns') and user_profile.skin_concerns:
-            if product.targets_concerns:
-                concern_overlap = set(user_profile.skin_concerns) & set(product.targets_concerns)
-                if concern_overlap:
-                    score += self.recommendation_weights["concerns"] * (len(concern_overlap) / len(user_profile.skin_concerns))
-        
-        # Add base popularity score
-        score += 0.1
-        
-        return min(score, 1.0)  # Cap at 1.0
+            bias += self.recommendation_weights["skin_tone"] * 0.5
+        return vector, bias
+
+    def _calculate_product_scores(self, index: CatalogIndex, vector: np.ndarray, bias: float,
+                                  collaborative: Optional[np.ndarray] = None) -> np.ndarray:
+        """Calculate recommendation scores for every product in the index.
 
-    def _get_recommendation_reasons(self, product: Product, user_profile) -> List[str]:
+        ``collaborative`` is the user's predicted preference per catalog row
+        from the matrix-factorization model, blended in with its weight.
+        """
+        scores = index.score(vector, bias)
+        if collaborative is not None:
+            scores = np.minimum(scores + self.recommendation_weights["collaborative"] * collaborative, 1.0)
+        return scores
+
+    def _get_recommendation_reasons(self, index: CatalogIndex, row: int, vector: np.ndarray, similar: bool = False,
+                                    collaborative: bool = False) -> List[str]:
         """Get reasons why this product is recommended"""
         reasons = []
         
-        if hasattr(user_profile, 'skin_type') and user_profile.skin_type:
-            if product.suitable_skin_types and user_profile.skin_type in product.suitable_skin_types:
-                reasons.append(f"Perfect for {user_profile.skin_type} skin")
+        for skin_type in index.matched_terms(row, vector, index.skin_type_cols):
+            reasons.append(f"Perfect for {skin_type} skin")
+        
+        for concern in index.matched_terms(row, vector, index.concern_cols):
+            reasons.append(f"Targets {concern}")
         
-        if hasattr(user_profile, 'skin_concerns') and user_profile.skin_concerns:
-            if product.targets_concerns:
-                concern_overlap = set(user_profile.skin_concerns) & set(product.targets_concerns)
-                for concern in concern_overlap:
-                    reasons.append(f"Targets {concern}")
+        if similar:
+            reasons.append("Similar ingredients to products you liked")
+        
+        if collaborative:
+            reasons.append("Popular with people like you")
         
         if not reasons:
             reasons.append("Popular choice")
         
         return reasons
 
-    async def _get_popular_products(self, db: Session, category: Optional[str], limit: int) -> List[Dict[str, Any]]:
-        """Get popular products when no user profile available"""
-        query = db.query(Product)
-        if category:
-            query = query.filter(Product.category == category)
-        
-        products = query.limit(limit).all()
-        
+    def get_similar_products(self, db: Session, product_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Nearest products by ingredient similarity, shaped as recommendation cards"""
+        neighbors = ingredient_similarity.ensure_fresh(db).neighbors(product_id, limit)
+        if not neighbors:
+            return []
+        ids = [pid for pid, _ in neighbors]
+        by_id = {p.id: p for p in db.query(Product).options(*PRODUCT_CARD).filter(Product.id.in_(ids)).all()}
         return [
-            {
-                "id": product.id,
-                "name": product.name,
-                "brand": product.brand.name if product.brand else None,
-                "category": product.category,
-                "price": product.price,
-                "score": 0.5,
-                "reasons": ["Popular choice"],
-                "image_url": product.images[0].image_url if product.images else None
-            }
-            for product in products
+            self._shape(by_id[pid], round(sim, 4), ["Similar ingredients"])
+            for pid, sim in neighbors
+            if pid in by_id
         ]
 
+    async def _get_popular_products(self, db: Session, category: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Get popular products when no user profile available"""
+        return self._popular(db, category, limit, ["Popular choice"])
+
     async def get_shade_recommendations(
         self, 
         db: Session, 
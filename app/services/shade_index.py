@@ -0,0 +1,188 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.brand import Brand
+from app.models.product import Product
+from app.models.shade import Shade
+
+# sRGB (D65) -> XYZ
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+_EPSILON = (6 / 29) ** 3
+
+
+def rgb_to_lab(rgb: Any) -> np.ndarray:
+    """Convert sRGB values in 0-255 (shape ``(..., 3)``) to CIELAB"""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    t = (linear @ _RGB_TO_XYZ.T) / _WHITE_D65
+    f = np.where(t > _EPSILON, np.cbrt(t), t / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def ciede2000(lab1: Any, lab2: Any) -> np.ndarray:
+    """CIEDE2000 colour difference (Sharma et al., 2005), broadcast over rows"""
+    lab1, lab2 = np.asarray(lab1, dtype=np.float64), np.asarray(lab2, dtype=np.float64)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_bar7 = ((np.hypot(a1, b1) + np.hypot(a2, b2)) / 2) ** 7
+    g = 0.5 * (1 - np.sqrt(c_bar7 / (c_bar7 + 25.0 ** 7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma_zero = c1p * c2p == 0
+
+    dlp = L2 - L1
+    dcp = c2p - c1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, np.where(dhp < -180, dhp + 360, dhp))
+    dhp = np.where(chroma_zero, 0.0, dhp)
+    dhp_big = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(dhp / 2))
+
+    lbp = (L1 + L2) / 2
+    cbp = (c1p + c2p) / 2
+    hsum = h1p + h2p
+    hbp = np.where(
+        chroma_zero,
+        hsum,
+        np.where(np.abs(h1p - h2p) <= 180, hsum / 2, np.where(hsum < 360, (hsum + 360) / 2, (hsum - 360) / 2)),
+    )
+    t = (
+        1
+        - 0.17 * np.cos(np.radians(hbp - 30))
+        + 0.24 * np.cos(np.radians(2 * hbp))
+        + 0.32 * np.cos(np.radians(3 * hbp + 6))
+        - 0.20 * np.cos(np.radians(4 * hbp - 63))
+    )
+    d_theta = 30 * np.exp(-(((hbp - 275) / 25) ** 2))
+    cbp7 = cbp ** 7
+    rc = 2 * np.sqrt(cbp7 / (cbp7 + 25.0 ** 7))
+    sl = 1 + 0.015 * (lbp - 50) ** 2 / np.sqrt(20 + (lbp - 50) ** 2)
+    sc = 1 + 0.045 * cbp
+    sh = 1 + 0.015 * cbp * t
+    rt = -np.sin(np.radians(2 * d_theta)) * rc
+    return np.sqrt((dlp / sl) ** 2 + (dcp / sc) ** 2 + (dhp_big / sh) ** 2 + rt * (dcp / sc) * (dhp_big / sh))
+
+
+class _Partition:
+    """Shades of one (category, undertone) group: Lab rows plus a KD-tree over them"""
+
+    def __init__(self, ids: np.ndarray, lab: np.ndarray):
+        self.ids = ids
+        self.lab = np.ascontiguousarray(lab)
+        self.tree = cKDTree(self.lab)
+
+
+class ShadeIndex:
+    """Nearest-shade lookup in CIELAB, partitioned by category and undertone.
+
+    Shades are converted to Lab once at build time. A query takes the
+    nearest candidates by Euclidean Lab distance (Delta E 1976) from the
+    partition's KD-tree and re-ranks them by CIEDE2000, which tracks
+    perceived difference more closely but is not a metric a tree can index.
+
+    The index is rebuilt only after ``invalidate`` (called by the shade,
+    product and brand CRUD) or when the table's row count / max id changes,
+    which is checked at most every ``check_seconds``.
+    """
+
+    # Candidates fetched from the tree per requested result before re-ranking
+    OVERSAMPLE = 8
+    MIN_CANDIDATES = 32
+
+    def __init__(self, check_seconds: int = 60):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._stale = True
+        self._checked_at = float("-inf")
+        self._signature: Optional[Tuple[int, int]] = None
+        self._load([])
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def _current_signature(self, db: Session) -> Tuple[int, int]:
+        count, max_id = db.query(func.count(Shade.id), func.max(Shade.id)).one()
+        return int(count or 0), int(max_id or 0)
+
+    def ensure_fresh(self, db: Session) -> "ShadeIndex":
+        now = time.monotonic()
+        if not self._stale and now - self._checked_at < self.check_seconds:
+            return self
+        with self._lock:
+            signature = self._current_signature(db)
+            self._checked_at = time.monotonic()
+            if self._stale or signature != self._signature:
+                self.rebuild(db, signature)
+        return self
+
+    def rebuild(self, db: Session, signature: Optional[Tuple[int, int]] = None) -> None:
+        rows = (
+            db.query(
+                Shade.id, Shade.name, Shade.hex_code, Shade.rgb_r, Shade.rgb_g, Shade.rgb_b,
+                Shade.undertone, Shade.category, Brand.name, Product.name,
+            )
+            .outerjoin(Brand, Shade.brand_id == Brand.id)
+            .outerjoin(Product, Shade.product_id == Product.id)
+            .all()
+        )
+        self._load(rows)
+        self._signature = signature or self._current_signature(db)
+        self._stale = False
+
+    def _load(self, rows: Sequence[Sequence[Any]]) -> None:
+        """Build partitions from (id, name, hex, r, g, b, undertone, category, brand, product) rows"""
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        lab = rgb_to_lab(np.array([r[3:6] for r in rows], dtype=np.float64).reshape(-1, 3))
+        self._records: Dict[int, Dict[str, Any]] = {
+            r[0]: {"name": r[1], "hex_code": r[2], "undertone": r[6], "category": r[7], "brand": r[8], "product": r[9]}
+            for r in rows
+        }
+
+        groups: Dict[Tuple[str, Optional[str]], List[int]] = {}
+        for i, r in enumerate(rows):
+            category = (r[7] or "").lower()
+            groups.setdefault((category, None), []).append(i)
+            if r[6]:
+                groups.setdefault((category, r[6].lower()), []).append(i)
+        self._partitions = {key: _Partition(ids[members], lab[members]) for key, members in groups.items()}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def query(self, rgb: Sequence[float], category: str, undertone: Optional[str] = None,
+              limit: int = 5) -> List[Dict[str, Any]]:
+        """Closest shades to an sRGB colour, best first, with their CIEDE2000 distance"""
+        key = ((category or "").lower(), undertone.lower() if undertone else None)
+        partition = self._partitions.get(key)
+        if partition is None or limit <= 0:
+            return []
+        target = rgb_to_lab(rgb)
+        k = min(len(partition.ids), max(limit * self.OVERSAMPLE, self.MIN_CANDIDATES))
+        _, candidates = partition.tree.query(target, k=k)
+        candidates = np.atleast_1d(candidates)
+        distances = ciede2000(target, partition.lab[candidates])
+        order = np.argsort(distances, kind="stable")[:limit]
+
+        results = []
+        for i in order:
+            shade_id = int(partition.ids[candidates[i]])
+            results.append({"shade_id": shade_id, **self._records[shade_id], "delta_e": round(float(distances[i]), 3)})
+        return results
+
+
+# Global shade index instance
+shade_index = ShadeIndex(check_seconds=settings.SHADE_INDEX_CHECK_SECONDS)
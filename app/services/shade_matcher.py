@@ -1,24 +1,82 @@
-from typing import List, Dict, Any
-from PIL import Image
-import io
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.ml_models.preprocess import WORKING_SIZE, load_rgb, skin_color, skin_region
+from app.ml_models.preprocess import fingerprint as image_fingerprint
+from app.services.analysis_cache import Fingerprint, analysis_cache, content_digest
+from app.services.analysis_executor import analysis_executor, stage
+from app.services.shade_index import shade_index
+
+
+def extract_skin_color(data: bytes) -> Optional[Tuple[Sequence[int], Fingerprint]]:
+    """Mean colour of the face's skin pixels, and the image fingerprint; runs in an analysis worker"""
+    with stage("decode"):
+        rgb = load_rgb(data, WORKING_SIZE)
+    if rgb is None or rgb.size == 0:
+        return None
+    with stage("face"):
+        region = skin_region(rgb)
+    with stage("color"):
+        color, _ = skin_color(region)
+    return color, image_fingerprint(rgb)
+
 
 class ShadeMatcherService:
-    async def find_matching_shades(self, upload_file) -> List[Dict[str, Any]]:
+    def match_color(
+        self,
+        db: Session,
+        rgb: Sequence[int],
+        category: str = "foundation",
+        undertone: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """Closest catalog shades to an sRGB colour by CIEDE2000"""
+        matches = shade_index.ensure_fresh(db).query(rgb, category, undertone, limit)
+        if not matches and undertone:
+            # No shades tagged with this undertone: fall back to the whole category
+            matches = shade_index.query(rgb, category, None, limit)
+        return matches
+
+    async def _skin_color(self, data: bytes) -> Optional[Sequence[int]]:
+        """Skin colour of an upload, cached by content so repeat uploads skip decoding"""
+        digest = content_digest(data)
+        rgb = analysis_cache.peek("color", digest)
+        if rgb is not None:
+            return rgb
+        extracted = await analysis_executor.submit(extract_skin_color, data)
+        if extracted is None:
+            return None
+        rgb, fingerprint = extracted
+        # A near-identical earlier upload keeps its colour so matches stay stable
+        rgb = analysis_cache.get("color", digest, fingerprint) or list(rgb)
+        analysis_cache.put("color", digest, fingerprint, rgb)
+        return rgb
+
+    async def find_matching_shades(
+        self,
+        upload_file,
+        db: Session,
+        category: str = "foundation",
+        undertone: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[Dict[str, Any]]:
         # Read bytes (works with Starlette UploadFile)
         data = await upload_file.read()
-        # Example: inspect average color (placeholder)
-        try:
-            img = Image.open(io.BytesIO(data)).convert("RGB")
-            w, h = img.size
-            pixels = list(img.getdata())
-            r = sum(p[0] for p in pixels) // len(pixels)
-            g = sum(p[1] for p in pixels) // len(pixels)
-            b = sum(p[2] for p in pixels) // len(pixels)
-            avg_hex = f"#{r:02x}{g:02x}{b:02x}"
-        except Exception:
-            avg_hex = "#aaaaaa"
-        # Return dummy shade matches
+        rgb = await self._skin_color(data)
+        if rgb is None:
+            return []
+        approx_hex = "#{:02x}{:02x}{:02x}".format(*rgb)
         return [
-            {"brand": "Generic", "product": "Tinted Moisturizer", "shade": "Medium", "approx_hex": avg_hex},
-            {"brand": "Generic", "product": "Foundation", "shade": "Beige", "approx_hex": avg_hex},
+            {
+                "shade_id": m["shade_id"],
+                "brand": m["brand"],
+                "product": m["product"],
+                "shade": m["name"],
+                "hex_code": m["hex_code"],
+                "undertone": m["undertone"],
+                "delta_e": m["delta_e"],
+                "approx_hex": approx_hex,
+            }
+            for m in self.match_color(db, rgb, category, undertone, limit)
         ]
@@ -0,0 +1,227 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.product_ingredient import product_ingredients
+
+Neighbors = List[Tuple[int, float]]
+
+# Rows of the product x product similarity block computed at once during a rebuild
+REBUILD_CHUNK = 1024
+
+# Similarities are rounded so the sparse rebuild and the incremental path
+# (different summation order) agree exactly and ties break by id
+PRECISION = 10
+
+
+class IngredientSimilarityIndex:
+    """Nearest neighbours between products by TF-IDF weighted ingredient overlap.
+
+    Each product is a binary bag of ingredients weighted by smoothed IDF and
+    L2-normalised, so similarity is cosine. A full rebuild multiplies the
+    sparse product x ingredient matrix by its transpose in row chunks and
+    keeps the top ``k`` neighbours per product.
+
+    When one product's ingredients change, only that product and the
+    products sharing an ingredient with it (old or new) are touched. IDF
+    weights are frozen at the last full rebuild so every stored similarity
+    stays comparable; the periodic rebuild picks up document-frequency drift.
+    """
+
+    def __init__(self, k: int = 20, ttl_seconds: int = 3600):
+        self.k = k
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._stale = True
+        self._built_at = 0.0
+        self._load({})
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def ensure_fresh(self, db: Session) -> "IngredientSimilarityIndex":
+        """Rebuild from the database if stale or older than the TTL"""
+        if self._stale or time.monotonic() - self._built_at > self.ttl_seconds:
+            with self._lock:
+                if self._stale or time.monotonic() - self._built_at > self.ttl_seconds:
+                    self.rebuild(db)
+        return self
+
+    def rebuild(self, db: Session) -> None:
+        pairs = db.query(product_ingredients.c.product_id, product_ingredients.c.ingredient_id).all()
+        ingredients: Dict[int, Set[int]] = defaultdict(set)
+        for pid, iid in pairs:
+            ingredients[pid].add(iid)
+        with self._lock:
+            self._load(ingredients)
+            self._stale = False
+            self._built_at = time.monotonic()
+
+    def _load(self, ingredients: Dict[int, Set[int]]) -> None:
+        self._ingredients: Dict[int, frozenset] = {pid: frozenset(iids) for pid, iids in ingredients.items() if iids}
+        self._postings: Dict[int, Set[int]] = defaultdict(set)
+        for pid, iids in self._ingredients.items():
+            for iid in iids:
+                self._postings[iid].add(pid)
+        n_docs = len(self._ingredients)
+        self._idf: Dict[int, float] = {
+            iid: math.log((1 + n_docs) / (1 + len(pids))) + 1.0 for iid, pids in self._postings.items()
+        }
+        self._norms = {pid: self._norm(iids) for pid, iids in self._ingredients.items()}
+        self._neighbors: Dict[int, Neighbors] = {}
+        self._reverse: Dict[int, Set[int]] = defaultdict(set)
+
+        if not self._ingredients:
+            return
+        product_ids = np.fromiter(self._ingredients.keys(), dtype=np.int64, count=n_docs)
+        columns = {iid: j for j, iid in enumerate(self._idf)}
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for pid in product_ids:
+            iids = self._ingredients[int(pid)]
+            norm = self._norms[int(pid)]
+            for iid in iids:
+                indices.append(columns[iid])
+                data.append(self._idf[iid] / norm)
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(n_docs, len(columns)))
+        transposed = matrix.T.tocsc()
+
+        for start in range(0, n_docs, REBUILD_CHUNK):
+            block = (matrix[start:start + REBUILD_CHUNK] @ transposed).tocsr()
+            for offset in range(block.shape[0]):
+                lo, hi = block.indptr[offset], block.indptr[offset + 1]
+                cols, sims = block.indices[lo:hi], block.data[lo:hi]
+                keep = cols != start + offset
+                self._set_neighbors(int(product_ids[start + offset]), self._best(product_ids[cols[keep]], sims[keep]))
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+    def update_product(self, product_id: int, ingredient_ids: Iterable[int]) -> None:
+        """Apply a change to one product's ingredient list"""
+        if self._stale:
+            return  # the next rebuild reads the new state
+        new = frozenset(ingredient_ids)
+        with self._lock:
+            old = self._ingredients.get(product_id, frozenset())
+            for iid in old - new:
+                self._postings[iid].discard(product_id)
+            n_docs = len(self._ingredients) + (0 if old or not new else 1)
+            for iid in new - old:
+                self._postings[iid].add(product_id)
+                # Ingredients unseen at rebuild time get an IDF from current counts
+                self._idf.setdefault(iid, math.log((1 + n_docs) / (1 + len(self._postings[iid]))) + 1.0)
+            if new:
+                self._ingredients[product_id] = new
+                self._norms[product_id] = self._norm(new)
+            else:
+                self._ingredients.pop(product_id, None)
+                self._norms.pop(product_id, None)
+
+            affected = self._candidates(old | new, exclude=product_id) | set(self._reverse.get(product_id, ()))
+            if new:
+                self._set_neighbors(product_id, self._compute(product_id))
+            else:
+                self._set_neighbors(product_id, [])
+                self._neighbors.pop(product_id, None)
+
+            for other in affected:
+                self._repair(other, product_id)
+
+    def remove_product(self, product_id: int) -> None:
+        self.update_product(product_id, ())
+
+    def _repair(self, owner: int, changed: int) -> None:
+        """Fix ``owner``'s neighbour list after ``changed`` moved in similarity space"""
+        current = self._neighbors.get(owner, [])
+        sim = self.similarity(owner, changed)
+        listed = any(pid == changed for pid, _ in current)
+        full = len(current) >= self.k
+        floor = current[-1][1] if current else 0.0
+
+        if listed and (sim <= 0 or (full and sim < floor)):
+            # It may have dropped below an unlisted product; recompute this one list
+            self._set_neighbors(owner, self._compute(owner))
+            return
+        if sim <= 0 or (not listed and full and (sim, -changed) <= (floor, -current[-1][0])):
+            return
+        merged = [(pid, s) for pid, s in current if pid != changed] + [(changed, sim)]
+        merged.sort(key=lambda item: (-item[1], item[0]))
+        self._set_neighbors(owner, merged[: self.k])
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def neighbors(self, product_id: int, limit: Optional[int] = None) -> Neighbors:
+        with self._lock:
+            found = list(self._neighbors.get(product_id, []))
+        return found[:limit] if limit is not None else found
+
+    def similarity(self, a: int, b: int) -> float:
+        ia, ib = self._ingredients.get(a), self._ingredients.get(b)
+        if not ia or not ib:
+            return 0.0
+        shared = ia & ib
+        if not shared:
+            return 0.0
+        return round(sum(self._idf[iid] ** 2 for iid in shared) / (self._norms[a] * self._norms[b]), PRECISION)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    def _norm(self, iids: Iterable[int]) -> float:
+        return math.sqrt(sum(self._idf[iid] ** 2 for iid in iids)) or 1.0
+
+    def _candidates(self, iids: Iterable[int], exclude: int) -> Set[int]:
+        found: Set[int] = set()
+        for iid in iids:
+            found |= self._postings.get(iid, set())
+        found.discard(exclude)
+        return found
+
+    def _compute(self, product_id: int) -> Neighbors:
+        candidates = self._candidates(self._ingredients.get(product_id, ()), exclude=product_id)
+        if not candidates:
+            return []
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        sims = np.array([self.similarity(product_id, int(pid)) for pid in ids])
+        return self._best(ids, sims)
+
+    def _best(self, ids: np.ndarray, sims: np.ndarray) -> Neighbors:
+        if ids.size == 0:
+            return []
+        sims = np.round(sims, PRECISION)
+        if ids.size > self.k:
+            cut = np.argpartition(-sims, self.k - 1)[: self.k]
+            # Keep every tie of the k-th score so the id tie-break below is exact
+            kth = sims[cut].min()
+            cut = np.flatnonzero(sims >= kth)
+            ids, sims = ids[cut], sims[cut]
+        order = np.lexsort((ids, -sims))[: self.k]
+        return [(int(ids[i]), float(sims[i])) for i in order]
+
+    def _set_neighbors(self, product_id: int, neighbors: Neighbors) -> None:
+        for pid, _ in self._neighbors.get(product_id, []):
+            self._reverse[pid].discard(product_id)
+        self._neighbors[product_id] = neighbors
+        for pid, _ in neighbors:
+            self._reverse[pid].add(product_id)
+
+
+# Global ingredient similarity index instance
+ingredient_similarity = IngredientSimilarityIndex(
+    k=settings.SIMILARITY_NEIGHBORS,
+    ttl_seconds=settings.SIMILARITY_REBUILD_SECONDS,
+)
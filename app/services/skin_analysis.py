@@ -1,90 +1,207 @@
-from typing import Dict, List, Optional, Any
-import cv2
+from typing import Dict, List, Optional, Any, Tuple
+import asyncio
+
 import numpy as np
-from PIL import Image
-import io
+
+from app.core.config import settings
+
+from app.ml_models.preprocess import (
+    FEATURE_NAMES, WORKING_SIZE, load_rgb, masked_mean, skin_features, skin_mask, skin_region,
+)
+from app.ml_models.preprocess import fingerprint as image_fingerprint
+from app.services.analysis_cache import Fingerprint, analysis_cache, content_digest
+from app.ml_models.runtime import Model, model_runtime
+from app.services.analysis_executor import analysis_executor, stage
+from app.services.micro_batcher import MicroBatcher
+
+UNREADABLE = {"error": "Analysis failed: unreadable image"}
+_ROUGHNESS = FEATURE_NAMES.index("roughness")
+_SHINE = FEATURE_NAMES.index("shine")
 
 class SkinAnalysisService:
     def __init__(self):
         self.skin_types = ["oily", "dry", "combination", "sensitive", "normal"]
         self.skin_concerns = ["acne", "wrinkles", "dark_spots", "redness", "dullness"]
 
+    async def analyze_skin_from_image(self, upload_file) -> Dict[str, Any]:
+        """Analyze skin from an uploaded file (works with Starlette UploadFile)"""
+        return await self.analyze_skin_image(await upload_file.read())
+
     async def analyze_skin_image(self, image_data: bytes) -> Dict[str, Any]:
-        """Analyze skin from uploaded image"""
+        """Analyze skin from uploaded image in the analysis worker pool"""
+        result, _ = await analysis_executor.submit(analyze_image_bytes, image_data)
+        return result
+
+    async def analyze_for_user(self, user_id: int, image_data: bytes) -> Dict[str, Any]:
+        """Analyze a user's upload, reusing the stored result when the image was seen before.
+
+        Returns ``{"analysis", "analysis_id", "digest", "fingerprint"}``.
+        ``analysis_id`` is set for a cache hit; for a fresh analysis it is None
+        and the caller saves the result and passes the new id to ``remember``.
+        """
+        return (await self.analyze_images_for_user(user_id, [image_data]))[0]
+
+    async def analyze_images_for_user(self, user_id: int, images: List[bytes]) -> List[Dict[str, Any]]:
+        """Batch form of ``analyze_for_user``.
+
+        Cache misses are decoded in parallel workers; crops that are not
+        near-duplicates of a stored image go through ``inference_batcher``,
+        which coalesces them with crops from concurrent requests.
+        """
+        namespace = f"skin:{user_id}"
+        digests = [content_digest(data) for data in images]
+        entries: List[Optional[Dict[str, Any]]] = []
+        for digest in digests:
+            cached = analysis_cache.peek(namespace, digest)
+            entries.append({**cached, "digest": digest, "fingerprint": None} if cached is not None else None)
+
+        pending = [i for i, entry in enumerate(entries) if entry is None]
+        prepared = await analysis_executor.map(prepare_image, [images[i] for i in pending])
+        fresh = []
+        for i, item in zip(pending, prepared):
+            if item is None:
+                entries[i] = {"analysis": dict(UNREADABLE), "analysis_id": None, "digest": digests[i], "fingerprint": None}
+                continue
+            crop, fingerprint = item
+            cached = analysis_cache.get(namespace, digests[i], fingerprint)
+            if cached is not None:
+                # Near-duplicate of a stored image: index this upload's digest under the same result
+                analysis_cache.put(namespace, digests[i], fingerprint, cached)
+                entries[i] = {**cached, "digest": digests[i], "fingerprint": fingerprint}
+            else:
+                fresh.append((i, crop, fingerprint))
+
+        results = await asyncio.gather(*(inference_batcher.submit(crop) for _, crop, _ in fresh))
+        for (i, _, fingerprint), result in zip(fresh, results):
+            entries[i] = {"analysis": result, "analysis_id": None, "digest": digests[i], "fingerprint": fingerprint}
+        return entries
+
+    def remember(self, user_id: int, entry: Dict[str, Any], analysis_id: int) -> None:
+        """Cache a freshly saved analysis so repeat uploads reuse it"""
+        if "error" in entry["analysis"]:
+            return
+        analysis_cache.put(
+            f"skin:{user_id}", entry["digest"], entry["fingerprint"],
+            {"analysis": entry["analysis"], "analysis_id": analysis_id},
+        )
+
+    def analyze_image(self, image_data: bytes) -> Tuple[Dict[str, Any], Optional[Fingerprint]]:
+        """Analyze skin from image bytes; CPU-bound, runs inside an analysis worker.
+
+        Also returns the image fingerprint, or None if it could not be decoded.
+        """
         try:
-            # Convert bytes to PIL Image
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to OpenCV format
-            opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            # Basic skin analysis (placeholder implementation)
-            analysis_result = {
-                "skin_type": self._detect_skin_type(opencv_image),
-                "skin_tone": self._detect_skin_tone(opencv_image),
-                "concerns": self._detect_skin_concerns(opencv_image),
-                "moisture_level": self._analyze_moisture(opencv_image),
-                "oil_level": self._analyze_oil_level(opencv_image),
-                "recommendations": []
-            }
-            
-            # Generate recommendations based on analysis
-            analysis_result["recommendations"] = self._generate_recommendations(analysis_result)
-            
-            return analysis_result
-            
+            prepared = prepare_image(image_data)
+            if prepared is None:
+                return dict(UNREADABLE), None
+            crop, fingerprint = prepared
+            return self.analyze_crops(crop[None])[0], fingerprint
+        except Exception as e:
+            return {"error": f"Analysis failed: {str(e)}"}, None
+
+    def analyze_crops(self, crops: np.ndarray) -> List[Dict[str, Any]]:
+        """Run every detector over an ``(N, H, W, 3)`` RGB batch of face-region crops.
+
+        Crops from different requests share a batch, so if the batched pass
+        fails each crop is retried on its own and only the ones that still
+        fail get an ``{"error": ...}`` result.
+        """
+        try:
+            return self._analyze_batch(crops)
+        except Exception as e:
+            if len(crops) == 1:
+                return [{"error": f"Analysis failed: {str(e)}"}]
+        return [self._analyze_one(crop) for crop in crops]
+
+    def _analyze_one(self, crop: np.ndarray) -> Dict[str, Any]:
+        """Analysis of a single crop, or the error it failed with"""
+        try:
+            return self._analyze_batch(crop[None])[0]
         except Exception as e:
             return {"error": f"Analysis failed: {str(e)}"}
 
-    def _detect_skin_type(self, image: np.ndarray) -> str:
-        """Detect skin type from image"""
-        # Placeholder implementation - in reality would use ML models
-        # For now, return a random skin type
-        import random
-        return random.choice(self.skin_types)
-
-    def _detect_skin_tone(self, image: np.ndarray) -> Dict[str, Any]:
-        """Detect skin tone and undertone"""
-        # Calculate average color in face region
-        height, width = image.shape[:2]
-        center_region = image[height//4:3*height//4, width//4:3*width//4]
-        
-        avg_color = np.mean(center_region, axis=(0, 1))
-        
-        return {
-            "rgb": [int(avg_color[2]), int(avg_color[1]), int(avg_color[0])],
-            "hex": f"#{int(avg_color[2]):02x}{int(avg_color[1]):02x}{int(avg_color[0]):02x}",
-            "undertone": self._determine_undertone(avg_color)
-        }
-
-    def _determine_undertone(self, avg_color: np.ndarray) -> str:
-        """Determine skin undertone"""
-        r, g, b = avg_color[2], avg_color[1], avg_color[0]
-        
-        if r > g and r > b:
-            return "warm"
-        elif b > r and b > g:
-            return "cool"
-        else:
-            return "neutral"
-
-    def _detect_skin_concerns(self, image: np.ndarray) -> List[str]:
-        """Detect skin concerns"""
-        # Placeholder implementation
-        import random
-        return random.sample(self.skin_concerns, random.randint(1, 3))
-
-    def _analyze_moisture(self, image: np.ndarray) -> int:
-        """Analyze moisture level (0-100)"""
-        # Placeholder implementation
-        import random
-        return random.randint(30, 90)
-
-    def _analyze_oil_level(self, image: np.ndarray) -> int:
-        """Analyze oil level (0-100)"""
-        # Placeholder implementation
-        import random
-        return random.randint(20, 80)
+    def _analyze_batch(self, crops: np.ndarray) -> List[Dict[str, Any]]:
+        with stage("analyze"):
+            masks = skin_mask(crops)
+            features = skin_features(crops, masks)
+            tones = self._detect_skin_tones(crops, masks)
+            undertones = self._determine_undertones(tones)
+            skin_types = self._detect_skin_types(crops, features)
+            concerns = self._detect_skin_concerns(crops, features)
+            moisture = self._analyze_moisture(crops, features)
+            oil = self._analyze_oil_level(crops, features)
+
+            results = []
+            for i in range(len(crops)):
+                r, g, b = (int(c) for c in tones[i])
+                analysis_result = {
+                    "skin_type": skin_types[i],
+                    "skin_tone": {"rgb": [r, g, b], "hex": f"#{r:02x}{g:02x}{b:02x}", "undertone": undertones[i]},
+                    "concerns": concerns[i],
+                    "moisture_level": int(moisture[i]),
+                    "oil_level": int(oil[i]),
+                    "recommendations": []
+                }
+
+                # Generate recommendations based on analysis
+                analysis_result["recommendations"] = self._generate_recommendations(analysis_result)
+                results.append(analysis_result)
+        return results
+
+    def _model_inputs(self, model: Model, crops: np.ndarray, features: np.ndarray) -> np.ndarray:
+        if model.input == "pixels":
+            return crops.transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        return features
+
+    def _detect_skin_types(self, crops: np.ndarray, features: np.ndarray) -> List[str]:
+        """Detect skin type for each crop with the ``skin_type`` model"""
+        model = model_runtime.get("skin_type")
+        if model is None:
+            # Placeholder until a skin_type model is deployed
+            import random
+            return [random.choice(self.skin_types) for _ in range(len(crops))]
+        labels = model.labels or self.skin_types
+        probabilities = model.predict(self._model_inputs(model, crops, features))
+        return [labels[i] for i in probabilities.argmax(axis=1)]
+
+    def _detect_skin_tones(self, crops: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        """Average RGB colour of the skin pixels of each face-region crop, shape ``(N, 3)``"""
+        tones, _ = masked_mean(crops, masks)
+        return tones
+
+    def _determine_undertones(self, tones: np.ndarray) -> List[str]:
+        """Determine skin undertone from each average colour"""
+        r, g, b = tones[:, 0], tones[:, 1], tones[:, 2]
+        labels = np.select([(r > g) & (r > b), (b > r) & (b > g)], ["warm", "cool"], "neutral")
+        return labels.tolist()
+
+    def _detect_skin_concerns(self, crops: np.ndarray, features: np.ndarray) -> List[List[str]]:
+        """Detect skin concerns for each crop with the multi-label ``skin_concerns`` model"""
+        model = model_runtime.get("skin_concerns")
+        if model is None:
+            # Placeholder until a skin_concerns model is deployed
+            import random
+            return [random.sample(self.skin_concerns, random.randint(1, 3)) for _ in range(len(crops))]
+        labels = model.labels or self.skin_concerns
+        threshold = model.spec.get("threshold", 0.5)
+        probabilities = model.predict(self._model_inputs(model, crops, features))
+        return [[labels[j] for j in np.flatnonzero(row >= threshold)] for row in probabilities]
+
+    def _analyze_moisture(self, crops: np.ndarray, features: np.ndarray) -> np.ndarray:
+        """Moisture level per crop from the ``moisture`` model; without one, smoother
+        luminance texture reads as better hydrated (30-90)"""
+        model = model_runtime.get("moisture")
+        if model is None:
+            return np.clip(90 - 3 * features[:, _ROUGHNESS], 30, 90).round()
+        return np.clip(model.predict(self._model_inputs(model, crops, features))[:, 0], 0, 100).round()
+
+    def _analyze_oil_level(self, crops: np.ndarray, features: np.ndarray) -> np.ndarray:
+        """Oil level per crop from the ``oil`` model; without one, from the share of
+        bright, desaturated specular pixels (20-80)"""
+        model = model_runtime.get("oil")
+        if model is None:
+            return np.clip(20 + 600 * features[:, _SHINE], 20, 80).round()
+        return np.clip(model.predict(self._model_inputs(model, crops, features))[:, 0], 0, 100).round()
 
     def _generate_recommendations(self, analysis: Dict[str, Any]) -> List[str]:
         """Generate skincare recommendations based on analysis"""
@@ -114,3 +231,35 @@ class SkinAnalysisService:
 
 # Global skin analysis service instance
 skin_analysis_service = SkinAnalysisService()
+
+
+def analyze_image_bytes(image_data: bytes) -> Tuple[Dict[str, Any], Optional[Fingerprint]]:
+    """Process-pool entry point for skin analysis"""
+    return skin_analysis_service.analyze_image(image_data)
+
+
+def prepare_image(image_data: bytes) -> Optional[Tuple[np.ndarray, Fingerprint]]:
+    """Process-pool entry point: decode to the working size, fingerprint it and crop the face's skin region"""
+    with stage("decode"):
+        rgb = load_rgb(image_data, WORKING_SIZE)
+    if rgb is None:
+        return None
+    with stage("face"):
+        crop = skin_region(rgb)
+    return crop, image_fingerprint(rgb)
+
+
+def analyze_crop_batch(crops: np.ndarray) -> List[Dict[str, Any]]:
+    """Process-pool entry point for batched skin analysis"""
+    return skin_analysis_service.analyze_crops(crops)
+
+
+async def _infer_crops(crops: List[np.ndarray]) -> List[Dict[str, Any]]:
+    """Run one coalesced batch of crops through the detectors in an analysis worker"""
+    return await analysis_executor.submit(analyze_crop_batch, np.stack(crops))
+
+
+# Global skin inference batcher instance
+inference_batcher = MicroBatcher(
+    _infer_crops, max_batch=settings.ANALYSIS_INFERENCE_BATCH, max_wait_ms=settings.ANALYSIS_INFERENCE_WAIT_MS
+)
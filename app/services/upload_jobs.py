@@ -0,0 +1,87 @@
+"""
+Background processing for uploads, run by the job queue.
+
+``analyze_upload`` runs skin analysis on the stored image in the analysis
+worker pool, fills in the analysis record created at upload time and
+indexes the image by content hash and perceptual fingerprint in the
+analysis cache, so a later upload of the same photo to
+/analysis/skin-analysis reuses the result. A failed analysis is retried;
+an image that cannot be decoded fails the job and leaves the record empty.
+``render_variants`` pre-renders the standard derivatives of a local object
+so the first page view does not pay for them. ``collect_unreferenced_objects``
+is the scheduler's sweep of local objects no file record points at.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+
+import requests
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.storage import storage
+from app.services.analysis_cache import content_digest
+from app.services.analysis_executor import analysis_executor
+from app.services.derivatives import derivative_cache
+from app.services.job_queue import PermanentJobError, job_queue
+from app.services.skin_analysis import UNREADABLE, analyze_image_bytes, skin_analysis_service
+
+# Variants rendered ahead of the first request for them
+PRERENDERED_VARIANTS = [("thumb", "webp"), ("analysis", "jpg")]
+
+
+def _read_upload(payload: Dict[str, Any]) -> bytes:
+    content_hash = payload.get("content_hash")
+    if content_hash and storage.objects.exists(content_hash):
+        return storage.objects.path_for(content_hash).read_bytes()
+    response = requests.get(payload["url"], timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+@job_queue.handler("analyze_upload")
+def analyze_upload(db: Session, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    data = _read_upload(payload)
+    result, fingerprint = asyncio.run(analysis_executor.submit(analyze_image_bytes, data))
+    if result == UNREADABLE:
+        raise PermanentJobError(result["error"])
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    analysis_id = payload.get("analysis_id")
+    if analysis_id is not None:
+        crud.analysis.set_analysis_results(db, analysis_id, result)
+        if payload.get("user_id") is not None:
+            entry = {"analysis": result, "digest": content_digest(data), "fingerprint": fingerprint}
+            skin_analysis_service.remember(payload["user_id"], entry, analysis_id)
+    return {"analysis_id": analysis_id, "analysis": result}
+
+
+@job_queue.handler("render_variants")
+def render_variants(db: Session, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    key = payload["content_hash"]
+    source = storage.objects.path_for(key)
+
+    async def render_all():
+        return await asyncio.gather(
+            *(derivative_cache.get(source, key, preset, fmt) for preset, fmt in PRERENDERED_VARIANTS)
+        )
+
+    paths = asyncio.run(render_all())
+    return {"variants": [path.name for path in paths]}
+
+
+def collect_unreferenced_objects() -> None:
+    """Scheduler entry point: delete local objects whose last file record is gone"""
+    db = SessionLocal()
+    try:
+        removed = storage.objects.sweep(
+            lambda keys: crud.file.referenced_content_hashes(db, keys), settings.OBJECT_GC_GRACE_SECONDS
+        )
+        if removed:
+            print(f"Removed {removed} unreferenced objects")
+    except Exception as e:
+        print(f"Failed to sweep unreferenced objects: {e}")
+    finally:
+        db.close()
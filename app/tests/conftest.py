@@ -1,13 +1,20 @@
+import os
 import pytest
 import asyncio
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.compiler import InsertmanyvaluesSentinelOpts
+
+# Background job workers would poll the production database; tests run jobs inline
+os.environ.setdefault("JOB_WORKERS", "0")
 
 from app.main import app
 from app.core.db import get_db, Base
 from app.models import *  # Import all models
+from app.services.popularity import popularity_tracker
 
 # Test database URL (using SQLite for testing)
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -19,6 +26,10 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Counters flushed at app shutdown go to the test database, not the production one
+popularity_tracker.session_factory = TestingSessionLocal
+
+
 @pytest.fixture(scope="session")
 def event_loop():
     """Create an instance of the default event loop for the test session."""
@@ -59,3 +70,42 @@ def test_user_data():
         "password": "testpassword123",
         "full_name": "Test User"
     }
+
+@pytest.fixture
+def assert_max_queries():
+    """Context manager asserting that a block issues at most ``limit`` SQL statements.
+
+    Usage::
+
+        with assert_max_queries(2) as statements:
+            crud.product.get_all(db_session)
+    """
+    @contextmanager
+    def _assert_max_queries(limit: int):
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+        assert len(statements) <= limit, (
+            f"Expected at most {limit} queries, got {len(statements)}:\n" + "\n".join(statements)
+        )
+
+    return _assert_max_queries
+
+@pytest.fixture
+def ordered_insert_statements():
+    """Statements an INSERT..RETURNING sorted by parameter order takes for ``rows`` rows.
+
+    PostgreSQL does it in one; SQLite cannot order RETURNING, so SQLAlchemy
+    falls back to one INSERT per row there.
+    """
+    def _ordered_insert_statements(rows: int) -> int:
+        return 1 if engine.dialect.insertmanyvalues_implicit_sentinel & InsertmanyvaluesSentinelOpts.ANY_AUTOINCREMENT else rows
+
+    return _ordered_insert_statements
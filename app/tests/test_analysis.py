@@ -0,0 +1,317 @@
+import asyncio
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app import crud, schemas
+from app.ml_models import preprocess
+from app.ml_models.preprocess import load_rgb, masked_mean, skin_color, skin_mask, skin_region
+from app.services.analysis_cache import AnalysisCache, analysis_cache
+from app.services.analysis_executor import AnalysisBusyError, AnalysisExecutor
+from app.services.micro_batcher import MicroBatcher
+from app.models.brand import Brand
+from app.models.user import User
+from app.services.shade_index import ciede2000, rgb_to_lab, shade_index
+from app.services.shade_matcher import ShadeMatcherService
+from app.services.skin_analysis import SkinAnalysisService, analyze_image_bytes
+
+
+@pytest.fixture(autouse=True)
+def isolated_analysis_cache(tmp_path, monkeypatch):
+    """Point the global analysis cache at a per-test file."""
+    monkeypatch.setattr(analysis_cache, "path", str(tmp_path / "analysis.sqlite3"))
+    monkeypatch.setattr(analysis_cache, "_ready", False)
+    for counter in ("exact_hits", "near_hits", "misses", "evictions"):
+        monkeypatch.setattr(analysis_cache, counter, 0)
+
+
+def jpeg(color, size, quality=90):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def test_ciede2000_matches_reference_pairs():
+    """Spot checks against the Sharma et al. CIEDE2000 test data."""
+    pairs = [
+        ((50.0, 2.6772, -79.7751), (50.0, 0.0, -82.7485), 2.0425),
+        ((50.0, 2.5, 0.0), (73.0, 25.0, -18.0), 27.1492),
+        ((50.0, 2.5, 0.0), (50.0, 0.0, -2.5), 4.3065),
+        ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+    ]
+    lab1 = np.array([p[0] for p in pairs])
+    lab2 = np.array([p[1] for p in pairs])
+    assert ciede2000(lab1, lab2) == pytest.approx([p[2] for p in pairs], abs=1e-4)
+    assert rgb_to_lab([255, 255, 255]) == pytest.approx([100.0, 0.0, 0.0], abs=1e-3)
+
+
+def test_shade_matching_uses_index_and_rebuilds_on_change(db_session, monkeypatch):
+    """Nearest shades come from the partitioned index, which rebuilds only after writes."""
+    user = User(email="shades@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.flush()
+    brand = Brand(name="Fenty", user_id=user.id)
+    db_session.add(brand)
+    db_session.commit()
+
+    crud.shade.create_many(db_session, [
+        schemas.ShadeCreate(name="Porcelain", hex_code="#f3d9c6", undertone="cool", category="foundation", brand_id=brand.id),
+        schemas.ShadeCreate(name="Honey", hex_code="#c68e5c", undertone="warm", category="foundation", brand_id=brand.id),
+        schemas.ShadeCreate(name="Caramel", hex_code="#b27a4c", undertone="neutral", category="foundation", brand_id=brand.id),
+        schemas.ShadeCreate(name="Espresso", hex_code="#5a3a26", undertone="warm", category="foundation", brand_id=brand.id),
+        schemas.ShadeCreate(name="Red", hex_code="#c41e3a", category="lipstick", brand_id=brand.id),
+    ])
+
+    builds = []
+    original = shade_index.rebuild
+    monkeypatch.setattr(shade_index, "rebuild", lambda db, signature=None: builds.append(1) or original(db, signature))
+
+    service = ShadeMatcherService()
+    matches = service.match_color(db_session, (200, 140, 95))
+    assert [m["name"] for m in matches[:2]] == ["Honey", "Caramel"]
+    assert matches[0]["brand"] == "Fenty"
+    assert matches[0]["delta_e"] < matches[1]["delta_e"]
+    assert [m["name"] for m in service.match_color(db_session, (200, 140, 95), undertone="warm")] == ["Honey", "Espresso"]
+    assert builds == [1]
+
+    crud.shade.create(db_session, schemas.ShadeCreate(name="Golden", hex_code="#c88c5f", undertone="warm", category="foundation"))
+    assert service.match_color(db_session, (200, 140, 95), limit=1)[0]["name"] == "Golden"
+    assert builds == [1, 1]
+
+    image = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 140, 95)).save(image, format="PNG")
+    image.seek(0)
+
+    class Upload:
+        async def read(self):
+            return image.getvalue()
+
+    found = asyncio.run(service.find_matching_shades(Upload(), db_session, limit=2))
+    assert [m["shade"] for m in found] == ["Golden", "Honey"]
+    assert found[0]["approx_hex"] == "#c88c5f"
+
+
+def test_skin_color_ignores_background():
+    img = np.zeros((400, 600, 3), dtype=np.uint8)
+    img[:] = (20, 90, 200)  # blue backdrop
+    img[100:300, 200:400] = (214, 160, 130)
+    buf = io.BytesIO()
+    Image.fromarray(img).save(buf, "PNG")
+
+    rgb = load_rgb(buf.getvalue())
+    assert max(rgb.shape[:2]) == 256
+    color, fraction = skin_color(rgb)
+    assert 0.1 < fraction < 0.25
+    assert all(abs(c - e) <= 2 for c, e in zip(color, (214, 160, 130)))
+
+    # No skin in frame: falls back to the mean of every pixel
+    color, fraction = skin_color(np.full((10, 10, 3), (20, 90, 200), dtype=np.uint8))
+    assert fraction == 0.0 and color == (20, 90, 200)
+    assert load_rgb(b"not an image") is None
+
+
+def test_skin_region_crops_detected_face_and_masks_skin(monkeypatch):
+    rgb = np.zeros((400, 400, 3), dtype=np.uint8)
+    rgb[:] = (20, 90, 200)
+    rgb[100:300, 100:300] = (214, 160, 130)  # "face" box
+
+    monkeypatch.setattr(preprocess, "detect_face", lambda image: (100, 100, 200, 200))
+    crop = skin_region(rgb, 64)
+    assert crop.shape == (64, 64, 3) and skin_mask(crop).all()
+
+    # No face: the frame centre is used instead
+    monkeypatch.setattr(preprocess, "detect_face", lambda image: None)
+    assert skin_region(rgb, 64).shape == (64, 64, 3)
+
+    batch = np.stack([crop, np.full_like(crop, (20, 90, 200))])
+    means, fractions = masked_mean(batch, skin_mask(batch))
+    assert fractions.tolist() == [1.0, 0.0]
+    np.testing.assert_allclose(means, [(214, 160, 130), (20, 90, 200)], atol=1)
+
+
+def test_analysis_executor_times_stages_and_rejects_when_full():
+    buf = io.BytesIO()
+    Image.new("RGB", (320, 240), (214, 160, 130)).save(buf, "JPEG")
+    executor = AnalysisExecutor(workers=1, max_queue=1)
+
+    async def scenario():
+        result, fingerprint = await executor.submit(analyze_image_bytes, buf.getvalue())
+        assert result["skin_tone"]["undertone"] == "warm" and isinstance(fingerprint[0], int)
+
+        slow = [asyncio.ensure_future(executor.submit(time.sleep, 0.5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(AnalysisBusyError):
+            await executor.submit(time.sleep, 0)
+        await asyncio.gather(*slow)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+    metrics = executor.metrics()
+    assert metrics["rejected"] == 1 and metrics["pending"] == 0
+    assert metrics["stages"]["analyze_image_bytes.decode"]["count"] == 1
+    assert {"analyze_image_bytes.analyze", "analyze_image_bytes.queue", "sleep.total"} <= set(metrics["stages"])
+
+
+def test_load_rgb_drafts_jpeg_and_applies_exif_orientation():
+    stored = np.zeros((1500, 2000, 3), dtype=np.uint8)
+    stored[:100] = (255, 0, 0)  # red band along the stored top edge
+    exif = Image.Exif()
+    exif[0x0112] = 6  # displayed rotated 90 degrees clockwise
+    buf = io.BytesIO()
+    Image.fromarray(stored).save(buf, "JPEG", exif=exif.tobytes())
+
+    rgb = load_rgb(buf.getvalue(), 400)
+    assert rgb.shape == (400, 300, 3)
+    # After rotation the stored top edge is the right-hand side
+    assert rgb[:, -5:, 0].mean() > 200 and rgb[:, :5, 0].mean() < 50
+
+
+def test_batch_skin_analysis_stacks_images_and_bulk_inserts(client, db_session, assert_max_queries, ordered_insert_statements):
+    user = User(email="batch@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    user_id = user.id
+
+    files = [
+        ("images", ("warm.jpg", jpeg((214, 160, 130), (1200, 900)), "image/jpeg")),
+        ("images", ("broken.jpg", b"not an image", "image/jpeg")),
+        ("images", ("cool.jpg", jpeg((120, 140, 200), (600, 800)), "image/jpeg")),
+    ]
+    inserts = ordered_insert_statements(2)
+    with assert_max_queries(1 + inserts) as statements:
+        response = client.post(f"/api/v1/analysis/skin-analysis/batch?user_id={user_id}", files=files)
+    assert response.status_code == 200
+    assert sum(s.lstrip().upper().startswith("INSERT") for s in statements) == inserts
+
+    analyses = response.json()["analyses"]
+    assert [a["filename"] for a in analyses] == ["warm.jpg", "broken.jpg", "cool.jpg"]
+    assert [a["analysis"].get("skin_tone", {}).get("undertone") for a in analyses] == ["warm", None, "cool"]
+    assert "error" in analyses[1]["analysis"] and analyses[1]["analysis_id"] is None
+    assert all(0 <= analyses[i]["analysis"]["oil_level"] <= 80 for i in (0, 2))
+    assert [a.id for a in crud.analysis.get_user_analyses(db_session, user_id)] == [
+        analyses[2]["analysis_id"], analyses[0]["analysis_id"]
+    ]
+
+
+def test_repeat_uploads_reuse_cached_analysis(client, db_session):
+    user = User(email="repeat@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    user_id = user.id
+
+    selfie = np.zeros((600, 800, 3), dtype=np.uint8)
+    selfie[:, :400] = (214, 160, 130)
+    selfie[:, 400:] = (90, 60, 40)
+    original, reencoded = io.BytesIO(), io.BytesIO()
+    Image.fromarray(selfie).save(original, "JPEG", quality=95)
+    Image.fromarray(selfie).resize((400, 300)).save(reencoded, "JPEG", quality=70)
+
+    def upload(data):
+        response = client.post(
+            f"/api/v1/analysis/skin-analysis?user_id={user_id}",
+            files={"image": ("selfie.jpg", data, "image/jpeg")},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    first = upload(original.getvalue())
+    again = upload(original.getvalue())
+    near = upload(reencoded.getvalue())
+    assert not first["cached"] and again["cached"] and near["cached"]
+    assert first["analysis_id"] == again["analysis_id"] == near["analysis_id"]
+    assert again["analysis"] == first["analysis"] == near["analysis"]
+    assert len(crud.analysis.get_user_analyses(db_session, user_id)) == 1
+
+    stats = analysis_cache.stats()
+    assert (stats["exact_hits"], stats["near_hits"], stats["misses"]) == (1, 1, 1)
+
+    # A different image is analyzed afresh
+    other = upload(jpeg((60, 90, 200), (640, 480)))
+    assert not other["cached"] and other["analysis_id"] != first["analysis_id"]
+
+    # Failed analyses are returned but not stored, as in the batch endpoint
+    broken = upload(b"not an image")
+    assert "error" in broken["analysis"] and broken["analysis_id"] is None
+    assert len(crud.analysis.get_user_analyses(db_session, user_id)) == 2
+
+
+def test_analysis_cache_evicts_least_recently_used(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "small.sqlite3"), max_bytes=250)
+    for i in range(3):
+        cache.put("ns", f"d{i}", (i, (0, 0, 0)), {"payload": "x" * 90})
+    assert cache.peek("ns", "d0") is None
+    assert cache.peek("ns", "d1") is not None
+    cache.put("ns", "d3", (3, (0, 0, 0)), {"payload": "x" * 90})
+    # d1 was read more recently than d2, so d2 goes next
+    assert cache.peek("ns", "d2") is None and cache.peek("ns", "d1") is not None
+    assert cache.stats()["evictions"] == 2
+
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    calls = []
+
+    async def double(items):
+        calls.append(list(items))
+        await asyncio.sleep(0)
+        if "boom" in items:
+            raise ValueError("boom")
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch=3, max_wait_ms=5)
+
+    async def scenario():
+        # Five concurrent callers: one full batch of three flushes at once, the rest after the wait
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        assert results == [0, 2, 4, 6, 8]
+        with pytest.raises(ValueError):
+            await batcher.submit("boom")
+        assert await batcher.submit(21) == 42
+
+    asyncio.run(scenario())
+    assert calls == [[0, 1, 2], [3, 4], ["boom"], [21]]
+    stats = batcher.stats()
+    assert stats["batches"] == 4 and stats["items"] == 7
+    assert stats["batch_size_histogram"] == {"1": 2, "2": 1, "3-4": 1}
+    assert stats["queue_depth_histogram"] == {"1": 4, "2": 2, "3-4": 1}
+
+
+def test_micro_batcher_isolates_failures_per_item(monkeypatch):
+    async def handler(items):
+        if "short" in items:
+            return [1]
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    batcher = MicroBatcher(handler, max_batch=2, max_wait_ms=5)
+
+    async def scenario():
+        good, bad = await asyncio.gather(batcher.submit("ok"), batcher.submit("bad"), return_exceptions=True)
+        assert good == "ok" and isinstance(bad, ValueError)
+        # Too few results fails every waiter instead of leaving the rest hanging
+        outcomes = await asyncio.wait_for(
+            asyncio.gather(batcher.submit("short"), batcher.submit("x"), return_exceptions=True), 1
+        )
+        assert all(isinstance(o, RuntimeError) for o in outcomes)
+
+    asyncio.run(scenario())
+
+    # One crop the detectors choke on does not take the other requests in its batch down
+    service = SkinAnalysisService()
+    real = service._detect_skin_types
+
+    def picky(crops, features):
+        if (crops == 0).all(axis=(1, 2, 3)).any():
+            raise ValueError("blank crop")
+        return real(crops, features)
+
+    monkeypatch.setattr(service, "_detect_skin_types", picky)
+    crops = np.stack([np.full((64, 64, 3), (214, 160, 130), np.uint8), np.zeros((64, 64, 3), np.uint8)])
+    warm, blank = service.analyze_crops(crops)
+    assert warm["skin_tone"]["undertone"] == "warm"
+    assert blank == {"error": "Analysis failed: blank crop"}
+
@@ -0,0 +1,146 @@
+import asyncio
+import io
+import json
+from datetime import datetime, timedelta
+
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+from app.core.storage import StorageService
+from app.models.analysis import Analysis
+from app.models.job import Job
+from app.models.user import User
+from app.services.analysis_cache import analysis_cache
+from app.services.derivatives import DerivativeCache
+from app.services.job_queue import JobQueue, job_queue
+from app.tests.conftest import TestingSessionLocal
+
+
+def test_analysis_upload_returns_job_and_worker_fills_in_results(client, db_session, tmp_path, monkeypatch):
+    from app.core.permissions import get_optional_user
+    from app.main import app
+
+    user = User(email="jobs@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    app.dependency_overrides[get_optional_user] = lambda: user
+    local = StorageService(str(tmp_path / "uploads"), use_cloudinary=False)
+    variants = DerivativeCache(str(tmp_path / "variants"))
+    monkeypatch.setattr("app.api.v1.upload.storage", local)
+    monkeypatch.setattr("app.services.upload_jobs.storage", local)
+    monkeypatch.setattr("app.services.upload_jobs.derivative_cache", variants)
+    monkeypatch.setattr(job_queue, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(analysis_cache, "path", str(tmp_path / "analysis.sqlite3"))
+    monkeypatch.setattr(analysis_cache, "_ready", False)
+
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (214, 160, 130)).save(buf, "JPEG")
+    response = client.post("/api/v1/upload/analyze", files={"file": ("face.jpg", buf.getvalue(), "image/jpeg")})
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body["jobs"]) == {"analyze_upload", "render_variants"}
+    assert body["analysis_ready"] is False
+    assert client.get(f"/api/v1/jobs/{body['job_id']}").json()["status"] == "queued"
+
+    assert job_queue.run_pending() == 2
+    status = client.get(f"/api/v1/jobs/{body['job_id']}").json()
+    assert status["status"] == "succeeded" and status["attempts"] == 1
+    assert status["result"]["analysis"]["skin_tone"]["undertone"] == "warm"
+    db_session.expire_all()
+    record = db_session.get(Analysis, body["analysis_id"])
+    assert json.loads(record.results)["skin_tone"] == status["result"]["analysis"]["skin_tone"]
+    key = body["url"].rsplit("/", 1)[1]
+    assert variants.path_for(key, "thumb", "webp").exists()
+    assert analysis_cache.stats()["entries"] == 1  # indexed for repeat uploads
+
+    # Other users cannot see the job
+    app.dependency_overrides[get_optional_user] = lambda: None
+    assert client.get(f"/api/v1/jobs/{body['job_id']}").status_code == 404
+
+    # The record and its jobs commit together: no job, no empty analysis left behind
+    app.dependency_overrides[get_optional_user] = lambda: user
+
+    def broken_enqueue(db, jobs, **kwargs):
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(job_queue, "enqueue", broken_enqueue)
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (120, 140, 200)).save(buf, "JPEG")
+    failed = client.post("/api/v1/upload/analyze", files={"file": ("again.jpg", buf.getvalue(), "image/jpeg")})
+    assert failed.status_code == 500
+    db_session.rollback()  # what closing the request's session does
+    assert db_session.query(Analysis).count() == 1
+
+
+def test_failed_analysis_is_retried_and_unreadable_images_fail_for_good(db_session, tmp_path, monkeypatch):
+    from app import crud
+
+    user = User(email="broken@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    local = StorageService(str(tmp_path / "uploads"), use_cloudinary=False)
+    monkeypatch.setattr("app.services.upload_jobs.storage", local)
+    monkeypatch.setattr(job_queue, "session_factory", TestingSessionLocal)
+    info = asyncio.run(local.save_file(UploadFile(io.BytesIO(b"not an image"), filename="broken.jpg")))
+    record = crud.analysis.create_analysis_record(db_session, user.id, info["url"])
+    payload = {"analysis_id": record.id, "user_id": user.id, "url": info["url"], "content_hash": info["content_hash"]}
+
+    # Unreadable: decoded in the analysis workers, failed on the first attempt, record left empty
+    [unreadable] = job_queue.enqueue(db_session, [("analyze_upload", payload)], user_id=user.id)
+    assert job_queue.run_pending() == 1
+    db_session.expire_all()
+    assert unreadable.status == "failed" and unreadable.attempts == 1
+    assert unreadable.error == "PermanentJobError: Analysis failed: unreadable image"
+    assert db_session.get(Analysis, record.id).results is None
+
+    # Any other analysis error is worth another attempt
+    class FailingExecutor:
+        async def submit(self, fn, *args):
+            return {"error": "Analysis failed: detector crashed"}, None
+
+    monkeypatch.setattr("app.services.upload_jobs.analysis_executor", FailingExecutor())
+    [flaky] = job_queue.enqueue(db_session, [("analyze_upload", payload)], user_id=user.id)
+    assert job_queue.run_pending() == 1
+    db_session.expire_all()
+    assert flaky.status == "queued" and flaky.attempts == 1 and flaky.run_at > datetime.utcnow()
+    assert db_session.get(Analysis, record.id).results is None
+
+
+def test_job_queue_retries_with_backoff_and_reclaims_expired_jobs(db_session):
+    queue = JobQueue(TestingSessionLocal, workers=0, visibility_timeout=60, max_attempts=2, backoff=30)
+    calls = []
+
+    @queue.handler("flaky")
+    def flaky(db, payload):
+        calls.append(payload["n"])
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+        return {"ok": payload["n"]}
+
+    [job] = queue.enqueue(db_session, [("flaky", {"n": 1})])
+    assert queue.run_once("w1") is True
+    db_session.expire_all()
+    assert job.status == "queued" and job.attempts == 1 and job.error == "RuntimeError: transient"
+    assert job.run_at >= datetime.utcnow() + timedelta(seconds=29)
+    assert queue.run_once("w1") is False  # not due until the backoff passes
+
+    job.run_at = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+    assert queue.run_pending("w1") == 1
+    db_session.expire_all()
+    assert job.status == "succeeded" and json.loads(job.result) == {"ok": 1} and job.attempts == 2
+
+    # A worker that dies mid-job loses it once the visibility timeout passes
+    [orphan] = queue.enqueue(db_session, [("flaky", {"n": 2})])
+    claimer = TestingSessionLocal()
+    claimed = queue.claim(claimer, "dead-worker")
+    assert claimed.id == orphan.id and queue.run_once("w2") is False
+    db_session.expire_all()
+    orphan.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+    assert queue.run_once("w2") is True
+    assert queue.complete(claimer, claimed, "dead-worker", {"late": True}) is False
+    claimer.close()
+    db_session.expire_all()
+    assert orphan.status == "succeeded" and orphan.locked_by == "w2"
+    assert db_session.query(Job).filter(Job.status != "succeeded").count() == 0
@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+
+from app.ml_models.preprocess import FEATURE_NAMES, skin_features
+from app.ml_models.runtime import ModelRuntime
+from app.services import skin_analysis
+from app.services.skin_analysis import SkinAnalysisService
+
+
+def write_model(root, name, layers, **spec):
+    directory = root / name
+    directory.mkdir(parents=True)
+    spec_layers = []
+    for i, (weight, bias, activation) in enumerate(layers):
+        np.save(directory / f"w{i}.npy", np.asarray(weight, dtype=np.float32))
+        np.save(directory / f"b{i}.npy", np.asarray(bias, dtype=np.float32))
+        spec_layers.append({"weight": f"w{i}.npy", "bias": f"b{i}.npy", "activation": activation})
+    (directory / "model.json").write_text(json.dumps({"format": "numpy", "layers": spec_layers, **spec}))
+
+
+def test_runtime_backs_detectors_with_memory_mapped_models(tmp_path, monkeypatch):
+    shine = FEATURE_NAMES.index("shine")
+    redness = FEATURE_NAMES.index("redness")
+    features = len(FEATURE_NAMES)
+
+    # skin_type: "oily" when the crop is shiny, otherwise "dry"
+    weight = np.zeros((features, 2))
+    weight[shine] = [50.0, -50.0]
+    write_model(tmp_path, "skin_type", [(weight, [-2.5, 2.5], "linear")], output="softmax", labels=["oily", "dry"])
+    # skin_concerns: "redness" from the R - G feature, "acne" never
+    weight = np.zeros((features, 2))
+    weight[redness] = [0.0, 40.0]
+    write_model(tmp_path, "skin_concerns", [(weight, [-10.0, -4.0], "linear")], output="sigmoid",
+                labels=["acne", "redness"])
+    # moisture: constant 55 through a hidden ReLU layer
+    write_model(tmp_path, "moisture", [(np.zeros((features, 4)), np.ones(4), "relu"),
+                                       (np.full((4, 1), 13.75), [0.0], "linear")])
+
+    runtime = ModelRuntime(str(tmp_path))
+    assert runtime.warm_up() == ["moisture", "skin_concerns", "skin_type"]
+    assert isinstance(runtime.get("skin_type").layers[0][0], np.memmap)
+    assert runtime.get("oil") is None
+    monkeypatch.setattr(skin_analysis, "model_runtime", runtime)
+
+    crops = np.empty((2, 64, 64, 3), dtype=np.uint8)
+    crops[0] = (250, 248, 245)  # bright, desaturated: reads as shine
+    crops[1] = (200, 110, 100)  # red-dominant, matte
+    assert skin_features(crops).shape == (2, features)
+
+    results = SkinAnalysisService().analyze_crops(crops)
+    assert [r["skin_type"] for r in results] == ["oily", "dry"]
+    assert [r["concerns"] for r in results] == [[], ["redness"]]
+    assert [r["moisture_level"] for r in results] == [55, 55]
+    # No oil model deployed: the specular heuristic still applies
+    assert results[0]["oil_level"] == 80 and results[1]["oil_level"] == 20
+    assert "Use oil-free moisturizer" in results[0]["recommendations"]
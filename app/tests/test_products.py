@@ -0,0 +1,58 @@
+import pytest
+
+from app import crud
+from app.models.brand import Brand
+from app.models.product import Product, ProductImage
+from app.models.user import User
+from app.schemas.product import ProductSchema
+from app.services.recommender import RecommendationService
+
+
+@pytest.fixture
+def catalog(db_session):
+    """Twenty products across two brands, each with two images."""
+    user = User(email="catalog@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.flush()
+    brands = [Brand(name=f"Brand {i}", user_id=user.id) for i in range(2)]
+    db_session.add_all(brands)
+    db_session.flush()
+    for i in range(20):
+        product = Product(
+            name=f"Product {i}",
+            category="skincare",
+            price=10 + i,
+            brand_id=brands[i % 2].id,
+            user_id=user.id,
+        )
+        product.images = [
+            ProductImage(image_url=f"https://img/{i}/{j}.jpg", user_id=user.id) for j in range(2)
+        ]
+        db_session.add(product)
+    db_session.commit()
+    user_id = user.id
+    db_session.expunge_all()
+    return user_id
+
+
+def test_product_listing_has_no_n_plus_one(db_session, catalog, assert_max_queries):
+    """Listing and serializing products is one SELECT plus one image batch."""
+    with assert_max_queries(2):
+        products = crud.product.get_all(db_session)
+        payload = [ProductSchema.model_validate(p) for p in products]
+
+    assert len(payload) == 20
+    assert all(len(p.images) == 2 for p in payload)
+
+
+def test_recommendation_shaping_has_no_n_plus_one(db_session, catalog, assert_max_queries):
+    """Brand names and image URLs for every card come from eager loads."""
+    service = RecommendationService()
+    with assert_max_queries(2):
+        cards = service.recommend_skincare_routine(user_id=catalog, db=db_session, limit=20)
+    # Cold start: empty popularity rollup, so the list is padded from the catalog
+    with assert_max_queries(4):
+        trending = service.get_trending_products_for_user(catalog, db_session, limit=20)
+
+    assert len(cards) == len(trending) == 20
+    assert all(c["brand"] and c["image_url"] for c in cards + trending)
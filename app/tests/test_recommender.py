@@ -0,0 +1,413 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from app import crud
+from app.ml_models import als
+from app.models.brand import Brand
+from app.models.clickout import Clickout
+from app.models.ingredient import Ingredient
+from app.models.job import Job
+from app.models.popularity import ProductPopularity
+from app.models.product import Product
+from app.models.profile import Profile
+from app.models.recommendation import Recommendation
+from app.models.user import User
+from app.services.batch_recommender import BatchRecommender
+from app.services.catalog_index import CatalogIndex, catalog_index
+from app.services.collaborative import CollaborativeModel
+from app.services.job_queue import job_queue
+from app.services.popularity import LANDMARK, PopularityTracker, popularity_tracker
+from app.services.ranking import top_k_indices
+from app.services.recommendation_cache import recommendation_cache
+from app.services.recommender import RecommendationService
+from app.services.similarity import IngredientSimilarityIndex, ingredient_similarity
+from app.tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def make_catalog(db_session):
+    """Factory committing an owner, their brands and products.
+
+    ``products`` holds ``(name, category, price, brand index)`` tuples;
+    returns ``(owner, brands, products)``.
+    """
+    def _make(email, brands=("CeraVe",), products=(), **user_fields):
+        owner = User(email=email, hashed_password="x", **user_fields)
+        db_session.add(owner)
+        db_session.flush()
+        brand_rows = [Brand(name=name, user_id=owner.id) for name in brands]
+        db_session.add_all(brand_rows)
+        db_session.flush()
+        product_rows = [
+            Product(name=name, category=category, price=price, brand_id=brand_rows[b].id, user_id=owner.id)
+            for name, category, price, b in products
+        ]
+        db_session.add_all(product_rows)
+        db_session.commit()
+        return owner, brand_rows, product_rows
+
+    return _make
+
+
+def _skincare(count, price=10, prefix="P"):
+    return [(f"{prefix}{i}", "skincare", price, 0) for i in range(count)]
+
+
+def _records():
+    return [
+        {"id": 1, "category": "skincare", "brand_id": 1, "price": 10.0, "skin_types": ["oily"], "concerns": ["acne"]},
+        {"id": 2, "category": "skincare", "brand_id": 2, "price": 20.0, "skin_types": ["dry"], "concerns": ["wrinkles"]},
+        {"id": 3, "category": "makeup", "brand_id": 1, "price": 30.0, "skin_types": ["oily"], "concerns": ["acne", "redness"]},
+        {"id": 4, "category": "skincare", "brand_id": 2, "price": 40.0, "skin_types": [], "concerns": []},
+    ]
+
+
+def test_top_k_indices_agrees_with_full_sort():
+    """Argpartition selection matches sorting the whole list, ties by position."""
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 50, size=1000).astype(float)
+    expected = sorted(range(1000), key=lambda i: (-scores[i], i))[:10]
+
+    assert list(top_k_indices(scores, 10)) == expected
+    assert top_k_indices(scores, 0).size == 0
+
+
+def test_catalog_index_scores_match_weights():
+    """The matrix-vector score reproduces the per-product weighting."""
+    index = CatalogIndex()
+    index._load(_records(), {1: "CeraVe", 2: "The Ordinary"})
+    weights = RecommendationService().recommendation_weights
+
+    vector = index.profile_vector(weights, skin_type="Oily", concerns=json.dumps(["acne", "dullness"]))
+    scores = index.score(vector, bias=0.1)
+
+    assert scores[0] == np.float32(0.1 + 0.4 + 0.2 * 1 / 2)
+    assert scores[1] == np.float32(0.1)
+    assert scores[2] == np.float32(0.1 + 0.4 + 0.2 * 1 / 2)
+
+
+def test_catalog_index_top_k_respects_category_and_brand_preference():
+    """Top-k is restricted to the category mask and ranks preferred brands first."""
+    index = CatalogIndex()
+    index._load(_records(), {1: "CeraVe", 2: "The Ordinary"})
+    weights = RecommendationService().recommendation_weights
+
+    vector = index.profile_vector(weights, preferred_brands=["ordinary"])
+    scores = index.score(vector)
+    rows = index.top_k(scores, 2, mask=index.category_mask("skincare"))
+
+    assert list(index.product_ids[rows]) == [2, 4]
+    assert index.top_k(scores, 5, mask=index.category_mask("unknown")).size == 0
+
+
+def test_get_product_recommendations_uses_index(db_session, make_catalog):
+    """End-to-end scoring against the database returns the top-k products."""
+    user, _, _ = make_catalog(
+        "rec@example.com", ["The Ordinary", "CeraVe"],
+        [("Serum", "skincare", 10, 1), ("Toner", "skincare", 12, 0), ("Lipstick", "makeup", 15, 0)],
+        skin_type="oily",
+    )
+    db_session.add(Profile(user_id=user.id, preferred_brands=json.dumps(["ordinary"])))
+    db_session.commit()
+
+    service = RecommendationService()
+    catalog_index.invalidate()
+    results = asyncio.run(service.get_product_recommendations(db_session, user.id, category="skincare", limit=1))
+
+    assert [r["name"] for r in results] == ["Toner"]
+    assert results[0]["brand"] == "The Ordinary"
+    assert results[0]["reasons"] == ["Popular choice"]
+
+
+
+def test_recommendation_cache_hits_skip_persistence(client, db_session, make_catalog):
+    """A repeated request is served from cache; a preference update invalidates it."""
+    recommendation_cache.invalidate_all()
+    user, _, _ = make_catalog("cache@example.com", products=[("Cleanser", "skincare", 9, 0)])
+    db_session.add(Profile(user_id=user.id))
+    db_session.commit()
+
+    body = {"preferred_brands": ["CeraVe"], "budget_range": "0-50"}
+    first = client.post(f"/api/v1/recommend/{user.id}/skincare", json=body).json()
+    second = client.post(f"/api/v1/recommend/{user.id}/skincare", json={**body, "preferred_brands": ["cerave "]}).json()
+
+    assert second == first
+    assert db_session.query(Recommendation).count() == 1
+    assert recommendation_cache.stats()["hits"] >= 1
+
+    crud.profile.update_preferences(db_session, user.id, {"budget_range": "0-5"})
+    third = client.post(f"/api/v1/recommend/{user.id}/skincare", json=body).json()
+    assert third["saved_id"] != first["saved_id"]
+
+
+def test_personalized_filters_run_in_sql(db_session, make_catalog):
+    """Category, price range and brand substrings are applied before LIMIT."""
+    user, _, _ = make_catalog("filters@example.com", ["The Ordinary", "CeraVe"], [
+        ("Cheap", "skincare", 5, 0),
+        ("Mid", "skincare", 15, 0),
+        ("Other brand", "skincare", 15, 1),
+        ("Pricey", "skincare", 50, 0),
+        ("Mid 2", "skincare", 20, 0),
+    ])
+
+    results = RecommendationService().get_personalized_recommendations(
+        user_id=user.id,
+        filters={"category": "skincare", "min_price": 10, "max_price": 30, "brands": ["ORDINARY"]},
+        db=db_session,
+        limit=1,
+    )
+
+    assert [r["name"] for r in results] == ["Mid"]
+    assert results[0]["brand"] == "The Ordinary"
+
+
+def test_trending_ranks_by_decayed_engagement(client, db_session, make_catalog):
+    """Clickouts and ratings flow through the tracker into trending order."""
+    user, _, products = make_catalog("trend@example.com", products=_skincare(3))
+    first, second, third = (p.id for p in products)
+
+    for pid in (third, third, second):
+        response = client.post(f"/api/v1/recommend/{user.id}/clickout", json={"url": "https://shop", "product_id": pid})
+        assert response.status_code == 200
+    popularity_tracker.flush(db_session)
+
+    trending = RecommendationService().get_trending_products_for_user(user.id, db_session, limit=3)
+    assert [t["id"] for t in trending] == [third, second, first]
+    assert trending[0]["reasons"] == ["Trending now"]
+
+    # An old clickout weighs less than a fresh one
+    stale = popularity_tracker.weight(1.0, datetime.now(timezone.utc) - timedelta(days=14))
+    assert popularity_tracker.decayed(stale) == pytest.approx(0.25, rel=1e-3)
+
+    # Rebuilding from raw events reproduces the incremental rollup
+    before = {row.product_id: row.score for row in db_session.query(ProductPopularity)}
+    popularity_tracker.rebuild(db_session)
+    after = {row.product_id: row.score for row in db_session.query(ProductPopularity)}
+    assert after.keys() == before.keys()
+    assert all(after[k] == pytest.approx(before[k]) for k in before)
+
+
+
+def test_popularity_landmark_rebases_instead_of_overflowing(db_session, make_catalog):
+    """Short half-lives stay finite years out, and negative ratings clamp at zero."""
+    user, _, products = make_catalog("rebase@example.com", ["Inkey"], _skincare(3, prefix="R"))
+    liked, disliked, other = (p.id for p in products)
+
+    tracker = PopularityTracker(half_life_days=1)
+    start = datetime(2027, 10, 1, tzinfo=timezone.utc)
+    tracker.record_clickout(liked, at=start)
+    tracker.record_rating([disliked], -2, at=start)
+    tracker.flush(db_session)
+    first = tracker.landmark
+    assert first == tracker.landmark_for(start) > LANDMARK
+
+    # Ten years later: the landmark has moved on and scores are still finite
+    later = start + timedelta(days=3650)
+    tracker.record_clickout(other, at=later)
+    assert tracker.landmark > first
+    tracker.flush(db_session)
+    assert tracker.rebase(db_session, later) == 2  # the two rows flushed in 2027
+    rows = {row.product_id: row for row in db_session.query(ProductPopularity)}
+    assert {r.landmark.replace(tzinfo=timezone.utc) for r in rows.values()} == {tracker.landmark}
+    assert rows[disliked].score == 0.0
+    assert tracker.decayed(rows[other].score, later) == pytest.approx(1.0)
+    assert 0 <= rows[liked].score < rows[other].score
+
+    trending = RecommendationService().get_trending_products_for_user(user.id, db_session, limit=3)
+    assert trending[0]["id"] == other and trending[0]["reasons"] == ["Trending now"]
+    assert all(t["reasons"] == ["Popular choice"] for t in trending if t["id"] == disliked)
+
+
+def test_precomputed_sets_match_online_ranking(client, db_session, make_catalog):
+    """The batch job stores the online top-k; the endpoint serves it until it goes stale."""
+    make_catalog(
+        "batch@example.com", ["The Ordinary", "CeraVe"],
+        [(f"P{i}", "skincare", 10 + i, 0 if i % 2 else 1) for i in range(6)],
+    )
+    users = [User(email=f"batch{i}@example.com", hashed_password="x") for i in range(3)]
+    db_session.add_all(users)
+    db_session.flush()
+    db_session.add_all([
+        Profile(user_id=users[0].id, preferred_brands=json.dumps(["ordinary"])),
+        Profile(user_id=users[1].id, preferred_brands=json.dumps(["cerave"])),
+        Profile(user_id=users[2].id),
+    ])
+    db_session.commit()
+    catalog_index.invalidate()
+
+    batch = BatchRecommender(limit=3, chunk_size=2)
+    assert batch.run(db_session) == 3
+    assert batch.run(db_session) == 3  # re-running replaces, not appends
+    assert db_session.query(Recommendation).filter(Recommendation.title == "precomputed").count() == 3
+
+    service = RecommendationService()
+    for user in users:
+        online = asyncio.run(service.get_product_recommendations(db_session, user.id, limit=3))
+        served = batch.serve(db_session, user.id)["recommendations"]
+        assert [r["id"] for r in served] == [r["id"] for r in online]
+        assert [r["reasons"] for r in served] == [r["reasons"] for r in online]
+
+    response = client.post(f"/api/v1/recommend/{users[0].id}").json()
+    rec = db_session.query(Recommendation).get(response["saved_id"])
+    assert rec.title == "precomputed"
+
+    # A profile edit after the run makes the set stale
+    rec.created_at = datetime.utcnow() - timedelta(hours=1)
+    db_session.commit()
+    crud.profile.update_preferences(db_session, users[0].id, {"budget_range": "0-5"})
+    assert batch.serve(db_session, users[0].id) is None
+
+    # Rated sets survive the next run; their ratings feed popularity and training
+    crud.recommendations.update_rating(db_session, users[0].id, rec.id, 5)
+    assert batch.run(db_session) == 3
+    kept = db_session.query(Recommendation).get(rec.id)
+    assert kept is not None and kept.rating == 5 and len(kept.items) == 3
+    assert batch.serve(db_session, users[0].id)["saved_id"] != rec.id
+
+
+def test_save_generated_bulk_inserts_items(db_session, assert_max_queries, make_catalog, monkeypatch):
+    """Header and items are written with two statements; deferral queues the items as a durable job."""
+    user, _, products = make_catalog("bulk@example.com", products=[(f"P{i}", "skincare", i, 0) for i in range(25)])
+    user_id = user.id
+    items = [{"id": p.id, "score": 1.0 - i / 100, "reasons": ["Popular choice"]} for i, p in enumerate(products)]
+
+    with assert_max_queries(2):
+        rec_id = crud.recommendations.save_generated(db_session, user_id, items, title="skincare")
+
+    rec = db_session.query(Recommendation).get(rec_id)
+    assert [item.product_id for item in sorted(rec.items, key=lambda i: i.rank)] == [p.id for p in products]
+    assert rec.items[0].reason == "Popular choice"
+
+    tracker = PopularityTracker()
+    monkeypatch.setattr("app.crud.recommendations.popularity_tracker", tracker)
+    monkeypatch.setattr("app.services.recommendation_jobs.popularity_tracker", tracker)
+    monkeypatch.setattr(job_queue, "session_factory", TestingSessionLocal)
+    deferred_id = crud.recommendations.save_generated(db_session, user_id, items[:3], defer_items=True)
+    assert db_session.query(Recommendation).get(deferred_id).items == []
+    [job] = db_session.query(Job).filter(Job.kind == "save_recommendation_items").all()
+    assert job.status == "queued" and len(json.loads(job.payload)["rows"]) == 3
+
+    # A rating that arrives before the items is spread over them once they are written
+    crud.recommendations.update_rating(db_session, user_id, deferred_id, 5)
+    assert tracker.pending() == 0
+    assert job_queue.run_pending() == 1
+    db_session.expire_all()
+    assert len(db_session.query(Recommendation).get(deferred_id).items) == 3
+    assert db_session.query(Job).get(job.id).status == "succeeded"
+    assert tracker.pending() == 3
+
+
+def _brute_force_neighbors(index):
+    return {pid: index._compute(pid) for pid in index._ingredients}
+
+
+def test_ingredient_similarity_incremental_updates_match_recompute():
+    """Per-product updates leave every neighbour list equal to a full recompute."""
+    rng = np.random.default_rng(3)
+    catalog = {pid: set(rng.choice(30, size=rng.integers(1, 6), replace=False).tolist()) for pid in range(1, 61)}
+    index = IngredientSimilarityIndex(k=5)
+    index._load(catalog)
+    index._stale = False
+
+    assert {pid: index.neighbors(pid) for pid in catalog} == _brute_force_neighbors(index)
+    a, b = index.neighbors(1)[0][0], 1
+    assert index.similarity(a, b) == pytest.approx(index.neighbors(1)[0][1])
+
+    for _ in range(40):
+        pid = int(rng.integers(1, 66))
+        new = rng.choice(32, size=rng.integers(0, 6), replace=False).tolist()
+        index.update_product(pid, new)
+    expected = _brute_force_neighbors(index)
+    assert {pid: index.neighbors(pid) for pid in expected} == expected
+    assert all(pid in index._ingredients for pid, ns in index._neighbors.items() for pid, _ in ns)
+
+
+def test_similar_products_follow_ingredient_changes(db_session, make_catalog):
+    """Setting ingredients through crud updates the neighbour lists served by the service."""
+    _, _, products = make_catalog("similar@example.com", products=_skincare(4))
+    ingredients = [Ingredient(name=name) for name in ("Water", "Niacinamide", "Zinc", "Retinol", "Glycerin")]
+    db_session.add_all(ingredients)
+    db_session.commit()
+    water, niacinamide, zinc, retinol, glycerin = (i.id for i in ingredients)
+    p0, p1, p2, p3 = (p.id for p in products)
+
+    ingredient_similarity.invalidate()
+    crud.product.set_ingredients(db_session, p0, [water, niacinamide, zinc])
+    crud.product.set_ingredients(db_session, p1, [water, niacinamide])
+    crud.product.set_ingredients(db_session, p2, [water, retinol])
+    service = RecommendationService()
+    assert [r["id"] for r in service.get_similar_products(db_session, p0)] == [p1, p2]
+
+    # Incremental update: p3 becomes a near copy of p0
+    crud.product.set_ingredients(db_session, p3, [water, niacinamide, zinc, glycerin])
+    similar = service.get_similar_products(db_session, p0)
+    assert [r["id"] for r in similar] == [p3, p1, p2]
+    assert similar[0]["reasons"] == ["Similar ingredients"]
+
+    crud.product.delete(db_session, p3)
+    assert [r["id"] for r in service.get_similar_products(db_session, p0)] == [p1, p2]
+
+
+def test_als_recovers_block_structure_and_folds_in_new_users():
+    """Users in the same taste group score their group's unseen items highest."""
+    rng = np.random.default_rng(0)
+    rows, cols = [], []
+    for user in range(40):
+        group = user % 2
+        for item in rng.choice(10, size=6, replace=False):
+            rows.append(user)
+            cols.append(group * 10 + item)
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(40, 20))
+
+    users, items = als.train(matrix, factors=4, iterations=10)
+    predicted = users @ items.T
+    for user in range(40):
+        own = slice(0, 10) if user % 2 == 0 else slice(10, 20)
+        other = slice(10, 20) if user % 2 == 0 else slice(0, 10)
+        assert predicted[user, own].mean() > predicted[user, other].mean() + 0.3
+
+    gram = items.astype(np.float64).T @ items
+    folded = als.fold_in(items, gram, np.array([11, 12, 13]), np.ones(3))
+    assert (items @ folded)[10:].mean() > (items @ folded)[:10].mean()
+
+    # Warm start from the previous factors converges in one sweep
+    warm_users, warm_items = als.train(matrix, factors=4, iterations=1, user_init=users, item_init=items)
+    assert np.abs(warm_users @ warm_items.T - predicted).max() < 0.1
+
+
+def test_collaborative_model_round_trip(db_session, tmp_path, make_catalog):
+    """Training from clickouts publishes mmap-ed factors that score the catalog."""
+    _, _, products = make_catalog("cf@example.com", products=_skincare(6))
+    users = [User(email=f"cf{i}@example.com", hashed_password="x") for i in range(6)]
+    db_session.add_all(users)
+    db_session.flush()
+    # Two taste groups: products 0-2 and 3-5; the last user of each group has not seen product 2 / 5
+    for i, user in enumerate(users):
+        group = products[:3] if i < 3 else products[3:]
+        seen = group if i not in (2, 5) else group[:2]
+        db_session.add_all(Clickout(user_id=user.id, product_id=p.id, url="https://shop.example") for p in seen)
+    db_session.commit()
+
+    model = CollaborativeModel(str(tmp_path), factors=4)
+    stats = model.train(db_session, iterations=10, warm_start=False)
+    assert stats == {"users": 6, "items": 6, "interactions": 16}
+    assert isinstance(model.user_factors, np.memmap)
+
+    catalog_index.invalidate()
+    index = catalog_index.ensure_fresh(db_session)
+    scores = model.scores(index, [users[2].id, users[5].id])
+    row = {pid: index.row_of(pid) for pid in (p.id for p in products)}
+    assert scores[0, row[products[2].id]] > scores[0, row[products[5].id]]
+    assert scores[1, row[products[5].id]] > scores[1, row[products[2].id]]
+
+    # Unknown users are folded in from their engagement; retraining swaps versions
+    folded = model.scores(index, [999], seeds={999: [products[3].id, products[4].id]})
+    assert folded[0, row[products[5].id]] > folded[0, row[products[0].id]]
+    first = model.version
+    model.train(db_session, iterations=1)
+    assert model.version != first
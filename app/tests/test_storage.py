@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+from app.core.config import settings
+from app.core.storage import FileTooLargeError, StorageService
+
+
+class RecordingFile(io.BytesIO):
+    """BytesIO that remembers the largest single read"""
+
+    largest_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.largest_read = max(self.largest_read, len(data))
+        return data
+
+
+def test_local_save_streams_in_chunks_and_enforces_size_limit(tmp_path, monkeypatch):
+    service = StorageService(str(tmp_path), use_cloudinary=False, max_file_size=256 * 1024)
+    payload = os.urandom(200 * 1024)
+
+    raw = RecordingFile(payload)
+    info = asyncio.run(service.save_file(UploadFile(raw, filename="face.jpg"), "images"))
+    assert info["file_size"] == len(payload) and info["storage_type"] == "local"
+    assert info["content_hash"] == hashlib.sha256(payload).hexdigest()
+    assert open(info["file_path"], "rb").read() == payload
+    assert 0 < raw.largest_read <= settings.UPLOAD_CHUNK_SIZE
+
+    # Over the limit with a known size: rejected before any copying
+    oversized = RecordingFile(os.urandom(300 * 1024))
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(service.save_file(UploadFile(oversized, filename="big.jpg"), "images"))
+    assert oversized.largest_read == 0
+
+    # Unknown size: aborted mid-stream with nothing left behind
+    monkeypatch.setattr("app.core.storage.upload_size", lambda file: None)
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(service.save_file(UploadFile(io.BytesIO(os.urandom(300 * 1024)), filename="big.jpg"), "images"))
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_local_store_dedups_identical_uploads_and_counts_references(client, db_session, tmp_path, monkeypatch):
+    from app import crud
+    from app.core.permissions import get_optional_user
+    from app.main import app
+    from app.models.file import File
+    from app.models.user import User
+
+    user = User(email="local@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    app.dependency_overrides[get_optional_user] = lambda: user
+    local = StorageService(str(tmp_path), use_cloudinary=False)
+    monkeypatch.setattr("app.api.v1.upload.storage", local)
+
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 30), (214, 160, 130)).save(buf, "JPEG")
+    photo = buf.getvalue()
+    images = [("files", (name, io.BytesIO(photo), "image/jpeg")) for name in ("a.jpg", "b.jpg")]
+    uploaded = client.post("/api/v1/upload/multiple", files=images).json()["uploaded_files"]
+
+    key = hashlib.sha256(photo).hexdigest()
+    rows = db_session.query(File).order_by(File.id).all()
+    assert [row.content_hash for row in rows] == [key, key]
+    assert uploaded[0]["url"] == f"/static/objects/{key[:2]}/{key[2:4]}/{key}"
+    assert local.objects.path_for(key).read_bytes() == photo
+    assert len(list(local.objects.objects.rglob("*"))) == 3  # two fan-out directories and one object
+
+    # Deletes only drop records; the sweep collects the object after the last reference
+    referenced = lambda keys: crud.file.referenced_content_hashes(db_session, keys)
+    assert client.delete(f"/api/v1/upload/{uploaded[0]['public_id']}").status_code == 200
+    assert local.objects.sweep(referenced, grace_seconds=0) == 0 and local.objects.exists(key)
+    assert client.delete(f"/api/v1/upload/{uploaded[1]['public_id']}").status_code == 200
+    assert db_session.query(File).count() == 0
+    assert local.objects.exists(key)
+    # Within the grace period the object may be reused by an upload whose record is not committed yet
+    assert local.objects.sweep(referenced, grace_seconds=3600) == 0 and local.objects.exists(key)
+    os.utime(local.objects.path_for(key), (0, 0))
+    assert local.objects.sweep(referenced, grace_seconds=3600) == 1 and not local.objects.exists(key)
+
+    # An upload that reuses an object refreshes it, so a concurrent sweep leaves it alone
+    asyncio.run(local.save_file(UploadFile(io.BytesIO(photo), filename="c.jpg")))
+    os.utime(local.objects.path_for(key), (0, 0))
+    asyncio.run(local.save_file(UploadFile(io.BytesIO(photo), filename="d.jpg")))
+    assert local.objects.sweep(lambda keys: set(), grace_seconds=3600) == 0 and local.objects.exists(key)
+    # ...even when the reuse lands after the sweep picked it as a candidate
+    os.utime(local.objects.path_for(key), (0, 0))
+    reused_meanwhile = lambda keys: os.utime(local.objects.path_for(key)) or set()
+    assert local.objects.sweep(reused_meanwhile, grace_seconds=3600) == 0 and local.objects.exists(key)
+    assert os.listdir(local.objects.tmp) == []
+
+
+def test_static_route_serves_ranges_and_conditional_requests(client, tmp_path, monkeypatch):
+    local = StorageService(str(tmp_path), use_cloudinary=False)
+    monkeypatch.setattr("app.api.v1.static.storage", local)
+    payload = b"\xff\xd8\xff" + os.urandom(100 * 1024)
+    info = asyncio.run(local.save_file(UploadFile(io.BytesIO(payload), filename="face.jpg")))
+    url = info["url"]
+
+    full = client.get(url)
+    assert full.status_code == 200 and full.content == payload
+    assert full.headers["etag"] == f'"{info["content_hash"]}"'
+    assert full.headers["content-type"] == "image/jpeg"
+    assert "immutable" in full.headers["cache-control"] and full.headers["accept-ranges"] == "bytes"
+
+    assert client.get(url, headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": full.headers["last-modified"]}).status_code == 304
+
+    part = client.get(url, headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206 and part.content == payload[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(payload)}"
+    assert client.get(url, headers={"Range": "bytes=-5"}).content == payload[-5:]
+    # A stale If-Range validator gets the whole (changed) file instead of a piece
+    assert client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"old"'}).status_code == 200
+    unsatisfiable = client.get(url, headers={"Range": f"bytes={len(payload)}-"})
+    assert unsatisfiable.status_code == 416 and unsatisfiable.headers["content-range"] == f"bytes */{len(payload)}"
+
+    head = client.head(url)
+    assert head.status_code == 200 and head.content == b"" and head.headers["content-length"] == str(len(payload))
+    assert client.get("/static/objects/missing").status_code == 404
+    assert client.get("/static/%2e%2e/%2e%2e/etc/passwd").status_code == 404
+
+
+def test_variants_are_rendered_once_cached_and_evicted_lru(client, tmp_path, monkeypatch):
+    from app.services import derivatives
+    from app.services.derivatives import DerivativeCache
+
+    local = StorageService(str(tmp_path / "uploads"), use_cloudinary=False)
+    cache = DerivativeCache(str(tmp_path / "variants"))
+    monkeypatch.setattr("app.api.v1.static.storage", local)
+    monkeypatch.setattr("app.api.v1.static.derivative_cache", cache)
+    buf = io.BytesIO()
+    Image.new("RGB", (1200, 900), (214, 160, 130)).save(buf, "JPEG")
+    info = asyncio.run(local.save_file(UploadFile(io.BytesIO(buf.getvalue()), filename="face.jpg")))
+    key = info["content_hash"]
+
+    thumb = client.get(f"/static/variants/thumb/{key}.webp")
+    assert thumb.status_code == 200 and thumb.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(thumb.content)).size == (200, 200)
+    assert "immutable" in thumb.headers["cache-control"]
+    large = client.get(f"/static/variants/large/{key}.jpg")
+    assert Image.open(io.BytesIO(large.content)).size == (1000, 750)
+    assert client.get(f"/static/variants/thumb/{key}.webp").content == thumb.content
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    assert client.get(f"/static/variants/huge/{key}.webp").status_code == 404
+    assert client.get(f"/static/variants/thumb/{'0' * 64}.webp").status_code == 404
+
+    # Concurrent requests for one variant share a single render
+    renders = []
+    real_render = derivatives.render
+    monkeypatch.setattr(derivatives, "render", lambda *args: renders.append(args) or real_render(*args))
+    source = local.objects.path_for(key)
+
+    async def burst():
+        return await asyncio.gather(*(cache.get(source, key, "medium", "webp") for _ in range(5)))
+
+    assert len(set(asyncio.run(burst()))) == 1
+    assert len(renders) == 1 and cache.stats()["coalesced"] == 4
+
+    # Over the cap, least recently served variants go first
+    os.utime(cache.path_for(key, "large", "jpg"), (0, 0))
+    cache.max_bytes = cache.stats()["bytes"]
+    asyncio.run(cache.get(source, key, "analysis", "jpg"))
+    assert not cache.path_for(key, "large", "jpg").exists()
+    assert cache.path_for(key, "analysis", "jpg").exists() and cache.stats()["evictions"] >= 1
+
+
+def test_variant_waiters_survive_a_cancelled_leader_and_failed_saves_leave_nothing(tmp_path, monkeypatch):
+    from app.services import derivatives
+    from app.services.derivatives import DerivativeCache
+
+    local = StorageService(str(tmp_path / "uploads"), use_cloudinary=False)
+    cache = DerivativeCache(str(tmp_path / "variants"))
+    buf = io.BytesIO()
+    Image.new("RGB", (800, 600), (214, 160, 130)).save(buf, "JPEG")
+    info = asyncio.run(local.save_file(UploadFile(io.BytesIO(buf.getvalue()), filename="face.jpg")))
+    key = info["content_hash"]
+    source = local.objects.path_for(key)
+
+    async def scenario():
+        leader = asyncio.create_task(cache.get(source, key, "thumb", "webp"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get(source, key, "thumb", "webp"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.wait_for(waiter, 10)
+
+    assert asyncio.run(scenario()) == cache.path_for(key, "thumb", "webp")
+    assert cache.stats()["coalesced"] == 1
+
+    def failing_save(self, fp, *args, **kwargs):
+        open(fp, "wb").write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Image.Image, "save", failing_save)
+    with pytest.raises(OSError):
+        asyncio.run(cache.get(source, key, "large", "jpg"))
+    assert [p.name for p in cache.path_for(key, "large", "jpg").parent.iterdir()] == [f"{key}-thumb.webp"]
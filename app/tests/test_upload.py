@@ -3,6 +3,7 @@ from fastapi.testclient import TestClient
 import io
 from PIL import Image
 
+
 def create_test_image():
     """Create a test image file."""
     image = Image.new('RGB', (100, 100), color='red')
@@ -37,3 +38,47 @@ def test_upload_without_auth(client: TestClient):
     files = {"file": ("test.jpg", test_image, "image/jpeg")}
     response = client.post("/api/v1/upload/", files=files)
     assert response.status_code == 401
+
+def test_multiple_upload_fans_out_and_saves_in_one_insert(client, db_session, monkeypatch, assert_max_queries, ordered_insert_statements):
+    """Uploads run concurrently off the event loop, bounded by the client's pool size."""
+    import threading
+    import time
+    from app.core.permissions import get_optional_user
+    from app.core.storage import cloudinary_client, storage
+    from app.main import app
+    from app.models.file import File
+    from app.models.user import User
+
+    user = User(email="uploader@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    app.dependency_overrides[get_optional_user] = lambda: user
+
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def fake_upload(file, **options):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.1)
+        with lock:
+            active[0] -= 1
+        public_id = f"glow_genius/{file.read()[-8:].hex()}"
+        return {"public_id": public_id, "secure_url": f"https://cdn.example.com/{public_id}", "bytes": 1}
+
+    monkeypatch.setattr("cloudinary.uploader.upload", fake_upload)
+    monkeypatch.setattr(storage, "use_cloudinary", True)
+    images = [("files", (f"{i}.jpg", create_test_image(), "image/jpeg")) for i in range(6)]
+    images.append(("files", ("notes.txt", io.BytesIO(b"hi"), "text/plain")))
+    with assert_max_queries(1 + ordered_insert_statements(6)):
+        response = client.post("/api/v1/upload/multiple", files=images)
+
+    assert response.status_code == 200
+    uploaded = response.json()["uploaded_files"]
+    assert [u["filename"] for u in uploaded] == [f"{i}.jpg" for i in range(6)] + ["notes.txt"]
+    assert uploaded[-1]["error"] == "Not an image"
+    assert 1 < peak[0] <= cloudinary_client.max_concurrency
+    rows = db_session.query(File).order_by(File.id).all()
+    assert [r.id for r in rows] == [u["file_id"] for u in uploaded[:6]]
+    assert {r.id: r.public_id for r in rows} == {u["file_id"]: u["public_id"] for u in uploaded[:6]}